@@ -1,126 +1,128 @@
-(bot-env) ubuntu@ip-172-31-10-9:~$ cat aerodrome_bot.py
 # aerodrome_bot.py
 import time
-import math
-import json
+import asyncio
 import schedule
 import logging
 import os.path
+import threading
 from decimal import Decimal, getcontext
-from datetime import datetime, timedelta
-from wallet_setup import web3, wallet_address, private_key, weth_contract, usdc_contract
+from wallet_setup import web3, get_wallet_address, get_signer, load_wallets, WETH_ADDRESS, USDC_ADDRESS, AERO_ADDRESS
+from strategy_config import strategy
+from nonce_manager import send_transaction, wait_for_receipt, recover_dropped_transactions
+from fee_engine import build_transaction
+from batch_reader import gather_context, read_batch
+from multicall import Call
+from read_cache import get_read_cache
+from approval_ledger import get_approval_ledger
+from state_store import get_state_store, STATUS_OPEN, STATUS_STAKED
+from staked_index import get_staked_index
+from aerodrome_positions import get_positions_snapshot
+from aerodrome_pool_state import get_pool_state
+from aerodrome_monitor import TickMonitor
+from aerodrome_client import NPM_ADDRESS, POOL_ADDRESS, CL_GAUGE_ADDRESS, ROUTER_ADDRESS, get_contract
+import tick_math
 
 # Set decimal precision
 getcontext().prec = 28
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("aerodrome_bot.log"),
-        logging.StreamHandler()
-    ]
-)
+def setup_logging():
+    """Configure logging; only called when run as a script so imports stay side-effect free"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s',
+        handlers=[
+            logging.FileHandler("aerodrome_bot.log"),
+            logging.StreamHandler()
+        ]
+    )
+
 logger = logging.getLogger()
 
-# Check which file exists for position creation
-if os.path.exists('aerodrome_swap_and_deposit.py'):
-    DEPOSIT_FILE = 'aerodrome_swap_and_deposit'
-    logger.info("Using aerodrome_swap_and_deposit.py for position creation")
-elif os.path.exists('aerodrome_auto_deposit.py'):
-    DEPOSIT_FILE = 'aerodrome_auto_deposit'
-    logger.info("Using aerodrome_auto_deposit.py for position creation")
-else:
-    logger.warning("Neither deposit file found, will attempt aerodrome_swap_and_deposit.py")
-    DEPOSIT_FILE = 'aerodrome_swap_and_deposit'
-
-# Contract addresses
-NPM_ADDRESS = web3.to_checksum_address("0x827922686190790b37229fd06084350e74485b72")
-POOL_ADDRESS = web3.to_checksum_address("0xb2cc224c1c9feE385f8ad6a55b4d94e92359dc59")
-HELPER_ADDRESS = web3.to_checksum_address("0x9c62ab10577fB3C20A22E231b7703Ed6D456CC7a")
-WETH_ADDRESS = web3.to_checksum_address("0x4200000000000000000000000000000000000006")
-USDC_ADDRESS = web3.to_checksum_address("0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913")
-CL_GAUGE_ADDRESS = web3.to_checksum_address("0xF33a96b5932D9E9B9A0eDA447AbD8C9d48d2e0c8")
-AERO_ADDRESS = web3.to_checksum_address("0x940181a94A35A4569E4529A3CDfB74e38FD98631")
-
-# Router for swapping tokens
-ROUTER_ADDRESS = web3.to_checksum_address("0xcF77a3Ba9A5CA399B7c97c74d54e5b1Beb874E43")
-
-# Load ABIs from files
-def load_abi(file_path):
-    try:
-        with open(file_path, 'r') as f:
-            return f.read()
-    except Exception as e:
-        logger.error(f"Error loading ABI from {file_path}: {e}")
-        return ""
-
-POOL_ABI = load_abi('abis/pool_abi.json')
-HELPER_ABI = load_abi('abis/helper_abi.json')
-ERC20_ABI = load_abi('abis/erc20_abi.json')
-NPM_ABI = load_abi('abis/npm_abi.json')
-GAUGE_ABI = load_abi('abis/gauge_abi.json')
-ROUTER_ABI = load_abi('abis/router_abi.json')
-
-# Initialize contracts
-pool_contract = web3.eth.contract(address=POOL_ADDRESS, abi=POOL_ABI)
-helper_contract = web3.eth.contract(address=HELPER_ADDRESS, abi=HELPER_ABI)
-weth_token = web3.eth.contract(address=WETH_ADDRESS, abi=ERC20_ABI)
-usdc_token = web3.eth.contract(address=USDC_ADDRESS, abi=ERC20_ABI)
-aero_token = web3.eth.contract(address=AERO_ADDRESS, abi=ERC20_ABI)
-npm_contract = web3.eth.contract(address=NPM_ADDRESS, abi=NPM_ABI)
-gauge_contract = web3.eth.contract(address=CL_GAUGE_ADDRESS, abi=GAUGE_ABI)
-router_contract = web3.eth.contract(address=ROUTER_ADDRESS, abi=ROUTER_ABI)
+# Module used for position creation, resolved on first use
+DEPOSIT_FILE = None
+
+def get_deposit_file():
+    """Check which file exists for position creation"""
+    global DEPOSIT_FILE
+    if DEPOSIT_FILE is None:
+        if os.path.exists('aerodrome_swap_and_deposit.py'):
+            DEPOSIT_FILE = 'aerodrome_swap_and_deposit'
+            logger.info("Using aerodrome_swap_and_deposit.py for position creation")
+        elif os.path.exists('aerodrome_auto_deposit.py'):
+            DEPOSIT_FILE = 'aerodrome_auto_deposit'
+            logger.info("Using aerodrome_auto_deposit.py for position creation")
+        else:
+            logger.warning("Neither deposit file found, will attempt aerodrome_swap_and_deposit.py")
+            DEPOSIT_FILE = 'aerodrome_swap_and_deposit'
+    return DEPOSIT_FILE
+
+# Initialize contracts (shared instances from the client module)
+pool_state = get_pool_state(POOL_ADDRESS)
+weth_token = get_contract('erc20', WETH_ADDRESS)
+usdc_token = get_contract('erc20', USDC_ADDRESS)
+aero_token = get_contract('erc20', AERO_ADDRESS)
+npm_contract = get_contract('npm')
+gauge_contract = get_contract('gauge')
 
 # Constants
-SLIPPAGE = Decimal('0.005')  # 0.5% slippage tolerance
+SLIPPAGE = Decimal(str(strategy.slippage))  # slippage tolerance (0.5% by default)
 MAX_UINT128 = 2**128 - 1
 MAX_UINT256 = 2**256 - 1
-GAS_PRICE_MULTIPLIER = 1.5
-GAS_LIMIT_HIGH = 3000000  # 3M for complex operations
-GAS_LIMIT_MEDIUM = 1000000  # 1M for simpler operations
-GAS_LIMIT_LOW = 500000  # 500k for basic operations
-RETRY_ATTEMPTS = 3
-RETRY_DELAY = 10  # seconds
+POSITION_CHECK_INTERVAL = strategy.check_interval  # seconds between throttled range checks
+# Range checks triggered by swap events are throttled separately, so a burst
+# of swaps while out of range costs one check rather than one per swap
+EVENT_CHECK_INTERVAL = 10  # seconds
+# Wait after a failed rebalance before the next attempt; doubles per consecutive failure
+REBALANCE_BACKOFF_BASE = 60  # seconds
+REBALANCE_BACKOFF_CAP = 3600  # seconds
+
+# 'atomic' exits the active position with one NPM multicall transaction;
+# 'sequential' runs aerodrome_withdraw.main() (decrease, collect, burn for every position)
+REBALANCE_MODE = os.getenv('AERODROME_REBALANCE_MODE', 'atomic')
+
+# 'events' reacts to pool Swap events as they happen; 'classic' is the original
+# 60s polling loop with a 5 minute range check throttle; 'portfolio' runs every
+# pool in pools.json (see portfolio.py)
+MONITOR_MODE = os.getenv('AERODROME_MONITOR_MODE', 'events')
 
 # Bot state
 active_position_id = None
 last_position_check = None
+rebalance_failures = 0  # consecutive failed rebalances
+rebalance_retry_at = 0  # no rebalance is attempted before this time
+position_ranges = {}  # token_id -> (tick_lower, tick_upper); a position's range never changes
 
 def get_token_balances():
     """Get current token balances"""
-    weth_balance = Decimal(weth_token.functions.balanceOf(wallet_address).call()) / Decimal(1e18)
-    usdc_balance = Decimal(usdc_token.functions.balanceOf(wallet_address).call()) / Decimal(1e6)
-    aero_balance = Decimal(aero_token.functions.balanceOf(wallet_address).call()) / Decimal(1e18)
+    weth_raw, usdc_raw, aero_raw = read_batch([
+        Call(token, 'balanceOf', [get_wallet_address()]) for token in (weth_token, usdc_token, aero_token)
+    ])
+    weth_balance = Decimal(weth_raw) / Decimal(1e18)
+    usdc_balance = Decimal(usdc_raw) / Decimal(1e6)
+    aero_balance = Decimal(aero_raw) / Decimal(1e18)
     return weth_balance, usdc_balance, aero_balance
 
-def get_pool_info():
-    """Get current tick, tick spacing, and price from the pool"""
-    for attempt in range(RETRY_ATTEMPTS):
-        try:
-            slot0 = pool_contract.functions.slot0().call()
-            current_tick = slot0[1]
-            sqrt_price_x96 = slot0[0]
-            tick_spacing = pool_contract.functions.tickSpacing().call()
+def get_pool_info(block_number=None, max_age=0):
+    """Get current tick, tick spacing, and price from the pool
 
-            # Calculate price from sqrtPriceX96
-            price = (Decimal(sqrt_price_x96) / Decimal(2**96)) ** 2 * Decimal(1e12)
-            eth_price_in_usdc = float(price)
+    A snapshot already taken at `block_number`, or less than `max_age`
+    seconds ago, is reused without another RPC call.
+    """
+    # Transient RPC failures and rate limits are retried by the provider
+    snapshot = pool_state.snapshot(block_number=block_number, max_age=max_age)
+    current_tick = snapshot.tick
+    sqrt_price_x96 = snapshot.sqrt_price_x96
+    tick_spacing = snapshot.tick_spacing
 
-            logger.info(f"Current tick: {current_tick}")
-            logger.info(f"Tick spacing: {tick_spacing}")
-            logger.info(f"Current ETH price: ${eth_price_in_usdc:.2f}")
+    # Calculate price from sqrtPriceX96
+    price = pool_state.price(snapshot)
+    eth_price_in_usdc = float(price)
 
-            return current_tick, tick_spacing, sqrt_price_x96, eth_price_in_usdc
+    logger.info(f"Current tick: {current_tick}")
+    logger.info(f"Tick spacing: {tick_spacing}")
+    logger.info(f"Current ETH price: ${eth_price_in_usdc:.2f}")
 
-        except Exception as e:
-            if attempt < RETRY_ATTEMPTS - 1:
-                logger.warning(f"Error getting pool info (attempt {attempt+1}/{RETRY_ATTEMPTS}): {e}")
-                time.sleep(RETRY_DELAY)
-            else:
-                logger.error(f"Failed to get pool info after {RETRY_ATTEMPTS} attempts: {e}")
-                raise
+    return current_tick, tick_spacing, sqrt_price_x96, eth_price_in_usdc
 
 def ensure_approval(token, amount, spender):
     """Ensure token is approved for spender"""
@@ -128,24 +130,25 @@ def ensure_approval(token, amount, spender):
     spender_name = "NPM" if spender == NPM_ADDRESS else "Router" if spender == ROUTER_ADDRESS else "Gauge"
 
     try:
-        allowance = token.functions.allowance(wallet_address, spender).call()
+        ledger = get_approval_ledger()
+        owner = get_wallet_address()
+        allowance = ledger.allowance(owner, token.address, spender)
+        if allowance is None:
+            allowance, = read_batch([Call(token, 'allowance', [owner, spender])])
+            ledger.record_allowance(owner, token.address, spender, allowance)
         if allowance >= amount:
             logger.info(f"{token_symbol} already approved for {spender_name}")
             return True
 
         logger.info(f"Approving {token_symbol} for {spender_name}...")
-        tx = token.functions.approve(spender, MAX_UINT256).build_transaction({
-            'from': wallet_address,
-            'nonce': web3.eth.get_transaction_count(wallet_address),
-            'gasPrice': web3.eth.gas_price,
-            'chainId': web3.eth.chain_id
-        })
+        tx = build_transaction(token.functions.approve(spender, MAX_UINT256))
 
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        tx_hash = send_transaction(tx)
+        receipt = wait_for_receipt(tx_hash)
 
         logger.info(f"{token_symbol} approval tx: {receipt.transactionHash.hex()}")
+        if receipt.status == 1:
+            ledger.record_allowance(owner, token.address, spender, MAX_UINT256, receipt.blockNumber)
         return receipt.status == 1
     except Exception as e:
         logger.error(f"Error approving {token_symbol} for {spender_name}: {e}")
@@ -156,10 +159,11 @@ def create_position():
     global active_position_id
 
     try:
-        logger.info(f"Creating new position using {DEPOSIT_FILE}.py")
+        deposit_file = get_deposit_file()
+        logger.info(f"Creating new position using {deposit_file}.py")
 
-        # Dynamically import the module
-        deposit_module = __import__(DEPOSIT_FILE)
+        # Dynamically import the module (already loaded if warm_up() has run)
+        deposit_module = __import__(deposit_file)
 
         # Try different function names based on what's available in the module
         if hasattr(deposit_module, 'create_position_ui_flow_with_rebalance'):
@@ -169,17 +173,22 @@ def create_position():
             logger.info("Using create_position_ui_flow function")
             create_function = deposit_module.create_position_ui_flow
         else:
-            logger.error(f"No suitable position creation function found in {DEPOSIT_FILE}.py")
+            logger.error(f"No suitable position creation function found in {deposit_file}.py")
             return None
 
         # Call the create position function
         result = create_function()
 
         if result:
-            # Find the latest position created
-            num_positions = npm_contract.functions.balanceOf(wallet_address).call()
-            if num_positions > 0:
-                latest_token_id = npm_contract.functions.tokenOfOwnerByIndex(wallet_address, num_positions - 1).call()
+            # The deposit module returns the parsed mint receipt; older modules only return True
+            if isinstance(result, dict):
+                latest_token_id = result['token_id']
+                logger.info(f"Minted {result['liquidity']} liquidity, gas used {result['gas_used']:,} "
+                            f"in block {result['block_number']}")
+            else:
+                open_positions = get_state_store().list_positions(STATUS_OPEN)
+                latest_token_id = open_positions[0]['token_id'] if open_positions else find_active_position()
+            if latest_token_id is not None:
                 logger.info(f"New position created with ID: {latest_token_id}")
                 active_position_id = latest_token_id
 
@@ -204,48 +213,46 @@ def stake_position(token_id):
         logger.info(f"Staking position ID: {token_id}")
 
         # Ensure the NFT is approved for the gauge
-        approval_check = npm_contract.functions.getApproved(token_id).call()
+        # Approval status from the ledger, or read together with fees and nonce if needed
+        ledger = get_approval_ledger()
+        known, approval_check = ledger.nft_approval(NPM_ADDRESS, token_id)
+        if known:
+            gather_context([])
+        else:
+            approval_check, = gather_context([Call(npm_contract, 'getApproved', [token_id])])
 
         if approval_check != CL_GAUGE_ADDRESS:
             logger.info("Approving NFT for gauge...")
 
             # Approve NFT
-            approve_tx = npm_contract.functions.approve(CL_GAUGE_ADDRESS, token_id).build_transaction({
-                'from': wallet_address,
-                'nonce': web3.eth.get_transaction_count(wallet_address),
-                'gasPrice': int(web3.eth.gas_price * GAS_PRICE_MULTIPLIER),
-                'chainId': web3.eth.chain_id
-            })
+            approve_tx = build_transaction(npm_contract.functions.approve(CL_GAUGE_ADDRESS, token_id))
 
-            signed_tx = web3.eth.account.sign_transaction(approve_tx, private_key)
-            tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            tx_hash = send_transaction(approve_tx)
 
             logger.info(f"Approval transaction sent: {tx_hash.hex()}")
-            receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = wait_for_receipt(tx_hash)
 
             if receipt.status != 1:
                 logger.error("NFT approval failed")
                 return False
+            ledger.record_nft_approval(NPM_ADDRESS, token_id, CL_GAUGE_ADDRESS, receipt.blockNumber)
 
             logger.info("NFT approved for gauge")
 
         # Stake the position using deposit function
-        stake_tx = gauge_contract.functions.deposit(token_id).build_transaction({
-            'from': wallet_address,
-            'nonce': web3.eth.get_transaction_count(wallet_address),
-            'gasPrice': int(web3.eth.gas_price * GAS_PRICE_MULTIPLIER),
-            'gas': GAS_LIMIT_MEDIUM,
-            'chainId': web3.eth.chain_id
-        })
+        stake_tx = build_transaction(gauge_contract.functions.deposit(token_id))
 
-        signed_tx = web3.eth.account.sign_transaction(stake_tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = send_transaction(stake_tx)
 
         logger.info(f"Stake transaction sent: {tx_hash.hex()}")
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = wait_for_receipt(tx_hash)
 
         if receipt.status == 1:
             logger.info(f"Position {token_id} successfully staked")
+            # The transfer to the gauge clears the approval
+            ledger.record_nft_approval(NPM_ADDRESS, token_id, None, receipt.blockNumber)
+            get_staked_index().record(token_id, True, receipt.blockNumber)
+            get_state_store().set_active_position(token_id)
             return True
         else:
             logger.error(f"Failed to stake position {token_id}")
@@ -258,16 +265,24 @@ def stake_position(token_id):
 def check_position_in_range(token_id):
     """Check if position is within the current tick range"""
     try:
-        # Get position details
-        position = npm_contract.functions.positions(token_id).call()
-        tick_lower = position[5]
-        tick_upper = position[6]
+        # Position ranges are immutable, so only read them once (or take them from the state store)
+        if token_id not in position_ranges:
+            stored = get_state_store().get_position(token_id)
+            if stored and stored['tick_lower'] is not None:
+                position_ranges[token_id] = (stored['tick_lower'], stored['tick_upper'])
+            else:
+                position, = read_batch([Call(npm_contract, 'positions', [token_id])])
+                position_ranges[token_id] = (position[5], position[6])
+                get_state_store().record_position(
+                    token_id, tick_lower=position[5], tick_upper=position[6], liquidity=position[7]
+                )
+        tick_lower, tick_upper = position_ranges[token_id]
 
         # Get current tick
         current_tick, _, _, _ = get_pool_info()
 
         # Check if position is in range
-        in_range = tick_lower <= current_tick <= tick_upper
+        in_range = tick_math.in_range(current_tick, tick_lower, tick_upper)
 
         logger.info(f"Position {token_id} range: {tick_lower} to {tick_upper}")
         logger.info(f"Current tick: {current_tick}")
@@ -287,10 +302,8 @@ def daily_claim_and_sell():
 
     if active_position_id is None:
         # Find active position if we don't know it
-        positions = list_positions()
-        if positions:
-            active_position_id = positions[0]['token_id']
-        else:
+        active_position_id = find_active_position()
+        if active_position_id is None:
             logger.warning("No active position found for daily claim")
             return
 
@@ -307,14 +320,93 @@ def daily_claim_and_sell():
     else:
         logger.warning("Failed to claim rewards")
 
-def monitor_and_rebalance():
-    """Monitor position and rebalance if needed"""
+def record_rebalance_result(succeeded):
+    """Clear the rebalance backoff after a success, or double it after a failure"""
+    global rebalance_failures, rebalance_retry_at
+
+    if succeeded:
+        rebalance_failures = 0
+        rebalance_retry_at = 0
+        return
+
+    rebalance_failures += 1
+    delay = min(REBALANCE_BACKOFF_CAP, REBALANCE_BACKOFF_BASE * 2 ** (rebalance_failures - 1))
+    rebalance_retry_at = time.time() + delay
+    logger.warning(f"Rebalance failed {rebalance_failures} time(s) in a row, not retrying for {delay}s")
+
+def rebalance_active_position(store):
+    """Claim, unstake, withdraw and re-create the active position; returns whether it succeeded"""
+    global active_position_id
+
+    # Import modules only when needed
+    from aerodrome_rewards_claim import send_claim_rewards
+    from aerodrome_unstake import unstake_position
+    import aerodrome_withdraw
+
+    rebalance_id = store.start_rebalance(active_position_id, reason="out of range")
+
+    # 1. Claim rewards; broadcast without waiting so the unstake goes out right behind it
+    try:
+        claim_tx_hash = send_claim_rewards(active_position_id)
+    except Exception as e:
+        logger.warning(f"Error sending claim transaction: {e}")
+        claim_tx_hash = None
+
+    # 2. Unstake position
+    if not unstake_position(active_position_id):
+        logger.error("Failed to unstake position, aborting rebalance")
+        store.finish_rebalance(rebalance_id, 'failed')
+        return False
+
+    # The claim has the lower nonce, so it is already mined by now
+    if claim_tx_hash is None or wait_for_receipt(claim_tx_hash).status != 1:
+        logger.warning("Failed to claim rewards, continuing with rebalance anyway")
+
+    # 3. Withdraw position
+    try:
+        if REBALANCE_MODE == 'atomic':
+            logger.info(f"Withdrawing position {active_position_id} in a single multicall transaction")
+            if not aerodrome_withdraw.withdraw_position_atomic(active_position_id):
+                logger.error("Atomic withdrawal failed, aborting rebalance")
+                store.finish_rebalance(rebalance_id, 'failed')
+                return False
+        else:
+            logger.info("Withdrawing position using aerodrome_withdraw.py")
+            aerodrome_withdraw.main()
+    except Exception as e:
+        logger.error(f"Error in withdrawal step: {e}")
+        store.finish_rebalance(rebalance_id, 'failed')
+        return False
+
+    # 4. Create new position
+    active_position_id = create_position()
+
+    if active_position_id:
+        logger.info(f"Rebalance complete, new position ID: {active_position_id}")
+        store.finish_rebalance(rebalance_id, 'completed', active_position_id)
+        return True
+    logger.error("Rebalance failed - could not create new position")
+    store.finish_rebalance(rebalance_id, 'failed')
+    return False
+
+def monitor_and_rebalance(force=False, min_interval=POSITION_CHECK_INTERVAL):
+    """Monitor position and rebalance if needed
+
+    Checks are throttled to one per `min_interval` seconds unless `force`
+    is set. After a failed rebalance nothing is attempted, forced or not,
+    until the backoff (REBALANCE_BACKOFF_BASE, doubling per failure up to
+    REBALANCE_BACKOFF_CAP) has passed.
+    """
     global active_position_id, last_position_check
 
     current_time = time.time()
 
+    if current_time < rebalance_retry_at:
+        logger.debug(f"Rebalance backoff, next attempt in {rebalance_retry_at - current_time:.0f}s")
+        return
+
     # Limit check frequency
-    if last_position_check and current_time - last_position_check < 300:  # 5 minutes
+    if not force and last_position_check and current_time - last_position_check < min_interval:
         return
 
     last_position_check = current_time
@@ -323,12 +415,11 @@ def monitor_and_rebalance():
 
     if active_position_id is None:
         # Find active position if we don't know it
-        positions = list_positions()
-        if positions:
-            active_position_id = positions[0]['token_id']
-        else:
+        active_position_id = find_active_position()
+        if active_position_id is None:
             logger.info("No active position found, creating one...")
             active_position_id = create_position()
+            record_rebalance_result(active_position_id is not None)
             return
 
     # Check if position is in range
@@ -336,63 +427,65 @@ def monitor_and_rebalance():
 
     if in_range is False:  # Only rebalance if explicitly out of range
         logger.info("Position out of range, rebalancing...")
-
-        # Import modules only when needed
-        from aerodrome_rewards_claim import claim_rewards
-        from aerodrome_unstake import unstake_position
-        import aerodrome_withdraw
-
-        # 1. Claim rewards
-        if not claim_rewards(active_position_id):
-            logger.warning("Failed to claim rewards, continuing with rebalance anyway")
-
-        # 2. Unstake position
-        if not unstake_position(active_position_id):
-            logger.error("Failed to unstake position, aborting rebalance")
-            return
-
-        # 3. Withdraw position
         try:
-            logger.info("Withdrawing position using aerodrome_withdraw.py")
-            aerodrome_withdraw.main()
+            succeeded = rebalance_active_position(get_state_store())
         except Exception as e:
-            logger.error(f"Error in withdrawal step: {e}")
-            return
+            logger.error(f"Error during rebalance: {e}")
+            succeeded = False
+        record_rebalance_result(succeeded)
 
-        # 4. Create new position
-        active_position_id = create_position()
+def reconcile_approvals():
+    """Catch the approval ledger up with on-chain Approval events; run while idle"""
+    try:
+        get_approval_ledger().reconcile(
+            [get_wallet_address()], [WETH_ADDRESS, USDC_ADDRESS, AERO_ADDRESS, NPM_ADDRESS]
+        )
+    except Exception as e:
+        logger.warning(f"Approval ledger reconciliation failed: {e}")
+
+def log_cache_stats():
+    """Log read cache effectiveness"""
+    stats = get_read_cache().stats()
+    logger.info(f"Read cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%}), {stats['entries']} entries, "
+                f"{stats['invalidations']} invalidated")
+
+def find_active_position():
+    """Newest staked position from the staked index, else the first position in the wallet"""
+    staked = get_staked_index().staked_positions()
+    if staked:
+        return staked[0]
+    positions = list_positions()
+    return positions[0]['token_id'] if positions else None
 
-        if active_position_id:
-            logger.info(f"Rebalance complete, new position ID: {active_position_id}")
-        else:
-            logger.error("Rebalance failed - could not create new position")
+def update_staked_index():
+    """Advance the staked index to the latest block; run while idle"""
+    try:
+        get_staked_index().update()
+    except Exception as e:
+        logger.warning(f"Staked index update failed: {e}")
 
 def list_positions():
-    """List all CL positions owned by the user"""
+    """List all CL positions owned by the user (staked positions are held by the gauge)"""
     try:
-        # Get number of positions owned by the user
-        num_positions = npm_contract.functions.balanceOf(wallet_address).call()
+        # Balance, token IDs and position tuples in one multicall snapshot
+        snapshot = get_positions_snapshot(get_wallet_address())
+        num_positions = snapshot['balance']
 
         if num_positions == 0:
             logger.info("No positions found")
             return []
 
         positions = []
-        logger.info(f"Found {num_positions} position(s)")
-
-        for i in range(num_positions):
-            # Get token ID for each position
-            token_id = npm_contract.functions.tokenOfOwnerByIndex(wallet_address, i).call()
+        logger.info(f"Found {num_positions} position(s) at block {snapshot['block_number']}")
 
-            # Get position details
-            position = npm_contract.functions.positions(token_id).call()
-
-            # Extract relevant details
-            token0 = position[2]
-            token1 = position[3]
-            tick_lower = position[5]
-            tick_upper = position[6]
-            liquidity = position[7]
+        for i, position in enumerate(snapshot['positions']):
+            token_id = position['token_id']
+            token0 = position['token0']
+            token1 = position['token1']
+            tick_lower = position['tick_lower']
+            tick_upper = position['tick_upper']
+            liquidity = position['liquidity']
 
             # Determine token names
             token0_name = "WETH" if token0.lower() == WETH_ADDRESS.lower() else "USDC"
@@ -422,6 +515,23 @@ def list_positions():
         logger.error(f"Error listing positions: {e}")
         return []
 
+def warm_up():
+    """Load the signing key and the rebalance modules in the background.
+
+    Startup does not wait for KMS, and the first rebalance does not pay
+    for the key decryption or for importing the sibling modules.
+    """
+    def load():
+        get_signer().warm_up()
+        for module_name in (get_deposit_file(), 'aerodrome_withdraw',
+                            'aerodrome_rewards_claim', 'aerodrome_unstake'):
+            try:
+                __import__(module_name)
+            except Exception as e:
+                logger.warning(f"Could not preload {module_name}: {e}")
+
+    threading.Thread(target=load, name="warm-up", daemon=True).start()
+
 def initialize_bot():
     """Initialize the bot and find or create a position"""
     global active_position_id
@@ -432,37 +542,155 @@ def initialize_bot():
     weth_balance, usdc_balance, aero_balance = get_token_balances()
     logger.info(f"Initial balances: {weth_balance} WETH, {usdc_balance} USDC, {aero_balance} AERO")
 
-    # Check for existing positions
-    positions = list_positions()
+    # Resume from the state store and the staked index; only scan the wallet when neither knows a position
+    store = get_state_store()
+    staked_index = get_staked_index()
+    staked_index.update()
+    stored_id = store.active_position_id()
+    stored = store.get_position(stored_id) if stored_id else None
+    staked_ids = staked_index.staked_positions()
+
+    if stored and stored['status'] in (STATUS_OPEN, STATUS_STAKED):
+        active_position_id = stored_id
+        if stored['tick_lower'] is not None:
+            position_ranges[stored_id] = (stored['tick_lower'], stored['tick_upper'])
+        is_staked = staked_index.is_staked(stored_id)
+        logger.info(f"Resuming with stored position {stored_id} ({'staked' if is_staked else 'unstaked'}), "
+                    f"last seen block {store.last_seen_block()}")
+        if not is_staked:
+            stake_position(active_position_id)
+    elif staked_ids:
+        # Staked positions are not in the wallet, but the index knows them
+        active_position_id = staked_ids[0]
+        store.record_position(active_position_id, owner=get_wallet_address(), pool=POOL_ADDRESS, status=STATUS_STAKED)
+        store.set_active_position(active_position_id)
+        logger.info(f"Using staked position: {active_position_id}")
+    else:
+        # Check for existing (unstaked) positions in the wallet
+        positions = list_positions()
+
+        if positions:
+            # Use the first position found
+            active_position_id = positions[0]['token_id']
+            logger.info(f"Using existing position: {active_position_id}")
+            with store.transaction():
+                for position in positions:
+                    store.record_position(
+                        position['token_id'], owner=get_wallet_address(), pool=POOL_ADDRESS,
+                        tick_lower=position['tick_lower'], tick_upper=position['tick_upper'],
+                        liquidity=position['liquidity'], status=STATUS_OPEN
+                    )
+
+            # Positions found in the wallet are unstaked by definition
+            stake_position(active_position_id)
+        else:
+            # Create a new position
+            logger.info("No positions found, creating a new one")
+            active_position_id = create_position()
+
+    logger.info("Bot initialized successfully")
+
+def tick_is_in_active_range(tick):
+    """Check a pool tick against the cached range of the active position (None if unknown)"""
+    position_range = position_ranges.get(active_position_id)
+    if position_range is None:
+        return None
+    return tick_math.in_range(tick, *position_range)
 
-    if positions:
-        # Use the first position found
-        active_position_id = positions[0]['token_id']
-        logger.info(f"Using existing position: {active_position_id}")
+async def run_event_driven_bot():
+    """Event loop that re-checks the position only when the pool tick changes.
 
-        # Check if position is staked - if not, stake it
+    Rebalances run as background tasks so the monitor keeps polling its
+    filters (which expire when left unpolled) while transactions confirm.
+    """
+    rebalance_lock = asyncio.Lock()
+    rebalance_tasks = set()  # strong references until each task finishes
+
+    async def on_new_block(block_hash):
         try:
-            # We could verify if position is already staked here, but for simplicity
-            # we'll just try to stake it and handle any errors
-            stake_position(active_position_id)
+            block = await asyncio.to_thread(web3.eth.get_block, block_hash)
         except Exception as e:
-            logger.warning(f"Error staking position (might already be staked): {e}")
-    else:
-        # Create a new position
-        logger.info("No positions found, creating a new one")
-        active_position_id = create_position()
+            logger.warning(f"Could not read new block {web3.to_hex(block_hash)}: {e}")
+            return
+        get_read_cache().observe_block(block['number'], block_hash)
+        get_state_store().set_last_seen_block(block['number'])
 
-    logger.info("Bot initialized successfully")
+    async def rebalance():
+        async with rebalance_lock:
+            try:
+                await asyncio.to_thread(monitor_and_rebalance, False, EVENT_CHECK_INTERVAL)
+            except Exception as e:
+                logger.error(f"Error in event-triggered rebalance: {e}")
+
+    async def on_tick_change(tick, block_number):
+        get_state_store().set_last_seen_block(block_number)
+
+        # Nothing to do while the tick stays inside the known range
+        if tick_is_in_active_range(tick):
+            return
+        # Out of range: at most one check per EVENT_CHECK_INTERVAL, none while a failed rebalance backs off
+        now = time.time()
+        if now < rebalance_retry_at or (last_position_check and now - last_position_check < EVENT_CHECK_INTERVAL):
+            return
+
+        # A check or rebalance is already running and will see the new tick
+        if rebalance_lock.locked():
+            return
+
+        logger.info(f"Pool tick moved to {tick} at block {block_number}, checking position")
+        task = asyncio.create_task(rebalance())
+        rebalance_tasks.add(task)
+        task.add_done_callback(rebalance_tasks.discard)
+
+    async def run_periodic_tasks():
+        while True:
+            try:
+                schedule.run_pending()
+
+                # Throttled safety check in case swap events were missed
+                async with rebalance_lock:
+                    await asyncio.to_thread(monitor_and_rebalance)
+
+                # Idle time: nothing is being rebalanced while the lock is free
+                if not rebalance_lock.locked():
+                    await asyncio.to_thread(update_staked_index)
+                    await asyncio.to_thread(reconcile_approvals)
+                    await asyncio.to_thread(recover_dropped_transactions)
+            except Exception as e:
+                logger.error(f"Error in periodic tasks: {e}")
+
+            await asyncio.sleep(60)
+
+    monitor = TickMonitor(POOL_ADDRESS, on_tick_change, on_new_block=on_new_block,
+                          initial_tick=pool_state.snapshot().tick)
+    await asyncio.gather(monitor.run(), run_periodic_tasks())
 
 def run_bot():
     """Main bot loop"""
+    # Load the key and rebalance modules while the bot initializes
+    warm_up()
+
+    if MONITOR_MODE == 'portfolio':
+        # Several pools configured in pools.json, managed by portfolio.py for
+        # the default wallet and every wallet listed in AERODROME_WALLETS
+        from portfolio import run_wallets
+        load_wallets()
+        run_wallets()
+        return
+
     # Initialize bot
     initialize_bot()
 
     # Schedule daily claim and sell at midnight
     schedule.every().day.at("00:00").do(daily_claim_and_sell)
+    schedule.every().hour.do(log_cache_stats)
+
+    if MONITOR_MODE == 'events':
+        logger.info("Monitoring pool Swap events")
+        asyncio.run(run_event_driven_bot())
+        return
 
-    # Main loop
+    # Classic polling loop
     while True:
         try:
             # Run scheduled tasks
@@ -470,6 +698,9 @@ def run_bot():
 
             # Monitor and rebalance if needed
             monitor_and_rebalance()
+            update_staked_index()
+            reconcile_approvals()
+            recover_dropped_transactions()
 
             # Sleep to avoid excessive API calls
             time.sleep(60)  # Check every minute
@@ -480,6 +711,7 @@ def run_bot():
 
 def main():
     """Entry point"""
+    setup_logging()
     try:
         run_bot()
     except KeyboardInterrupt:
@@ -0,0 +1,126 @@
+# aerodrome_monitor.py
+import os
+import asyncio
+import inspect
+import logging
+from web3 import Web3
+from wallet_setup import web3
+from read_cache import get_read_cache
+
+logger = logging.getLogger()
+
+# Topic of the CL pool Swap event
+SWAP_EVENT_TOPIC = Web3.to_hex(Web3.keccak(text="Swap(address,address,int256,int256,uint160,uint128,int24)"))
+
+# Optional WebSocket endpoint; without it the monitor polls eth_newFilter filters
+WS_URL = os.getenv('AERODROME_WS_URL')
+POLL_INTERVAL = 2  # seconds, roughly one Base block
+RECONNECT_DELAY = 5  # seconds
+
+def decode_swap_log(log):
+    """Extract (tick, sqrt_price_x96, block_number) from a pool Swap log"""
+    data = bytes(log['data'])
+    # data = amount0, amount1, sqrtPriceX96, liquidity, tick (one 32-byte word each)
+    sqrt_price_x96 = int.from_bytes(data[64:96], 'big')
+    tick = int.from_bytes(data[128:160], 'big', signed=True)
+    return tick, sqrt_price_x96, log['blockNumber']
+
+async def _call(callback, *args):
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        await result
+
+class TickMonitor:
+    """Watches a pool for Swap events and reports only actual tick changes.
+
+    on_tick_change(tick, block_number) is called whenever a swap moves the
+    pool to a different tick; on_new_block(block_hash), if given, for every
+    new block. Both may be plain functions or coroutines. Subscribes over
+    WebSocket when ws_url is set, otherwise polls eth_newFilter filters.
+    """
+
+    def __init__(self, pool_address, on_tick_change, on_new_block=None,
+                 ws_url=WS_URL, poll_interval=POLL_INTERVAL, web3_instance=None, initial_tick=None):
+        self.web3 = web3_instance or web3
+        self.pool_address = self.web3.to_checksum_address(pool_address)
+        self.on_tick_change = on_tick_change
+        self.on_new_block = on_new_block
+        self.ws_url = ws_url
+        self.poll_interval = poll_interval
+        self.last_tick = initial_tick
+        self.running = False
+
+    def _log_filter_params(self):
+        return {'address': self.pool_address, 'topics': [SWAP_EVENT_TOPIC]}
+
+    async def _handle_swap(self, log):
+        # Swap logs double as head/reorg signals for the read cache
+        if log.get('removed'):
+            get_read_cache().observe_reorg(log['blockNumber'])
+            return
+        get_read_cache().observe_block(log['blockNumber'], log['blockHash'])
+
+        tick, _, block_number = decode_swap_log(log)
+        if tick == self.last_tick:
+            return
+        self.last_tick = tick
+        await _call(self.on_tick_change, tick, block_number)
+
+    async def _handle_block(self, block_hash):
+        if self.on_new_block is not None:
+            await _call(self.on_new_block, block_hash)
+
+    async def run(self):
+        """Run until stop() is called, falling back to polling if the WebSocket fails"""
+        self.running = True
+        while self.running:
+            try:
+                if self.ws_url:
+                    await self._run_websocket()
+                else:
+                    await self._run_filter_polling()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Monitor error: {e}")
+                if self.ws_url:
+                    logger.warning("WebSocket subscription failed, falling back to filter polling")
+                    self.ws_url = None
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    def stop(self):
+        self.running = False
+
+    async def _run_filter_polling(self):
+        swap_filter = await asyncio.to_thread(self.web3.eth.filter, self._log_filter_params())
+        block_filter = await asyncio.to_thread(self.web3.eth.filter, 'latest') if self.on_new_block else None
+        logger.info(f"Polling Swap events for pool {self.pool_address} every {self.poll_interval}s")
+
+        while self.running:
+            if block_filter is not None:
+                for block_hash in await asyncio.to_thread(block_filter.get_new_entries):
+                    await self._handle_block(block_hash)
+
+            for log in await asyncio.to_thread(swap_filter.get_new_entries):
+                await self._handle_swap(log)
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run_websocket(self):
+        from web3 import AsyncWeb3, WebSocketProvider
+
+        async with AsyncWeb3(WebSocketProvider(self.ws_url)) as w3:
+            logs_subscription = await w3.eth.subscribe('logs', self._log_filter_params())
+            if self.on_new_block:
+                await w3.eth.subscribe('newHeads')
+            logger.info(f"Subscribed to Swap events for pool {self.pool_address} over WebSocket")
+
+            async for message in w3.socket.process_subscriptions():
+                if not self.running:
+                    break
+                if message['subscription'] == logs_subscription:
+                    await self._handle_swap(message['result'])
+                else:
+                    head = message['result']
+                    get_read_cache().observe_block(head['number'], head['hash'])
+                    await self._handle_block(head['hash'])
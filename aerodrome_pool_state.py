@@ -0,0 +1,137 @@
+# aerodrome_pool_state.py
+import time
+from collections import namedtuple
+from decimal import Decimal
+from wallet_setup import web3
+from multicall import Call, aggregate, block_number_call
+from aerodrome_client import get_contract
+
+Q96 = Decimal(2**96)
+
+# Fields that never change for a deployed pool
+PoolImmutables = namedtuple('PoolImmutables', [
+    'tick_spacing', 'token0', 'token1', 'decimals0', 'decimals1'
+])
+
+# Pool state as of a single block
+PoolSnapshot = namedtuple('PoolSnapshot', [
+    'block_number', 'fetched_at', 'sqrt_price_x96', 'tick', 'liquidity',
+    'fee_growth_global0_x128', 'fee_growth_global1_x128',
+    'tick_spacing', 'token0', 'token1', 'decimals0', 'decimals1'
+])
+
+def price_from_sqrt_price_x96(sqrt_price_x96, decimals0, decimals1):
+    """Price of token0 in units of token1, adjusted for token decimals"""
+    return (Decimal(sqrt_price_x96) / Q96) ** 2 * Decimal(10) ** (decimals0 - decimals1)
+
+class PoolState:
+    """Reads pool state with immutable fields cached for the life of the process"""
+
+    def __init__(self, pool_address):
+        self.address = web3.to_checksum_address(pool_address)
+        self.contract = get_contract('pool', self.address)
+        self.immutables = None
+        self.last_snapshot = None
+
+    def _snapshot_calls(self):
+        """slot0, liquidity and fee growth, plus the immutable fields until they are known"""
+        calls = [
+            Call(self.contract, 'slot0'),
+            Call(self.contract, 'liquidity'),
+            Call(self.contract, 'feeGrowthGlobal0X128'),
+            Call(self.contract, 'feeGrowthGlobal1X128')
+        ]
+        if self.immutables is None:
+            calls += [
+                Call(self.contract, 'tickSpacing'),
+                Call(self.contract, 'token0'),
+                Call(self.contract, 'token1')
+            ]
+        return calls
+
+    def _build_snapshot(self, block, results):
+        slot0, liquidity, fee_growth0, fee_growth1 = results[:4]
+        immutables = self.immutables
+        self.last_snapshot = PoolSnapshot(
+            block_number=block,
+            fetched_at=time.time(),
+            sqrt_price_x96=slot0[0],
+            tick=slot0[1],
+            liquidity=liquidity,
+            fee_growth_global0_x128=fee_growth0,
+            fee_growth_global1_x128=fee_growth1,
+            tick_spacing=immutables.tick_spacing,
+            token0=immutables.token0,
+            token1=immutables.token1,
+            decimals0=immutables.decimals0,
+            decimals1=immutables.decimals1
+        )
+        return self.last_snapshot
+
+    def is_fresh(self, block_number=None, max_age=0):
+        """Whether the last snapshot can be reused.
+
+        A snapshot is fresh if it was taken at or after `block_number`, or
+        less than `max_age` seconds ago.
+        """
+        snapshot = self.last_snapshot
+        if snapshot is None:
+            return False
+        if block_number is not None and snapshot.block_number >= block_number:
+            return True
+        return max_age > 0 and time.time() - snapshot.fetched_at < max_age
+
+    def snapshot(self, block_number=None, max_age=0):
+        """Return pool state, re-using the last snapshot while it is fresh.
+
+        Mutable fields are read in one aggregate3 call. The very first call
+        also reads tickSpacing/token0/token1 in the same batch and the token
+        decimals in a second one; afterwards those are served from memory.
+        Use snapshot_pools() to read several pools in the same call.
+        """
+        if self.is_fresh(block_number, max_age):
+            return self.last_snapshot
+
+        return snapshot_pools([self])[0]
+
+    def price(self, snapshot=None):
+        """Price of token0 in token1 for a snapshot (defaults to the last one)"""
+        snapshot = snapshot or self.last_snapshot
+        return price_from_sqrt_price_x96(snapshot.sqrt_price_x96, snapshot.decimals0, snapshot.decimals1)
+
+def snapshot_pools(pool_states):
+    """Snapshot several pools in one aggregate3 call, all at the same block.
+
+    Pools read for the first time need one more aggregate3 (shared by all
+    of them) for their token decimals.
+    """
+    calls = [block_number_call()]
+    spans = []
+    for state in pool_states:
+        state_calls = state._snapshot_calls()
+        spans.append((state, len(calls), len(state_calls)))
+        calls += state_calls
+    results = aggregate(calls)
+    block = results[0]
+
+    # Token decimals of pools seen for the first time, in one more call
+    new_pools = [(state, results[start + 4:start + 7]) for state, start, _ in spans if state.immutables is None]
+    if new_pools:
+        decimals = aggregate([
+            Call(get_contract('erc20', token), 'decimals')
+            for _, (_, token0, token1) in new_pools for token in (token0, token1)
+        ], block_identifier=block)
+        for i, (state, (tick_spacing, token0, token1)) in enumerate(new_pools):
+            state.immutables = PoolImmutables(tick_spacing, token0, token1, decimals[2 * i], decimals[2 * i + 1])
+
+    return [state._build_snapshot(block, results[start:start + count]) for state, start, count in spans]
+
+# One reader per pool, shared by every module in the process
+_pool_states = {}
+
+def get_pool_state(pool_address):
+    """Get the process-wide PoolState for a pool"""
+    key = pool_address.lower()
+    if key not in _pool_states:
+        _pool_states[key] = PoolState(pool_address)
+    return _pool_states[key]
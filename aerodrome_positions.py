@@ -0,0 +1,115 @@
+# aerodrome_positions.py
+from web3 import Web3
+from wallet_setup import web3
+from multicall import Call, aggregate, block_number_call
+from aerodrome_client import get_contract
+
+# Number of tokenOfOwnerByIndex calls sent speculatively alongside balanceOf.
+# Wallets holding up to this many positions are enumerated in two aggregate3 calls.
+PREFETCH_INDEXES = 32
+
+npm_contract = get_contract('npm')
+
+# NPM events emitted by mint: Transfer(from, to, tokenId) from the zero address,
+# then IncreaseLiquidity(tokenId indexed, liquidity, amount0, amount1)
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+INCREASE_LIQUIDITY_TOPIC = Web3.to_hex(Web3.keccak(text="IncreaseLiquidity(uint256,uint128,uint256,uint256)"))
+ZERO_ADDRESS = '0x' + '00' * 20
+
+def position_from_tuple(token_id, position):
+    """Convert a raw positions(tokenId) tuple into a position dict"""
+    return {
+        'token_id': token_id,
+        'operator': position[1],
+        'token0': position[2],
+        'token1': position[3],
+        'tick_spacing': position[4],
+        'tick_lower': position[5],
+        'tick_upper': position[6],
+        'liquidity': position[7],
+        'fee_growth_inside0_last_x128': position[8],
+        'fee_growth_inside1_last_x128': position[9],
+        'tokens_owed0': position[10],
+        'tokens_owed1': position[11]
+    }
+
+def get_positions_snapshot(owner, npm=None, prefetch=PREFETCH_INDEXES):
+    """Fetch every position owned by `owner` in as few Multicall3 round trips as possible.
+
+    The first aggregate3 reads the block number, balanceOf and the first
+    `prefetch` token IDs (out of range indexes are allowed to revert). The
+    second reads every positions(tokenId) tuple, pinned to the block of the
+    first call so the snapshot is consistent. Wallets holding more than
+    `prefetch` positions need one extra round for the remaining token IDs.
+
+    Returns a dict with 'block_number', 'balance' and 'positions' (a list of
+    position dicts in wallet enumeration order).
+    """
+    npm = npm or npm_contract
+
+    first_calls = [block_number_call(), Call(npm, 'balanceOf', [owner])]
+    first_calls += [
+        Call(npm, 'tokenOfOwnerByIndex', [owner, i], allow_failure=True)
+        for i in range(prefetch)
+    ]
+    first_results = aggregate(first_calls)
+    block_number, balance = first_results[0], first_results[1]
+    token_ids = first_results[2:2 + min(balance, prefetch)]
+
+    if balance > len(token_ids):
+        token_ids += aggregate(
+            [Call(npm, 'tokenOfOwnerByIndex', [owner, i]) for i in range(len(token_ids), balance)],
+            block_identifier=block_number
+        )
+
+    raw_positions = aggregate(
+        [Call(npm, 'positions', [token_id]) for token_id in token_ids],
+        block_identifier=block_number
+    ) if token_ids else []
+
+    return {
+        'block_number': block_number,
+        'balance': balance,
+        'positions': [
+            position_from_tuple(token_id, position)
+            for token_id, position in zip(token_ids, raw_positions)
+        ]
+    }
+
+def parse_mint_receipt(receipt, npm=None, recipient=None):
+    """Extract the result of a mint from its receipt, without further RPC calls.
+
+    Returns a dict with 'token_id', 'liquidity', 'amount0', 'amount1',
+    'gas_used', 'block_number' and 'tx_hash', or None if the receipt holds
+    no mint (to `recipient`, if given) by the position manager.
+    """
+    npm_address = (npm or npm_contract).address.lower()
+    minted = {}  # token ID -> recipient
+    increases = {}  # token ID -> (liquidity, amount0, amount1)
+
+    for log in receipt['logs']:
+        topics = log['topics']
+        if log['address'].lower() != npm_address or not topics:
+            continue
+        topic = Web3.to_hex(topics[0])
+        if topic == TRANSFER_TOPIC and len(topics) == 4:
+            if '0x' + bytes(topics[1])[-20:].hex() == ZERO_ADDRESS:
+                minted[int.from_bytes(bytes(topics[3]), 'big')] = '0x' + bytes(topics[2])[-20:].hex()
+        elif topic == INCREASE_LIQUIDITY_TOPIC and len(topics) == 2:
+            token_id = int.from_bytes(bytes(topics[1]), 'big')
+            increases[token_id] = web3.codec.decode(['uint128', 'uint256', 'uint256'], bytes(log['data']))
+
+    for token_id, to in minted.items():
+        if recipient is not None and to != recipient.lower():
+            continue
+        liquidity, amount0, amount1 = increases.get(token_id, (0, 0, 0))
+        return {
+            'token_id': token_id,
+            'liquidity': liquidity,
+            'amount0': amount0,
+            'amount1': amount1,
+            'gas_used': receipt['gasUsed'],
+            'block_number': receipt['blockNumber'],
+            'tx_hash': receipt['transactionHash']
+        }
+    return None
@@ -1,55 +1,64 @@
 # aerodrome_rewards_claim.py
 import time
 import logging
-import json
-import os
-from wallet_setup import web3, wallet_address, private_key
+from wallet_setup import get_wallet_address
+from nonce_manager import send_transaction, wait_for_receipt
+from fee_engine import build_transaction, describe_fees
+from simulation import TransactionReverted
+from aerodrome_client import CL_GAUGE_ADDRESS, get_contract
+from state_store import get_state_store
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("aerodrome_rewards.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger()
-
-# Contract address
-CL_GAUGE_ADDRESS = web3.to_checksum_address("0xF33a96b5932D9E9B9A0eDA447AbD8C9d48d2e0c8")
+def setup_logging():
+    """Configure logging; only called when run as a script so imports stay side-effect free"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("aerodrome_rewards.log"),
+            logging.StreamHandler()
+        ]
+    )
 
-# File where position ID is stored
-POSITION_FILE = "active_position.json"
-
-# Gauge ABI
-GAUGE_ABI = '''[{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"getReward","outputs":[],"stateMutability":"nonpayable","type":"function"}]'''
+logger = logging.getLogger()
 
-# Initialize contract
-gauge_contract = web3.eth.contract(address=CL_GAUGE_ADDRESS, abi=GAUGE_ABI)
+# Shared gauge contract
+gauge_contract = get_contract('gauge')
 
 def get_stored_position_id():
-    """Get position ID from stored file"""
+    """Get the active position ID from the state store"""
     try:
-        if not os.path.exists(POSITION_FILE):
-            logger.warning(f"Position file {POSITION_FILE} not found")
-            return None
-            
-        with open(POSITION_FILE, 'r') as f:
-            data = json.load(f)
-            
-        token_id = data.get('position_id')
+        token_id = get_state_store().active_position_id()
         if token_id:
             logger.info(f"Found stored position ID: {token_id}")
             return token_id
         else:
-            logger.warning("No position ID found in stored file")
+            logger.warning("No active position ID in the state store")
             return None
-            
+
     except Exception as e:
         logger.error(f"Error reading stored position ID: {e}")
         return None
 
+def send_claim_rewards(token_id):
+    """Build and broadcast a getReward transaction, returning the tx hash without waiting"""
+    # Build transaction with estimated gas and current EIP-1559 fees
+    tx = build_transaction(gauge_contract.functions.getReward(token_id))
+
+    # Log transaction details
+    logger.info("Transaction details:")
+    logger.info(f"  From: {get_wallet_address()}")
+    logger.info(f"  To: {CL_GAUGE_ADDRESS}")
+    logger.info(f"  Gas: {describe_fees(tx)}")
+    logger.info(f"  Function: getReward({token_id})")
+
+    # Sign and send transaction with the next managed nonce
+    tx_hash = send_transaction(tx)
+    tx_hash_hex = tx_hash.hex()
+
+    logger.info(f"Transaction sent: {tx_hash_hex}")
+    logger.info(f"Track on BaseScan: https://basescan.org/tx/{tx_hash_hex}")
+    return tx_hash
+
 def claim_rewards(token_id=None):
     """Claim rewards for a staked position"""
     try:
@@ -62,38 +71,12 @@ def claim_rewards(token_id=None):
                 
         logger.info(f"Claiming rewards for position ID: {token_id}")
         
-        # Get transaction parameters
-        nonce = web3.eth.get_transaction_count(wallet_address)
-        gas_price = int(web3.eth.gas_price * 1.2)
-        
-        # Build transaction
-        tx = gauge_contract.functions.getReward(token_id).build_transaction({
-            'from': wallet_address,
-            'nonce': nonce,
-            'gasPrice': gas_price,
-            'gas': 1000000,  # 1M gas limit
-            'chainId': web3.eth.chain_id
-        })
-        
-        # Log transaction details
-        logger.info(f"Transaction details:")
-        logger.info(f"  From: {wallet_address}")
-        logger.info(f"  To: {CL_GAUGE_ADDRESS}")
-        logger.info(f"  Gas Price: {gas_price / 1e9:.2f} Gwei")
-        logger.info(f"  Gas Limit: 1,000,000")
-        logger.info(f"  Function: getReward({token_id})")
-        
-        # Sign and send transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = send_claim_rewards(token_id)
         tx_hash_hex = tx_hash.hex()
         
-        logger.info(f"Transaction sent: {tx_hash_hex}")
-        logger.info(f"Track on BaseScan: https://basescan.org/tx/{tx_hash_hex}")
-        
         # Wait for receipt
         logger.info("Waiting for transaction to be mined...")
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        receipt = wait_for_receipt(tx_hash)
         
         if receipt.status == 1:
             logger.info(f"Rewards successfully claimed for position {token_id}!")
@@ -103,14 +86,18 @@ def claim_rewards(token_id=None):
             logger.error(f"Check transaction: https://basescan.org/tx/{tx_hash_hex}")
             return False
     
+    except TransactionReverted as e:
+        # Caught by the pre-flight simulation; nothing was broadcast
+        logger.error(f"Claim would revert ({e.reason}); there might be no rewards to claim or the position is not staked")
+        return False
     except Exception as e:
         logger.error(f"Error claiming rewards: {e}")
-        if "execution reverted" in str(e).lower():
-            logger.error("There might be no rewards to claim or the position is not staked")
         return False
 
 # When run directly
 if __name__ == "__main__":
+    setup_logging()
+
     # If command line argument is provided, use it as token_id
     import sys
     if len(sys.argv) > 1:
@@ -1,69 +1,55 @@
 # aerodrome_stake.py
-import time
 import logging
-import json
-import os
-from wallet_setup import web3, wallet_address, private_key
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("aerodrome_stake.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger()
-
-# Contract addresses
-NPM_ADDRESS = web3.to_checksum_address("0x827922686190790b37229fd06084350e74485b72")
-CL_GAUGE_ADDRESS = web3.to_checksum_address("0xF33a96b5932D9E9B9A0eDA447AbD8C9d48d2e0c8")
-
-# ABIs
-NPM_ABI = '''[
-    {"inputs":[{"internalType":"address","name":"owner","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"uint256","name":"index","type":"uint256"}],"name":"tokenOfOwnerByIndex","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"approve","outputs":[],"stateMutability":"nonpayable","type":"function"},
-    {"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"getApproved","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"}
-]'''
-
-CL_GAUGE_ABI = '''[
-    {"inputs":[{"internalType":"uint256","name":"_tokenId","type":"uint256"}],"name":"deposit","outputs":[],"stateMutability":"nonpayable","type":"function"}
-]'''
+from wallet_setup import get_wallet_address
+from nonce_manager import send_transaction, wait_for_receipt
+from fee_engine import build_transaction
+from batch_reader import gather_context
+from multicall import Call
+from aerodrome_client import NPM_ADDRESS, CL_GAUGE_ADDRESS, get_contract
+from aerodrome_positions import get_positions_snapshot
+from confirmations import wait_until
+from approval_ledger import get_approval_ledger
+from state_store import get_state_store
+from staked_index import get_staked_index
+
+def setup_logging():
+    """Configure logging; only called when run as a script so imports stay side-effect free"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("aerodrome_stake.log"),
+            logging.StreamHandler()
+        ]
+    )
 
-# Initialize contracts
-npm_contract = web3.eth.contract(address=NPM_ADDRESS, abi=NPM_ABI)
-cl_gauge_contract = web3.eth.contract(address=CL_GAUGE_ADDRESS, abi=CL_GAUGE_ABI)
-
-# File to store the position ID
-POSITION_FILE = "active_position.json"
+logger = logging.getLogger()
 
-def store_position_id(token_id):
-    """Store position ID to file"""
-    data = {
-        'position_id': token_id,
-        'timestamp': time.time(),
-        'date': time.strftime('%Y-%m-%d %H:%M:%S')
-    }
+# Shared contracts
+npm_contract = get_contract('npm')
+cl_gauge_contract = get_contract('gauge')
 
-    with open(POSITION_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+def store_position_id(token_id, block_number=None):
+    """Record the position as staked (in the staked index) and active in the state store"""
+    store = get_state_store()
+    get_staked_index().record(token_id, True, block_number)
+    store.set_active_position(token_id)
 
-    logger.info(f"Position ID {token_id} stored in {POSITION_FILE}")
+    logger.info(f"Position ID {token_id} stored in {store.path}")
 
 def get_latest_position_id():
-    """Get the latest position owned by the wallet"""
-    try:
-        # Check how many positions we have
-        num_positions = npm_contract.functions.balanceOf(wallet_address).call()
+    """Get the newest position held (not staked) by the wallet.
 
-        if num_positions == 0:
+    Token IDs are assigned in mint order, so the newest position is the
+    highest ID in the batched snapshot, wherever the NFT enumeration puts it.
+    """
+    try:
+        snapshot = get_positions_snapshot(get_wallet_address())
+        if not snapshot['positions']:
             logger.warning("No positions found in wallet")
             return None
 
-        # Get the most recent position
-        latest_position = npm_contract.functions.tokenOfOwnerByIndex(wallet_address, num_positions - 1).call()
+        latest_position = max(position['token_id'] for position in snapshot['positions'])
         logger.info(f"Found latest position ID: {latest_position}")
         return latest_position
 
@@ -83,34 +69,27 @@ def check_position_approval(token_id, approval_address):
 def approve_position(token_id):
     """Approve the position for the gauge contract"""
     try:
-        # Check if already approved
-        if check_position_approval(token_id, CL_GAUGE_ADDRESS):
+        # Check if already approved, trusting the approval ledger when it knows the position
+        known, approved = get_approval_ledger().nft_approval(NPM_ADDRESS, token_id)
+        already_approved = approved == CL_GAUGE_ADDRESS if known else check_position_approval(token_id, CL_GAUGE_ADDRESS)
+        if already_approved:
             logger.info(f"Position {token_id} is already approved for gauge")
             return True
 
         logger.info(f"Approving position {token_id} for gauge...")
 
-        # Get fresh nonce and gas price
-        nonce = web3.eth.get_transaction_count(wallet_address)
-        gas_price = int(web3.eth.gas_price * 1.2)
-
-        # Build transaction
-        tx = npm_contract.functions.approve(CL_GAUGE_ADDRESS, token_id).build_transaction({
-            'from': wallet_address,
-            'nonce': nonce,
-            'gasPrice': gas_price,
-            'chainId': web3.eth.chain_id
-        })
+        # Build transaction with estimated gas and current EIP-1559 fees
+        tx = build_transaction(npm_contract.functions.approve(CL_GAUGE_ADDRESS, token_id))
 
-        # Sign and send transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        # Sign and send transaction with the next managed nonce
+        tx_hash = send_transaction(tx)
 
         logger.info(f"Approval transaction sent: {tx_hash.hex()}")
 
         # Wait for transaction receipt
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        receipt = wait_for_receipt(tx_hash)
         if receipt.status == 1:
+            get_approval_ledger().record_nft_approval(NPM_ADDRESS, token_id, CL_GAUGE_ADDRESS, receipt.blockNumber)
             logger.info(f"Position {token_id} approval successful")
             return True
         else:
@@ -133,44 +112,48 @@ def stake_position(token_id=None):
 
         logger.info(f"Preparing to stake position {token_id}")
 
+        # Approval status from the ledger, or read together with fees and nonce if needed
+        known, approved = get_approval_ledger().nft_approval(NPM_ADDRESS, token_id)
+        if known:
+            gather_context([])
+        else:
+            approved, = gather_context([Call(npm_contract, 'getApproved', [token_id])])
+
         # Approve to the gauge if needed
-        if not check_position_approval(token_id, CL_GAUGE_ADDRESS):
+        if (approved or '').lower() != CL_GAUGE_ADDRESS.lower():
             if not approve_position(token_id):
                 logger.error("Approval failed. Cannot stake.")
                 return False
-            logger.info("Approval successful. Waiting before deposit...")
-            time.sleep(5)  # Wait for approval to be registered
+            logger.info("Approval successful. Waiting for it to be visible before deposit...")
+            if not wait_until(
+                lambda: check_position_approval(token_id, CL_GAUGE_ADDRESS),
+                description=f"gauge approval of position {token_id}"
+            ):
+                logger.error("Approval not visible on-chain. Cannot stake.")
+                return False
 
         logger.info(f"Staking position {token_id}...")
 
-        # Get fresh nonce and gas price
-        nonce = web3.eth.get_transaction_count(wallet_address)
-        gas_price = int(web3.eth.gas_price * 1.2)
-
-        # Build transaction
-        tx = cl_gauge_contract.functions.deposit(token_id).build_transaction({
-            'from': wallet_address,
-            'nonce': nonce,
-            'gasPrice': gas_price,
-            'gas': 1000000,  # 1M gas limit
-            'chainId': web3.eth.chain_id
-        })
+        # Build transaction with estimated gas and current EIP-1559 fees
+        tx = build_transaction(cl_gauge_contract.functions.deposit(token_id))
 
-        # Sign and send transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        # Sign and send transaction with the next managed nonce
+        tx_hash = send_transaction(tx)
 
         logger.info(f"Staking transaction sent: {tx_hash.hex()}")
         logger.info(f"Track on BaseScan: https://basescan.org/tx/{tx_hash.hex()}")
 
         # Wait for transaction receipt
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        receipt = wait_for_receipt(tx_hash)
 
         if receipt.status == 1:
             logger.info(f"Position {token_id} successfully staked!")
 
+            # The transfer to the gauge clears the approval
+            get_approval_ledger().record_nft_approval(NPM_ADDRESS, token_id, None, receipt.blockNumber)
+
             # Store the position ID
-            store_position_id(token_id)
+            store_position_id(token_id, receipt.blockNumber)
 
             return True
         else:
@@ -183,4 +166,5 @@ def stake_position(token_id=None):
 
 # Main execution
 if __name__ == "__main__":
+    setup_logging()
     stake_position()
@@ -1,63 +1,59 @@
 # aerodrome_auto_deposit.py
+import os
 import time
 import math
 from decimal import Decimal, getcontext
-from wallet_setup import web3, wallet_address, private_key, weth_contract, usdc_contract
+from wallet_setup import get_wallet_address, weth_contract, usdc_contract, WETH_ADDRESS, USDC_ADDRESS
+from nonce_manager import send_transaction, wait_for_receipt, wait_for_receipts
+from fee_engine import build_transaction, describe_fees
+from simulation import TransactionReverted
+from confirmations import wait_for_next_block
+from batch_reader import gather_context
+from multicall import Call
+from approval_ledger import get_approval_ledger
+from state_store import get_state_store, STATUS_OPEN
+from strategy_config import strategy
 
 # Import rebalance function from aerodrome_swap
 from aerodrome_swap import rebalance_wallet, get_wallet_balances
+from aerodrome_pool_state import get_pool_state
+from aerodrome_positions import parse_mint_receipt
+from aerodrome_client import NPM_ADDRESS, POOL_ADDRESS, get_contract
+import tick_math
+import tick_math_np
 
 getcontext().prec = 28
 
-# Contract addresses
-NPM_ADDRESS = web3.to_checksum_address("0x827922686190790b37229fd06084350e74485b72")
-POOL_ADDRESS = web3.to_checksum_address("0xb2cc224c1c9feE385f8ad6a55b4d94E92359DC59")
-HELPER_ADDRESS = web3.to_checksum_address("0x9c62ab10577fB3C20A22E231b7703Ed6D456CC7a")
-WETH_ADDRESS = web3.to_checksum_address("0x4200000000000000000000000000000000000006")
-USDC_ADDRESS = web3.to_checksum_address("0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913")
-
-# ABIs
-POOL_ABI = '''
-[{"inputs":[],"name":"slot0","outputs":[{"internalType":"uint160","name":"sqrtPriceX96","type":"uint160"},{"internalType":"int24","name":"tick","type":"int24"},{"internalType":"uint16","name":"observationIndex","type":"uint16"},{"internalType":"uint16","name":"observationCardinality","type":"uint16"},{"internalType":"uint16","name":"observationCardinalityNext","type":"uint16"},{"internalType":"bool","name":"unlocked","type":"bool"}],"stateMutability":"view","type":"function"},
-{"inputs":[],"name":"tickSpacing","outputs":[{"internalType":"int24","name":"","type":"int24"}],"stateMutability":"view","type":"function"}]
-'''
-
-HELPER_ABI = '''
-[
-    {"inputs":[{"internalType":"uint160","name":"sqrtRatioX96","type":"uint160"},{"internalType":"uint160","name":"sqrtRatioAX96","type":"uint160"},{"internalType":"uint160","name":"sqrtRatioBX96","type":"uint160"},{"internalType":"uint128","name":"liquidity","type":"uint128"}],"name":"getAmountsForLiquidity","outputs":[{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"stateMutability":"pure","type":"function"},
-    {"inputs":[{"internalType":"int24","name":"tick","type":"int24"}],"name":"getSqrtRatioAtTick","outputs":[{"internalType":"uint160","name":"sqrtRatioX96","type":"uint160"}],"stateMutability":"pure","type":"function"}
-]
-'''
-
-# Full ERC20 ABI with allowance and approve
-ERC20_ABI = '''
-[{"constant":true,"inputs":[{"name":"owner","type":"address"}],"name":"balanceOf","outputs":[{"name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},
-{"constant":false,"inputs":[{"name":"spender","type":"address"},{"name":"value","type":"uint256"}],"name":"approve","outputs":[{"name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},
-{"constant":true,"inputs":[{"name":"owner","type":"address"},{"name":"spender","type":"address"}],"name":"allowance","outputs":[{"name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"}]
-'''
-
-# Full NPM ABI
-NPM_ABI = '''
-[{"inputs":[{"internalType":"address","name":"_factory","type":"address"},{"internalType":"address","name":"_WETH9","type":"address"},{"internalType":"address","name":"_tokenDescriptor","type":"address"},{"internalType":"string","name":"name","type":"string"},{"internalType":"string","name":"symbol","type":"string"}],"stateMutability":"nonpayable","type":"constructor"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"owner","type":"address"},{"indexed":true,"internalType":"address","name":"approved","type":"address"},{"indexed":true,"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"Approval","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"owner","type":"address"},{"indexed":true,"internalType":"address","name":"operator","type":"address"},{"indexed":false,"internalType":"bool","name":"approved","type":"bool"}],"name":"ApprovalForAll","type":"event"},{"anonymous":false,"inputs":[{"indexed":false,"internalType":"uint256","name":"_fromTokenId","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"_toTokenId","type":"uint256"}],"name":"BatchMetadataUpdate","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"uint256","name":"tokenId","type":"uint256"},{"indexed":false,"internalType":"address","name":"recipient","type":"address"},{"indexed":false,"internalType":"uint256","name":"amount0","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1","type":"uint256"}],"name":"Collect","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"uint256","name":"tokenId","type":"uint256"},{"indexed":false,"internalType":"uint128","name":"liquidity","type":"uint128"},{"indexed":false,"internalType":"uint256","name":"amount0","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1","type":"uint256"}],"name":"DecreaseLiquidity","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"uint256","name":"tokenId","type":"uint256"},{"indexed":false,"internalType":"uint128","name":"liquidity","type":"uint128"},{"indexed":false,"internalType":"uint256","name":"amount0","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1","type":"uint256"}],"name":"IncreaseLiquidity","type":"event"},{"anonymous":false,"inputs":[{"indexed":false,"internalType":"uint256","name":"_tokenId","type":"uint256"}],"name":"MetadataUpdate","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"tokenDescriptor","type":"address"}],"name":"TokenDescriptorChanged","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"from","type":"address"},{"indexed":true,"internalType":"address","name":"to","type":"address"},{"indexed":true,"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"Transfer","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"owner","type":"address"}],"name":"TransferOwnership","type":"event"},{"inputs":[],"name":"DOMAIN_SEPARATOR","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"PERMIT_TYPEHASH","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"WETH9","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"approve","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"baseURI","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"pure","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"burn","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"components":[{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"address","name":"recipient","type":"address"},{"internalType":"uint128","name":"amount0Max","type":"uint128"},{"internalType":"uint128","name":"amount1Max","type":"uint128"}],"internalType":"struct INonfungiblePositionManager.CollectParams","name":"params","type":"tuple"}],"name":"collect","outputs":[{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"stateMutability":"payable","type":"function"},{"inputs":[{"components":[{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"uint128","name":"liquidity","type":"uint128"},{"internalType":"uint256","name":"amount0Min","type":"uint256"},{"internalType":"uint256","name":"amount1Min","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"internalType":"struct INonfungiblePositionManager.DecreaseLiquidityParams","name":"params","type":"tuple"}],"name":"decreaseLiquidity","outputs":[{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"stateMutability":"payable","type":"function"},{"inputs":[],"name":"factory","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"getApproved","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"components":[{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"uint256","name":"amount0Desired","type":"uint256"},{"internalType":"uint256","name":"amount1Desired","type":"uint256"},{"internalType":"uint256","name":"amount0Min","type":"uint256"},{"internalType":"uint256","name":"amount1Min","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"internalType":"struct INonfungiblePositionManager.IncreaseLiquidityParams","name":"params","type":"tuple"}],"name":"increaseLiquidity","outputs":[{"internalType":"uint128","name":"liquidity","type":"uint128"},{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"operator","type":"address"}],"name":"isApprovedForAll","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"view","type":"function"},{"inputs":[{"components":[{"internalType":"address","name":"token0","type":"address"},{"internalType":"address","name":"token1","type":"address"},{"internalType":"int24","name":"tickSpacing","type":"int24"},{"internalType":"int24","name":"tickLower","type":"int24"},{"internalType":"int24","name":"tickUpper","type":"int24"},{"internalType":"uint256","name":"amount0Desired","type":"uint256"},{"internalType":"uint256","name":"amount1Desired","type":"uint256"},{"internalType":"uint256","name":"amount0Min","type":"uint256"},{"internalType":"uint256","name":"amount1Min","type":"uint256"},{"internalType":"address","name":"recipient","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"uint160","name":"sqrtPriceX96","type":"uint160"}],"internalType":"struct INonfungiblePositionManager.MintParams","name":"params","type":"tuple"}],"name":"mint","outputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"uint128","name":"liquidity","type":"uint128"},{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"bytes[]","name":"data","type":"bytes[]"}],"name":"multicall","outputs":[{"internalType":"bytes[]","name":"results","type":"bytes[]"}],"stateMutability":"payable","type":"function"},{"inputs":[],"name":"name","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"owner","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"ownerOf","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"permit","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"positions","outputs":[{"internalType":"uint96","name":"nonce","type":"uint96"},{"internalType":"address","name":"operator","type":"address"},{"internalType":"address","name":"token0","type":"address"},{"internalType":"address","name":"token1","type":"address"},{"internalType":"int24","name":"tickSpacing","type":"int24"},{"internalType":"int24","name":"tickLower","type":"int24"},{"internalType":"int24","name":"tickUpper","type":"int24"},{"internalType":"uint128","name":"liquidity","type":"uint128"},{"internalType":"uint256","name":"feeGrowthInside0LastX128","type":"uint256"},{"internalType":"uint256","name":"feeGrowthInside1LastX128","type":"uint256"},{"internalType":"uint128","name":"tokensOwed0","type":"uint128"},{"internalType":"uint128","name":"tokensOwed1","type":"uint128"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"refundETH","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"safeTransferFrom","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"bytes","name":"_data","type":"bytes"}],"name":"safeTransferFrom","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"selfPermit","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"nonce","type":"uint256"},{"internalType":"uint256","name":"expiry","type":"uint256"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"selfPermitAllowed","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"nonce","type":"uint256"},{"internalType":"uint256","name":"expiry","type":"uint256"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"selfPermitAllowedIfNecessary","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"selfPermitIfNecessary","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"operator","type":"address"},{"internalType":"bool","name":"approved","type":"bool"}],"name":"setApprovalForAll","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"_owner","type":"address"}],"name":"setOwner","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"_tokenDescriptor","type":"address"}],"name":"setTokenDescriptor","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"bytes4","name":"interfaceId","type":"bytes4"}],"name":"supportsInterface","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"amountMinimum","type":"uint256"},{"internalType":"address","name":"recipient","type":"address"}],"name":"sweepToken","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[],"name":"symbol","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"index","type":"uint256"}],"name":"tokenByIndex","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"tokenDescriptor","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"uint256","name":"index","type":"uint256"}],"name":"tokenOfOwnerByIndex","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"tokenURI","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"totalSupply","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"transferFrom","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amount0Owed","type":"uint256"},{"internalType":"uint256","name":"amount1Owed","type":"uint256"},{"internalType":"bytes","name":"data","type":"bytes"}],"name":"uniswapV3MintCallback","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountMinimum","type":"uint256"},{"internalType":"address","name":"recipient","type":"address"}],"name":"unwrapWETH9","outputs":[],"stateMutability":"payable","type":"function"},{"stateMutability":"payable","type":"receive"}]
-'''
-
-# Initialize contracts
-pool_contract = web3.eth.contract(address=POOL_ADDRESS, abi=POOL_ABI)
-helper_contract = web3.eth.contract(address=HELPER_ADDRESS, abi=HELPER_ABI)
-weth_token = web3.eth.contract(address=WETH_ADDRESS, abi=ERC20_ABI)
-usdc_token = web3.eth.contract(address=USDC_ADDRESS, abi=ERC20_ABI)
-npm_contract = web3.eth.contract(address=NPM_ADDRESS, abi=NPM_ABI)
-
-def get_pool_info():
+# Tick math runs locally; set AERODROME_VERIFY_TICK_MATH=1 to cross-check every
+# result against the on-chain helper contract
+VERIFY_TICK_MATH_ONCHAIN = os.getenv('AERODROME_VERIFY_TICK_MATH', '0') == '1'
+
+# Range selection: 'fixed' uses the +/-2% range, 'scored' picks the best of
+# thousands of candidate ranges using the vectorized range scorer
+RANGE_MODE = os.getenv('AERODROME_RANGE_MODE', 'fixed')
+RANGE_SIGMA_TICKS = float(os.getenv('AERODROME_RANGE_SIGMA_TICKS', '40'))  # tick std dev per hour
+RANGE_HORIZON_HOURS = float(os.getenv('AERODROME_RANGE_HORIZON_HOURS', '24'))
+RANGE_REFERENCE_YIELD = float(os.getenv('AERODROME_RANGE_REFERENCE_YIELD', '0.002'))  # +/-2% fee yield per horizon
+RANGE_REBALANCE_COST = float(os.getenv('AERODROME_RANGE_REBALANCE_COST', '0.001'))  # fraction of capital
+
+# Initialize contracts (shared instances from the client module)
+pool_state = get_pool_state(POOL_ADDRESS)
+helper_contract = get_contract('helper')
+weth_token = get_contract('erc20', WETH_ADDRESS)
+usdc_token = get_contract('erc20', USDC_ADDRESS)
+npm_contract = get_contract('npm')
+
+def get_pool_info(block_number=None, max_age=0):
     """Get current tick and tick spacing from the pool"""
-    slot0 = pool_contract.functions.slot0().call()
-    current_tick = slot0[1]
-    sqrt_price_x96 = slot0[0]
-    tick_spacing = pool_contract.functions.tickSpacing().call()
+    # tickSpacing and token decimals are cached; slot0 comes from one multicall
+    snapshot = pool_state.snapshot(block_number=block_number, max_age=max_age)
+    current_tick = snapshot.tick
+    sqrt_price_x96 = snapshot.sqrt_price_x96
+    tick_spacing = snapshot.tick_spacing
 
     # Calculate price from sqrtPriceX96 using the correct formula
     # This calculates USDC price per WETH directly
-    price = (Decimal(sqrt_price_x96) / Decimal(2**96)) ** 2 * Decimal(1e12)
+    price = pool_state.price(snapshot)
     eth_price_in_usdc = float(price)
 
     print(f"Current tick: {current_tick}")
@@ -66,33 +62,44 @@ def get_pool_info():
 
     return current_tick, tick_spacing, sqrt_price_x96, eth_price_in_usdc
 
-def calculate_two_percent_tick_range(current_tick, tick_spacing):
-    """Calculate a symmetrical +/-2% price range around the current price"""
-    # Calculate how many ticks correspond to a 2% price change
-    ticks_for_2_percent = int(math.log(1.02) / math.log(1.0001))
+def get_sqrt_ratio_at_tick(tick):
+    """Get sqrtPriceX96 at a tick using the local TickMath port"""
+    sqrt_ratio_x96 = tick_math.get_sqrt_ratio_at_tick(tick)
+
+    if VERIFY_TICK_MATH_ONCHAIN:
+        onchain_ratio = helper_contract.functions.getSqrtRatioAtTick(tick).call()
+        if onchain_ratio != sqrt_ratio_x96:
+            raise ValueError(f"getSqrtRatioAtTick({tick}) mismatch: local {sqrt_ratio_x96}, helper {onchain_ratio}")
+
+    return sqrt_ratio_x96
 
-    # Calculate the raw target ticks
-    lower_tick_target = current_tick - ticks_for_2_percent
-    upper_tick_target = current_tick + ticks_for_2_percent
+def get_amounts_for_liquidity(sqrt_price_x96, sqrt_lower_x96, sqrt_upper_x96, liquidity):
+    """Get token amounts for a liquidity value using the local LiquidityAmounts port"""
+    amounts = tick_math.get_amounts_for_liquidity(sqrt_price_x96, sqrt_lower_x96, sqrt_upper_x96, liquidity)
 
-    # Calculate the midpoint (should be very close to current_tick)
-    midpoint = (lower_tick_target + upper_tick_target) / 2
+    if VERIFY_TICK_MATH_ONCHAIN:
+        onchain_amounts = tuple(helper_contract.functions.getAmountsForLiquidity(
+            sqrt_price_x96,
+            sqrt_lower_x96,
+            sqrt_upper_x96,
+            liquidity
+        ).call())
+        if onchain_amounts != amounts:
+            raise ValueError(f"getAmountsForLiquidity mismatch: local {amounts}, helper {onchain_amounts}")
 
-    # Round the midpoint to the nearest tick spacing
-    midpoint_rounded = round(midpoint / tick_spacing) * tick_spacing
+    return amounts
 
-    # Calculate equal distance from the rounded midpoint
-    half_range = ((upper_tick_target - lower_tick_target) / 2)
-    # Round to the nearest multiple of tick spacing, but never less than 1 spacing
-    half_range_ticks = max(1, round(half_range / tick_spacing)) * tick_spacing
+def calculate_two_percent_tick_range(current_tick, tick_spacing):
+    """Calculate a symmetrical +/-2% price range around the current price (strategy.range_pct)"""
+    # Calculate how many ticks correspond to the range's price change
+    ticks_for_2_percent = tick_math.ticks_for_percent(strategy.range_pct)
 
-    # Calculate new lower and upper ticks
-    lower_tick = midpoint_rounded - half_range_ticks
-    upper_tick = midpoint_rounded + half_range_ticks
+    # Round the midpoint to the tick spacing and keep the range symmetric around it
+    lower_tick, upper_tick = tick_math.symmetric_tick_range(current_tick, tick_spacing, strategy.range_pct)
 
     # Verify the calculated ticks by determining the price percentage change
     def calculate_price_from_tick(tick):
-        sqrt_price_x96 = helper_contract.functions.getSqrtRatioAtTick(tick).call()
+        sqrt_price_x96 = get_sqrt_ratio_at_tick(tick)
         price = (Decimal(sqrt_price_x96) / Decimal(2**96)) ** 2 * Decimal(1e12)
         return price
 
@@ -107,8 +114,8 @@ def calculate_two_percent_tick_range(current_tick, tick_spacing):
     lower_pct_diff = ((lower_price / current_price) - 1) * 100
     upper_pct_diff = ((upper_price / current_price) - 1) * 100
 
-    print(f"\n+/-2% Price Range Details:")
-    print(f"Target range: {ticks_for_2_percent} ticks from current (~2%)")
+    print(f"\n+/-{strategy.range_pct}% Price Range Details:")
+    print(f"Target range: {ticks_for_2_percent} ticks from current (~{strategy.range_pct}%)")
     print(f"Current ETH price: ${float(current_price):.2f}")
     print(f"Lower tick: {lower_tick}")
     print(f"Upper tick: {upper_tick}")
@@ -117,14 +124,32 @@ def calculate_two_percent_tick_range(current_tick, tick_spacing):
 
     return lower_tick, upper_tick
 
+def calculate_scored_tick_range(current_tick, tick_spacing, sqrt_price_x96):
+    """Pick the best scoring range among thousands of candidates around the current tick"""
+    reference_range = calculate_two_percent_tick_range(current_tick, tick_spacing)
+
+    lower_tick, upper_tick, score = tick_math_np.best_range(
+        sqrt_price_x96,
+        current_tick,
+        tick_spacing,
+        sigma_ticks=RANGE_SIGMA_TICKS,
+        horizon=RANGE_HORIZON_HOURS,
+        reference_range=reference_range,
+        reference_yield=RANGE_REFERENCE_YIELD,
+        rebalance_cost=RANGE_REBALANCE_COST
+    )
+
+    print(f"\nScored range: {lower_tick} to {upper_tick} (expected net return {score * 100:.3f}% over {RANGE_HORIZON_HOURS}h)")
+    return lower_tick, upper_tick
+
 def calculate_optimal_amounts(weth_amount, lower_tick, upper_tick, current_tick, sqrt_price_x96):
     """Calculate optimal token amounts for providing liquidity using exact WETH amount"""
     # Convert WETH amount to wei
     weth_amount_wei = int(Decimal(weth_amount) * Decimal(1e18))
 
     # Get sqrt price at ticks
-    sqrt_lower_x96 = helper_contract.functions.getSqrtRatioAtTick(lower_tick).call()
-    sqrt_upper_x96 = helper_contract.functions.getSqrtRatioAtTick(upper_tick).call()
+    sqrt_lower_x96 = get_sqrt_ratio_at_tick(lower_tick)
+    sqrt_upper_x96 = get_sqrt_ratio_at_tick(upper_tick)
 
     # Check position relative to current price
     if current_tick < lower_tick:
@@ -187,13 +212,8 @@ def calculate_optimal_amounts(weth_amount, lower_tick, upper_tick, current_tick,
         # Convert to a reasonable liquidity value
         liquidity_value = int(liquidity)
 
-        # Use getAmountsForLiquidity to get the exact token amounts
-        amounts = helper_contract.functions.getAmountsForLiquidity(
-            sqrt_price_x96,
-            sqrt_lower_x96,
-            sqrt_upper_x96,
-            liquidity_value
-        ).call()
+        # Use LiquidityAmounts to get the exact token amounts
+        amounts = get_amounts_for_liquidity(sqrt_price_x96, sqrt_lower_x96, sqrt_upper_x96, liquidity_value)
 
         # Get WETH and USDC amounts
         calculated_weth = amounts[0]
@@ -206,12 +226,7 @@ def calculate_optimal_amounts(weth_amount, lower_tick, upper_tick, current_tick,
             liquidity_value = int(Decimal(liquidity_value) * scaling_factor)
 
             # Recalculate with the new liquidity
-            amounts = helper_contract.functions.getAmountsForLiquidity(
-                sqrt_price_x96,
-                sqrt_lower_x96,
-                sqrt_upper_x96,
-                liquidity_value
-            ).call()
+            amounts = get_amounts_for_liquidity(sqrt_price_x96, sqrt_lower_x96, sqrt_upper_x96, liquidity_value)
 
             calculated_weth = amounts[0]
             calculated_usdc = amounts[1]
@@ -219,56 +234,108 @@ def calculate_optimal_amounts(weth_amount, lower_tick, upper_tick, current_tick,
         # Return the calculated amounts
         return calculated_weth, calculated_usdc
 
-def ensure_approval(token, amount):
-    """Ensure token is approved for position manager"""
+def send_approval(token, amount, allowance=None):
+    """Send an approval for the position manager if needed.
+
+    Returns the approval tx hash, or None if the allowance already covers amount.
+    Pass `allowance` if it was already read (e.g. in a batch or the approval ledger).
+    """
     token_symbol = "WETH" if token.address == WETH_ADDRESS else "USDC"
 
-    allowance = token.functions.allowance(wallet_address, NPM_ADDRESS).call()
+    if allowance is None:
+        allowance = token.functions.allowance(get_wallet_address(), NPM_ADDRESS).call()
+        get_approval_ledger().record_allowance(get_wallet_address(), token.address, NPM_ADDRESS, allowance)
     if allowance >= amount:
         print(f"{token_symbol} already approved")
-        return True
+        return None
 
     print(f"Approving {token_symbol}...")
-    tx = token.functions.approve(NPM_ADDRESS, 2**256 - 1).build_transaction({
-        'from': wallet_address,
-        'gas': 100000,
-        'gasPrice': web3.eth.gas_price,
-        'nonce': web3.eth.get_transaction_count(wallet_address),
-        'chainId': web3.eth.chain_id
-    })
-
-    signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-
-    print(f"{token_symbol} approval tx: {receipt.transactionHash.hex()}")
+    tx = build_transaction(token.functions.approve(NPM_ADDRESS, 2**256 - 1))
+
+    tx_hash = send_transaction(tx)
+    print(f"{token_symbol} approval tx: {tx_hash.hex()}")
+    return tx_hash
+
+def record_approval(token, receipt):
+    """Record a mined max approval for the position manager in the approval ledger"""
+    if receipt.status == 1:
+        get_approval_ledger().record_allowance(
+            get_wallet_address(), token.address, NPM_ADDRESS, 2**256 - 1, receipt.blockNumber
+        )
+
+def ensure_approval(token, amount):
+    """Ensure token is approved for position manager"""
+    tx_hash = send_approval(token, amount, get_approval_ledger().allowance(get_wallet_address(), token.address, NPM_ADDRESS))
+    if tx_hash is None:
+        return True
+    receipt = wait_for_receipt(tx_hash)
+    record_approval(token, receipt)
     return receipt.status == 1
 
+def ensure_approvals(token_amounts):
+    """Ensure several tokens are approved, broadcasting all approvals before waiting.
+
+    Allowances recorded in the approval ledger are trusted; only unknown ones
+    are read, in the same round trip as fees and nonce if those are needed.
+    """
+    ledger = get_approval_ledger()
+    owner = get_wallet_address()
+    token_amounts = [(token, amount) for token, amount in token_amounts if amount > 0]
+    known = [ledger.allowance(owner, token.address, NPM_ADDRESS) for token, _ in token_amounts]
+    unknown = [token for (token, _), allowance in zip(token_amounts, known) if allowance is None]
+
+    read = iter(gather_context([
+        Call(token, 'allowance', [owner, NPM_ADDRESS]) for token in unknown
+    ]))
+    allowances = []
+    for (token, _), allowance in zip(token_amounts, known):
+        if allowance is None:
+            allowance = next(read)
+            ledger.record_allowance(owner, token.address, NPM_ADDRESS, allowance)
+        allowances.append(allowance)
+
+    approvals = []
+    for (token, amount), allowance in zip(token_amounts, allowances):
+        tx_hash = send_approval(token, amount, allowance)
+        if tx_hash is not None:
+            approvals.append((token, tx_hash))
+
+    receipts = wait_for_receipts([tx_hash for _, tx_hash in approvals])
+    for (token, _), receipt in zip(approvals, receipts):
+        record_approval(token, receipt)
+    return all(receipt.status == 1 for receipt in receipts)
+
 def create_position_ui_flow_with_rebalance():
     """Create a position following the UI flow with a fixed +/-2% range,
-    after rebalancing the wallet first"""
+    after rebalancing the wallet first.
+
+    Returns the parse_mint_receipt() result dict on success, False otherwise.
+    """
     # Step 0: Rebalance wallet first
     print("\n🚀 Rebalancing wallet before creating position...")
     rebalance_wallet()
 
-    # Give some time for blockchain state to update
+    # Balances and pool price are read below; make sure they include the swap's block
     print("Waiting for rebalancing to finalize...")
-    time.sleep(5)
+    wait_for_next_block()
 
     # Step 1: Get pool info
     current_tick, tick_spacing, sqrt_price_x96, eth_price = get_pool_info()
 
-    # Step 2: Calculate the +/-2% tick range
-    lower_tick, upper_tick = calculate_two_percent_tick_range(current_tick, tick_spacing)
-
-    print(f"\nUsing fixed +/-2% tick range: {lower_tick} to {upper_tick}")
+    # Step 2: Calculate the tick range
+    if RANGE_MODE == 'scored':
+        lower_tick, upper_tick = calculate_scored_tick_range(current_tick, tick_spacing, sqrt_price_x96)
+        print(f"\nUsing scored tick range: {lower_tick} to {upper_tick}")
+    else:
+        lower_tick, upper_tick = calculate_two_percent_tick_range(current_tick, tick_spacing)
+        print(f"\nUsing fixed +/-{strategy.range_pct}% tick range: {lower_tick} to {upper_tick}")
 
     # Step 3: Get token balances
     _, weth_balance, usdc_balance, _ = get_wallet_balances()
     print(f"Current balances: {weth_balance} WETH, {usdc_balance} USDC")
 
     # Calculate 99% of WETH to use for deposit
-    balance_factor = Decimal('0.995')  # Use 99.5% of balances
+    balance_factor = Decimal(str(strategy.balance_factor))  # Use 99.5% of balances by default
     weth_amount = weth_balance * balance_factor
     print(f"\nUsing {weth_amount:.6f} WETH ({balance_factor * 100}% of balance) for deposit")
 
@@ -301,19 +368,15 @@ def create_position_ui_flow_with_rebalance():
         print(f"WETH: {calculated_weth:.6f}")
         print(f"USDC: {calculated_usdc:.2f}")
 
-    # Set minimum amounts with 0.5% slippage
-    weth_min = int(Decimal(calculated_weth_wei) * Decimal('0.995'))
-    usdc_min = int(Decimal(calculated_usdc_wei) * Decimal('0.995'))
+    # Set minimum amounts with the slippage tolerance (0.5% by default)
+    weth_min = int(Decimal(calculated_weth_wei) * (1 - Decimal(str(strategy.slippage))))
+    usdc_min = int(Decimal(calculated_usdc_wei) * (1 - Decimal(str(strategy.slippage))))
 
     print("\nProceeding with position creation automatically...")
 
     # Ensure approvals
-    if calculated_weth_wei > 0 and not ensure_approval(weth_token, calculated_weth_wei):
-        print("WETH approval failed")
-        return False
-
-    if calculated_usdc_wei > 0 and not ensure_approval(usdc_token, calculated_usdc_wei):
-        print("USDC approval failed")
+    if not ensure_approvals([(weth_token, calculated_weth_wei), (usdc_token, calculated_usdc_wei)]):
+        print("Token approval failed")
         return False
 
     # Prepare mint parameters
@@ -327,51 +390,55 @@ def create_position_ui_flow_with_rebalance():
         'amount1Desired': calculated_usdc_wei,
         'amount0Min': weth_min,
         'amount1Min': usdc_min,
-        'recipient': wallet_address,
+        'recipient': get_wallet_address(),
         'deadline': int(time.time() + 3600),
         'sqrtPriceX96': 0
     }
 
     # Build and send transaction
     try:
-        # Using exact same nonce approach as working code
-        nonce = web3.eth.get_transaction_count(wallet_address)
-        gas_price = int(web3.eth.gas_price * 1.5)  # Higher gas price for faster confirmation
-
-        tx = npm_contract.functions.mint(mint_params).build_transaction({
-            'from': wallet_address,
-            'gas': 3000000,
-            'gasPrice': gas_price,
-            'nonce': nonce,
-            'value': 0,
-            'chainId': web3.eth.chain_id
-        })
-
-        print(f"Gas price: {gas_price / 1e9} Gwei")
+        tx = build_transaction(npm_contract.functions.mint(mint_params))
+
+        print(f"Gas: {describe_fees(tx)}")
         print("Sending transaction...")
 
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = send_transaction(tx)
         print(f"Transaction sent: {tx_hash.hex()}")
 
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        receipt = wait_for_receipt(tx_hash)
         print(f"Transaction status: {'Success' if receipt.status else 'Failed'}")
 
-        # Check if balances changed
-        _, new_weth, new_usdc, _ = get_wallet_balances()
-
-        weth_diff = weth_balance - new_weth
-        usdc_diff = usdc_balance - new_usdc
-
-        print(f"WETH used: {weth_diff}")
-        print(f"USDC used: {usdc_diff}")
+        if receipt.status != 1:
+            print("Mint transaction reverted. Position was not created.")
+            return False
 
-        if weth_diff > 0 or usdc_diff > 0:
-            print("Position created successfully!")
-            return True
-        else:
-            print("Transaction succeeded but no tokens were used. Position may not have been created.")
+        # Everything about the new position is in the receipt's logs
+        owner = get_wallet_address()
+        result = parse_mint_receipt(receipt, npm_contract, owner)
+        if result is None:
+            print("Transaction succeeded but no position was minted.")
             return False
+
+        print(f"Position {result['token_id']} created successfully!")
+        print(f"Liquidity: {result['liquidity']}")
+        print(f"WETH used: {Decimal(result['amount0']) / Decimal(1e18):.6f}")
+        print(f"USDC used: {Decimal(result['amount1']) / Decimal(1e6):.2f}")
+        print(f"Gas used: {result['gas_used']:,} (block {result['block_number']})")
+
+        # Keep the approval ledger and state store in step with the mint
+        ledger = get_approval_ledger()
+        ledger.record_spend(owner, WETH_ADDRESS, NPM_ADDRESS, result['amount0'])
+        ledger.record_spend(owner, USDC_ADDRESS, NPM_ADDRESS, result['amount1'])
+        ledger.record_nft_approval(NPM_ADDRESS, result['token_id'], None, result['block_number'])
+        get_state_store().record_position(
+            result['token_id'], owner=owner, pool=POOL_ADDRESS, tick_lower=lower_tick,
+            tick_upper=upper_tick, liquidity=result['liquidity'], status=STATUS_OPEN,
+            block_number=result['block_number']
+        )
+        return result
+    except TransactionReverted as e:
+        print(f"Mint would revert ({e.reason}); nothing was sent. Position was not created.")
+        return False
     except Exception as e:
         print(f"Error creating transaction: {e}")
         return False
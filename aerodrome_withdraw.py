@@ -2,41 +2,38 @@
 
 import time
 from decimal import Decimal, getcontext
-from wallet_setup import web3, wallet_address, private_key, weth_contract, usdc_contract
+from wallet_setup import get_wallet_address, weth_contract, usdc_contract, WETH_ADDRESS, USDC_ADDRESS
+from nonce_manager import send_transaction, wait_for_receipt
+from fee_engine import build_transaction
+from aerodrome_positions import get_positions_snapshot
+from confirmations import wait_until
+from batch_reader import gather_context, read_batch
+from multicall import Call
+from aerodrome_client import get_contract
+from state_store import get_state_store, STATUS_BURNED
 
 getcontext().prec = 28
 
-# Contract addresses
-NPM_ADDRESS = web3.to_checksum_address("0x827922686190790b37229fd06084350e74485b72")
-WETH_ADDRESS = web3.to_checksum_address("0x4200000000000000000000000000000000000006")
-USDC_ADDRESS = web3.to_checksum_address("0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913")
-
-# ABI for position manager (only relevant functions)
-NPM_ABI = '''
-[
-    {"inputs":[{"internalType":"address","name":"owner","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"uint256","name":"index","type":"uint256"}],"name":"tokenOfOwnerByIndex","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"positions","outputs":[{"internalType":"uint96","name":"nonce","type":"uint96"},{"internalType":"address","name":"operator","type":"address"},{"internalType":"address","name":"token0","type":"address"},{"internalType":"address","name":"token1","type":"address"},{"internalType":"int24","name":"tickSpacing","type":"int24"},{"internalType":"int24","name":"tickLower","type":"int24"},{"internalType":"int24","name":"tickUpper","type":"int24"},{"internalType":"uint128","name":"liquidity","type":"uint128"},{"internalType":"uint256","name":"feeGrowthInside0LastX128","type":"uint256"},{"internalType":"uint256","name":"feeGrowthInside1LastX128","type":"uint256"},{"internalType":"uint128","name":"tokensOwed0","type":"uint128"},{"internalType":"uint128","name":"tokensOwed1","type":"uint128"}],"stateMutability":"view","type":"function"},
-    {"inputs":[{"components":[{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"uint128","name":"liquidity","type":"uint128"},{"internalType":"uint256","name":"amount0Min","type":"uint256"},{"internalType":"uint256","name":"amount1Min","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"internalType":"struct INonfungiblePositionManager.DecreaseLiquidityParams","name":"params","type":"tuple"}],"name":"decreaseLiquidity","outputs":[{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"stateMutability":"payable","type":"function"},
-    {"inputs":[{"components":[{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"address","name":"recipient","type":"address"},{"internalType":"uint128","name":"amount0Max","type":"uint128"},{"internalType":"uint128","name":"amount1Max","type":"uint128"}],"internalType":"struct INonfungiblePositionManager.CollectParams","name":"params","type":"tuple"}],"name":"collect","outputs":[{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"stateMutability":"payable","type":"function"},
-    {"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"burn","outputs":[],"stateMutability":"payable","type":"function"}
-]
-'''
-
-# Initialize contract
-npm_contract = web3.eth.contract(address=NPM_ADDRESS, abi=NPM_ABI)
+# Shared position manager contract
+npm_contract = get_contract('npm')
+
+# Maximum uint128 value for collecting all tokens
+MAX_UINT128 = 2**128 - 1
 
 def get_token_balances():
     """Get current WETH and USDC balances"""
-    weth_balance = Decimal(weth_contract.functions.balanceOf(wallet_address).call()) / Decimal(1e18)
-    usdc_balance = Decimal(usdc_contract.functions.balanceOf(wallet_address).call()) / Decimal(1e6)
-    return weth_balance, usdc_balance
+    weth_raw, usdc_raw = read_batch([
+        Call(weth_contract, 'balanceOf', [get_wallet_address()]),
+        Call(usdc_contract, 'balanceOf', [get_wallet_address()])
+    ])
+    return Decimal(weth_raw) / Decimal(1e18), Decimal(usdc_raw) / Decimal(1e6)
 
 def list_positions():
     """List all CL positions owned by the user"""
     try:
-        # Get number of positions owned by the user
-        num_positions = npm_contract.functions.balanceOf(wallet_address).call()
+        # Balance, token IDs and position tuples in one multicall snapshot
+        snapshot = get_positions_snapshot(get_wallet_address())
+        num_positions = snapshot['balance']
 
         if num_positions == 0:
             print("You don't have any positions.")
@@ -45,19 +42,13 @@ def list_positions():
         positions = []
         print(f"Found {num_positions} position(s):")
 
-        for i in range(num_positions):
-            # Get token ID for each position
-            token_id = npm_contract.functions.tokenOfOwnerByIndex(wallet_address, i).call()
-
-            # Get position details
-            position = npm_contract.functions.positions(token_id).call()
-
-            # Extract relevant details
-            token0 = position[2]
-            token1 = position[3]
-            tick_lower = position[5]
-            tick_upper = position[6]
-            liquidity = position[7]
+        for i, position in enumerate(snapshot['positions']):
+            token_id = position['token_id']
+            token0 = position['token0']
+            token1 = position['token1']
+            tick_lower = position['tick_lower']
+            tick_upper = position['tick_upper']
+            liquidity = position['liquidity']
 
             # Determine token names
             token0_name = "WETH" if token0.lower() == WETH_ADDRESS.lower() else "USDC"
@@ -89,11 +80,30 @@ def list_positions():
         print(f"Error listing positions: {e}")
         return []
 
+def build_decrease_liquidity_params(token_id, liquidity):
+    """Parameters for removing `liquidity` from a position"""
+    return {
+        'tokenId': token_id,
+        'liquidity': liquidity,
+        'amount0Min': 0,  # No slippage protection for simplicity, can be improved
+        'amount1Min': 0,  # No slippage protection for simplicity, can be improved
+        'deadline': int(time.time() + 3600)
+    }
+
+def build_collect_params(token_id):
+    """Parameters for collecting everything owed to a position"""
+    return {
+        'tokenId': token_id,
+        'recipient': get_wallet_address(),
+        'amount0Max': MAX_UINT128,
+        'amount1Max': MAX_UINT128
+    }
+
 def decrease_liquidity(token_id):
     """Remove all liquidity from a position"""
     try:
-        # Get position details
-        position = npm_contract.functions.positions(token_id).call()
+        # Position details, plus fees and nonce if needed, in one round trip
+        position, = gather_context([Call(npm_contract, 'positions', [token_id])])
         liquidity = position[7]
 
         if liquidity == 0:
@@ -103,43 +113,25 @@ def decrease_liquidity(token_id):
         print(f"Removing {liquidity} liquidity from position {token_id}...")
 
         # Prepare decrease liquidity parameters
-        decrease_params = {
-            'tokenId': token_id,
-            'liquidity': liquidity,
-            'amount0Min': 0,  # No slippage protection for simplicity, can be improved
-            'amount1Min': 0,  # No slippage protection for simplicity, can be improved
-            'deadline': int(time.time() + 3600)
-        }
-
-        # Get fresh nonce and gas price
-        nonce = web3.eth.get_transaction_count(wallet_address, 'pending')
-        gas_price = int(web3.eth.gas_price * 1.5)
-
-        print(f"Using nonce: {nonce}")
-
-        # Build transaction
-        tx = npm_contract.functions.decreaseLiquidity(decrease_params).build_transaction({
-            'from': wallet_address,
-            'gas': 500000,
-            'gasPrice': gas_price,
-            'nonce': nonce,
-            'value': 0,
-            'chainId': web3.eth.chain_id
-        })
-
-        # Sign and send transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-        print(f"Transaction sent: {tx_hash.hex()}")
+        decrease_params = build_decrease_liquidity_params(token_id, liquidity)
+
+        # Build transaction with estimated gas and current EIP-1559 fees
+        tx = build_transaction(npm_contract.functions.decreaseLiquidity(decrease_params))
+
+        # Sign and send transaction with the next managed nonce
+        tx_hash = send_transaction(tx)
+
+        print(f"Transaction sent: {tx_hash.hex()} (nonce {tx['nonce']})")
 
         # Wait for transaction receipt
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        receipt = wait_for_receipt(tx_hash)
         if receipt.status == 1:
             print("Successfully removed liquidity!")
-            # Sleep briefly to ensure the transaction is fully processed
-            time.sleep(5)
-            return True
+            # Make sure the node we read from already reflects the removal
+            return wait_until(
+                lambda: npm_contract.functions.positions(token_id).call()[7] == 0,
+                description=f"liquidity of position {token_id} to reach 0"
+            )
         else:
             print("Failed to remove liquidity.")
             return False
@@ -151,44 +143,21 @@ def decrease_liquidity(token_id):
 def collect_tokens(token_id):
     """Collect all tokens from a position"""
     try:
-        # Maximum uint128 value for collecting all tokens
-        max_uint128 = 2**128 - 1
-
         print(f"Collecting tokens from position {token_id}...")
 
         # Prepare collect parameters
-        collect_params = {
-            'tokenId': token_id,
-            'recipient': wallet_address,
-            'amount0Max': max_uint128,
-            'amount1Max': max_uint128
-        }
-
-        # Get fresh nonce and gas price
-        # Use 'pending' to get the latest nonce including pending transactions
-        nonce = web3.eth.get_transaction_count(wallet_address, 'pending')
-        gas_price = int(web3.eth.gas_price * 1.5)
-
-        print(f"Using nonce: {nonce}")
-
-        # Build transaction
-        tx = npm_contract.functions.collect(collect_params).build_transaction({
-            'from': wallet_address,
-            'gas': 500000,
-            'gasPrice': gas_price,
-            'nonce': nonce,
-            'value': 0,
-            'chainId': web3.eth.chain_id
-        })
-
-        # Sign and send transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-        print(f"Transaction sent: {tx_hash.hex()}")
+        collect_params = build_collect_params(token_id)
+
+        # Build transaction with estimated gas and current EIP-1559 fees
+        tx = build_transaction(npm_contract.functions.collect(collect_params))
+
+        # Sign and send transaction with the next managed nonce
+        tx_hash = send_transaction(tx)
+
+        print(f"Transaction sent: {tx_hash.hex()} (nonce {tx['nonce']})")
 
         # Wait for transaction receipt
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        receipt = wait_for_receipt(tx_hash)
         if receipt.status == 1:
             print("Successfully collected tokens!")
             return True
@@ -205,31 +174,18 @@ def burn_position(token_id):
     try:
         print(f"Burning position {token_id}...")
 
-        # Get fresh nonce and gas price
-        nonce = web3.eth.get_transaction_count(wallet_address, 'pending')
-        gas_price = int(web3.eth.gas_price * 1.5)
-
-        print(f"Using nonce: {nonce}")
+        # Build transaction with estimated gas and current EIP-1559 fees
+        tx = build_transaction(npm_contract.functions.burn(token_id))
 
-        # Build transaction
-        tx = npm_contract.functions.burn(token_id).build_transaction({
-            'from': wallet_address,
-            'gas': 300000,
-            'gasPrice': gas_price,
-            'nonce': nonce,
-            'value': 0,
-            'chainId': web3.eth.chain_id
-        })
+        # Sign and send transaction with the next managed nonce
+        tx_hash = send_transaction(tx)
 
-        # Sign and send transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-        print(f"Transaction sent: {tx_hash.hex()}")
+        print(f"Transaction sent: {tx_hash.hex()} (nonce {tx['nonce']})")
 
         # Wait for transaction receipt
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        receipt = wait_for_receipt(tx_hash)
         if receipt.status == 1:
+            get_state_store().set_position_status(token_id, STATUS_BURNED, receipt.blockNumber)
             print("Successfully burned position!")
             return True
         else:
@@ -251,18 +207,20 @@ def withdraw_position(token_id):
         print("Failed to decrease liquidity. Aborting...")
         return False
 
-    # Short delay to ensure blockchain state is updated
-    print("Waiting for transaction to be fully processed...")
-    time.sleep(10)
-
     # Step 2: Collect all tokens
     if not collect_tokens(token_id):
         print("Failed to collect tokens. Aborting...")
         return False
 
-    # Short delay to ensure blockchain state is updated
-    print("Waiting for transaction to be fully processed...")
-    time.sleep(10)
+    # The NPM refuses to burn while tokens are still owed
+    print("Waiting for collected tokens to be reflected on-chain...")
+    position_cleared = wait_until(
+        lambda: not any(npm_contract.functions.positions(token_id).call()[10:12]),
+        description=f"tokens owed on position {token_id} to reach 0"
+    )
+    if not position_cleared:
+        print("Collected tokens not yet visible. Aborting before burn...")
+        return False
 
     # Step 3: Burn the position NFT
     if not burn_position(token_id):
@@ -281,6 +239,59 @@ def withdraw_position(token_id):
 
     return True
 
+def build_exit_calls(token_id, liquidity):
+    """Encode decreaseLiquidity + collect + burn for NonfungiblePositionManager.multicall"""
+    calls = []
+    if liquidity > 0:
+        calls.append(npm_contract.encode_abi(
+            'decreaseLiquidity', args=[build_decrease_liquidity_params(token_id, liquidity)]
+        ))
+    calls.append(npm_contract.encode_abi('collect', args=[build_collect_params(token_id)]))
+    calls.append(npm_contract.encode_abi('burn', args=[token_id]))
+    return calls
+
+def withdraw_position_atomic(token_id, mint_params=None):
+    """Withdraw a position in a single NPM multicall transaction.
+
+    decreaseLiquidity, collect and burn either all succeed or all revert, so
+    a failure can no longer leave a half-withdrawn position behind. If
+    mint_params are given, the new position is minted in the same
+    transaction from the wallet balance after the collect.
+    """
+    try:
+        # Position details, plus fees and nonce if needed, in one round trip
+        position, = gather_context([Call(npm_contract, 'positions', [token_id])])
+        liquidity = position[7]
+
+        calls = build_exit_calls(token_id, liquidity)
+        if mint_params is not None:
+            calls.append(npm_contract.encode_abi('mint', args=[mint_params]))
+
+        print(f"Withdrawing position {token_id} ({liquidity} liquidity) in one transaction"
+              f"{' and minting a new position' if mint_params is not None else ''}...")
+
+        # Build transaction; estimation covers every step of the multicall
+        tx = build_transaction(npm_contract.functions.multicall(calls))
+
+        # Sign and send transaction with the next managed nonce
+        tx_hash = send_transaction(tx)
+
+        print(f"Transaction sent: {tx_hash.hex()} (nonce {tx['nonce']})")
+
+        # Wait for transaction receipt
+        receipt = wait_for_receipt(tx_hash)
+        if receipt.status == 1:
+            get_state_store().set_position_status(token_id, STATUS_BURNED, receipt.blockNumber)
+            print(f"Successfully withdrew position {token_id}!")
+            return True
+        else:
+            print(f"Atomic withdrawal of position {token_id} reverted; the position is unchanged.")
+            return False
+
+    except Exception as e:
+        print(f"Error withdrawing position atomically: {e}")
+        return False
+
 def main():
     print("Aerodrome CL Position Withdrawal")
     print("--------------------------------")
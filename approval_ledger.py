@@ -0,0 +1,201 @@
+# approval_ledger.py
+# Local record of ERC20 allowances and NFT approvals granted by our wallets,
+# so the rebalance path can skip allowance()/getApproved() reads.
+import os
+import json
+import logging
+import threading
+from web3 import Web3
+from wallet_setup import web3
+
+logger = logging.getLogger()
+
+LEDGER_FILE = os.getenv('AERODROME_APPROVAL_LEDGER', 'approval_ledger.json')
+RECONCILE_MAX_BLOCKS = 5000  # eth_getLogs range per reconcile() call
+
+# ERC20 Approval(owner, spender, value) and ERC721 Approval(owner, approved, tokenId)
+# share a signature; ERC721 indexes the token ID as a fourth topic
+APPROVAL_TOPIC = Web3.to_hex(Web3.keccak(text="Approval(address,address,uint256)"))
+ZERO_ADDRESS = '0x' + '00' * 20
+
+def _topic_address(topic):
+    return Web3.to_checksum_address('0x' + bytes(topic)[-20:].hex())
+
+def _address_topic(address):
+    return '0x' + '00' * 12 + address.lower()[2:]
+
+class ApprovalLedger:
+    """On-disk ledger of approvals, checked before asking the chain.
+
+    ERC20 entries hold (amount, block) per (owner, token, spender); spends
+    are subtracted locally because transferFrom does not always emit an
+    Approval event. NFT entries hold the approved address per (nft, token
+    ID), with None meaning known to be unapproved (fresh mints, staked and
+    returned tokens). Lookups return None for anything the ledger has not
+    seen, and callers then fall back to an RPC read and record the result.
+
+    reconcile() applies Approval logs newer than each entry, so approvals
+    and revocations made outside the bot are picked up during idle time.
+    """
+
+    def __init__(self, path=LEDGER_FILE, web3_instance=None):
+        self.path = path
+        self.web3 = web3_instance or web3
+        self._lock = threading.Lock()
+        self.allowances = {}
+        self.nft_approvals = {}
+        self.last_block = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable approval ledger {self.path}: {e}")
+            return
+        self.allowances = data.get('allowances', {})
+        self.nft_approvals = data.get('nft_approvals', {})
+        self.last_block = data.get('last_block')
+
+    def _save(self):
+        data = {
+            'last_block': self.last_block,
+            'allowances': self.allowances,
+            'nft_approvals': self.nft_approvals
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _allowance_key(owner, token, spender):
+        return f"{owner}:{token}:{spender}".lower()
+
+    @staticmethod
+    def _nft_key(nft, token_id):
+        return f"{nft.lower()}:{token_id}"
+
+    def _head(self):
+        return self.web3.eth.block_number
+
+    # ERC20 allowances
+
+    def allowance(self, owner, token, spender):
+        """Recorded allowance, or None if unknown"""
+        entry = self.allowances.get(self._allowance_key(owner, token, spender))
+        return entry['amount'] if entry else None
+
+    def record_allowance(self, owner, token, spender, amount, block_number=None):
+        """Record an allowance read from the chain or granted by a mined approve"""
+        if block_number is None:
+            block_number = self._head()
+        with self._lock:
+            self.allowances[self._allowance_key(owner, token, spender)] = {
+                'amount': amount, 'block': block_number
+            }
+            self._save()
+
+    def record_spend(self, owner, token, spender, amount):
+        """Subtract tokens pulled by `spender` (e.g. by a mint) from the recorded allowance"""
+        key = self._allowance_key(owner, token, spender)
+        with self._lock:
+            entry = self.allowances.get(key)
+            if entry is None:
+                return
+            entry['amount'] = max(entry['amount'] - amount, 0)
+            self._save()
+
+    def forget_allowance(self, owner, token, spender):
+        with self._lock:
+            if self.allowances.pop(self._allowance_key(owner, token, spender), None) is not None:
+                self._save()
+
+    # NFT approvals
+
+    def nft_approval(self, nft, token_id):
+        """(known, approved_address) for an NFT; approved_address is None if unapproved"""
+        entry = self.nft_approvals.get(self._nft_key(nft, token_id))
+        if entry is None:
+            return False, None
+        return True, entry['approved']
+
+    def record_nft_approval(self, nft, token_id, approved, block_number=None):
+        """Record the approved address of an NFT (None after a mint or transfer)"""
+        if block_number is None:
+            block_number = self._head()
+        with self._lock:
+            self.nft_approvals[self._nft_key(nft, token_id)] = {
+                'approved': approved if approved and approved != ZERO_ADDRESS else None,
+                'block': block_number
+            }
+            self._save()
+
+    # Reconciliation
+
+    def reconcile(self, owners, contracts, max_blocks=RECONCILE_MAX_BLOCKS):
+        """Apply Approval logs emitted by `contracts` for `owners` since the last run.
+
+        Scans at most max_blocks per call, so repeated calls during idle
+        time catch up gradually. The first run only sets the starting
+        block. Returns the number of entries updated.
+        """
+        head = self._head()
+        if self.last_block is None:
+            with self._lock:
+                self.last_block = head
+                self._save()
+            return 0
+        if head <= self.last_block:
+            return 0
+
+        from_block = self.last_block + 1
+        to_block = min(head, self.last_block + max_blocks)
+        logs = self.web3.eth.get_logs({
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'address': [Web3.to_checksum_address(address) for address in contracts],
+            'topics': [APPROVAL_TOPIC, [_address_topic(owner) for owner in owners]]
+        })
+
+        updated = 0
+        with self._lock:
+            for log in logs:
+                topics = log['topics']
+                if len(topics) == 4:
+                    key = self._nft_key(log['address'], int.from_bytes(bytes(topics[3]), 'big'))
+                    entries = self.nft_approvals
+                    approved = _topic_address(topics[2])
+                    value = {'approved': approved if approved != ZERO_ADDRESS else None}
+                else:
+                    key = self._allowance_key(_topic_address(topics[1]), log['address'], _topic_address(topics[2]))
+                    entries = self.allowances
+                    value = {'amount': int.from_bytes(bytes(log['data']), 'big')}
+
+                entry = entries.get(key)
+                if entry is not None and entry['block'] >= log['blockNumber']:
+                    continue
+                value['block'] = log['blockNumber']
+                entries[key] = value
+                updated += 1
+
+            self.last_block = to_block
+            self._save()
+
+        if updated:
+            logger.info(f"Approval ledger reconciled {updated} entries up to block {to_block}")
+        return updated
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_approval_ledger():
+    """Get the process-wide approval ledger"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = ApprovalLedger()
+        return _ledger
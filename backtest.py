@@ -0,0 +1,281 @@
+# backtest.py
+# Offline replay of the live strategy (+/-2% range, rebalance when the tick
+# leaves it) over historical pool Swap events or a tick series.
+#
+# Input is a CSV or Parquet file with one row per Swap event (or per block
+# for a tick series), in raw on-chain units:
+#   block_number, tick                       required
+#   timestamp                                optional (block_number * BLOCK_TIME otherwise)
+#   liquidity, amount0, amount1              optional; without them no fees are earned,
+#                                            and without liquidity no emissions either
+# amount0/amount1 are signed from the pool's side, as in the Swap event.
+#
+# Usage: python backtest.py swaps.parquet [range_pct]
+import sys
+import numpy as np
+from collections import namedtuple
+import tick_math
+import tick_math_np
+
+BLOCK_TIME = 2  # seconds per Base block
+SEARCH_WINDOW = 256  # first window scanned for a range exit; doubles until one is found
+
+# Strategy and cost model. Amounts are in human units of the pool tokens
+# (token0 = WETH, token1 = USDC for the default pool).
+BacktestConfig = namedtuple('BacktestConfig', [
+    'range_pct',             # +/- range width, as in calculate_two_percent_tick_range()
+    'tick_spacing',
+    'capital',               # starting capital in token1
+    'decimals0',
+    'decimals1',
+    'pool_fee',              # swap fee charged by the pool (also paid on our rebalance swaps)
+    'swap_slippage',         # price impact of a rebalance swap, as a fraction of the amount swapped
+    'gas_per_rebalance',     # gas of withdraw + swap + mint + stake
+    'gas_price_gwei',
+    'emissions_per_second',  # AERO emitted by the gauge per second
+    'aero_price',            # token1 per AERO
+    'check_interval',        # seconds between range checks; 0 reacts to every event
+    'slippage_tolerance',    # amountMin tolerance of the mint; a larger price move reverts it
+    'balance_factor',        # share of the wallet deposited, the rest stays idle
+    'gas_per_mint',          # gas burnt by a reverted mint
+], defaults=(2.0, 100, 10000.0, 18, 6, 0.0005, 0.001, 1_200_000, 0.01, 0.0, 0.0, 0, 0.005, 0.995, 400_000))
+
+# One position, from the mint at start_index to the rebalance at end_index
+Segment = namedtuple('Segment', [
+    'start_index', 'end_index', 'tick_lower', 'tick_upper', 'liquidity',
+    'value_in', 'value_out', 'fees', 'emissions', 'gas', 'slippage', 'time_in_range'
+])
+
+def load_events(path):
+    """Read a CSV or Parquet event file into a dict of float64 arrays, sorted by block"""
+    if path.endswith('.parquet'):
+        # pandas (with pyarrow) is only needed for Parquet input
+        import pandas as pd
+        frame = pd.read_parquet(path)
+        columns = {name: frame[name].to_numpy(dtype=np.float64) for name in frame.columns}
+    else:
+        data = np.genfromtxt(path, delimiter=',', names=True, dtype=np.float64)
+        columns = {name: np.atleast_1d(data[name]) for name in data.dtype.names}
+
+    missing = {'block_number', 'tick'} - set(columns)
+    if missing:
+        raise ValueError(f"{path} is missing column(s): {', '.join(sorted(missing))}")
+    if 'timestamp' not in columns:
+        columns['timestamp'] = columns['block_number'] * BLOCK_TIME
+
+    # Stable sort keeps the file order of events within a block
+    order = np.argsort(columns['block_number'], kind='stable')
+    return {name: values[order] for name, values in columns.items()}
+
+def check_indexes(timestamps, check_interval):
+    """Event index whose tick is current at each range check.
+
+    With check_interval 0 every event is a check (the event-driven bot);
+    otherwise checks run every check_interval seconds like the classic loop.
+    """
+    if not check_interval:
+        return np.arange(len(timestamps))
+    check_times = np.arange(timestamps[0], timestamps[-1] + check_interval, check_interval)
+    indexes = np.searchsorted(timestamps, check_times, side='right') - 1
+    return np.unique(indexes)
+
+def first_exit(ticks, start, lower, upper):
+    """Index of the first tick at or after `start` outside [lower, upper), or None.
+
+    The upper end is exclusive, as in tick_math.in_range(): a position earns
+    nothing at tick == upper, so that is an exit.
+
+    Scans windows that double in size, so finding an exit costs time
+    proportional to the distance travelled rather than to the whole file.
+    """
+    window = SEARCH_WINDOW
+    position = start
+    while position < len(ticks):
+        chunk = ticks[position:position + window]
+        outside = (chunk < lower) | (chunk >= upper)
+        if outside.any():
+            return position + int(np.argmax(outside))
+        position += window
+        window *= 2
+    return None
+
+def fee_values(events, pool_fee):
+    """Swap fee of every event, valued in raw token1 (zero without swap amounts)"""
+    if 'amount0' not in events or 'amount1' not in events:
+        return np.zeros(len(events['tick']))
+    prices = np.exp(events['tick'] * tick_math_np.LOG_1_0001)
+    # The fee is taken from the token going into the pool
+    amount_in = np.where(events['amount0'] > 0, events['amount0'] * prices, events['amount1'])
+    return pool_fee * np.abs(amount_in)
+
+def backtest(events, config=BacktestConfig()):
+    """Replay `events` through the range/rebalance rule; returns (summary, segments).
+
+    Each position is minted at the current tick with the whole portfolio
+    (held tokens are first swapped to the range's ratio, paying pool fee
+    and slippage) and held until a range check sees the tick outside it.
+    While the tick is in range the position earns its liquidity share,
+    L / (L_pool + L), of every swap fee and of the gauge emissions. Fees
+    are collected and reinvested at each rebalance; emissions are sold and
+    reported separately. Gas is paid in token0 at the exit price.
+
+    Only balance_factor of the wallet is deposited; the rest is held idle
+    in the same token ratio. A mint reverts, costing gas_per_mint, when
+    the price moves by more than slippage_tolerance between the check that
+    triggered it and the next event; it is then retried at the next check.
+    A mint needs a later event to land in, so once every remaining check's
+    mint reverts or none is left, the run ends holding the tokens
+    (ValueError if not even the first mint succeeds).
+
+    A position is in range for lower <= tick < upper (tick_math.in_range())
+    both when checking for an exit and when accruing fees.
+
+    All arithmetic runs on numpy slices per position, so the Python loop
+    runs once per rebalance, not once per event.
+    """
+    ticks = events['tick'].astype(np.int64)
+    timestamps = events['timestamp'] if 'timestamp' in events else events['block_number'] * BLOCK_TIME
+    count = len(ticks)
+    if count < 2:
+        raise ValueError("Need at least two events to backtest")
+
+    sqrt_prices = tick_math_np.sqrt_prices_at_ticks(ticks)
+    prices = sqrt_prices ** 2  # raw token1 per raw token0
+    # Without pool liquidity the position's share is unknown, so it earns nothing
+    pool_liquidity = events.get('liquidity')
+    fees_per_event = fee_values(events, config.pool_fee)
+    # Time each tick is current: until the next event
+    durations = np.diff(timestamps, append=timestamps[-1])
+
+    scale1 = 10.0 ** config.decimals1
+    gas_wei = config.gas_per_rebalance * config.gas_price_gwei * 1e9  # raw token0 (WETH)
+    failed_mint_wei = config.gas_per_mint * config.gas_price_gwei * 1e9
+    tolerance_ticks = tick_math.ticks_for_percent(config.slippage_tolerance * 100)
+    emission_value = config.emissions_per_second * config.aero_price * scale1  # raw token1 per second
+
+    checks = check_indexes(timestamps, config.check_interval)
+    check_ticks = ticks[checks]
+
+    # The wallet starts with the capital in token1
+    held0, held1 = 0.0, config.capital * scale1
+    segments = []
+    check = 0
+    while True:
+        # Mints revert while the price moves past the tolerance before they land
+        failed_gas = 0.0
+        while check < len(checks) and checks[check] + 1 < count and \
+                abs(ticks[checks[check] + 1] - ticks[checks[check]]) > tolerance_ticks:
+            failed_gas += failed_mint_wei * prices[checks[check]]
+            check += 1
+        held1 -= failed_gas
+        if check == len(checks) or checks[check] + 1 == count:
+            # No check left with a later event for a mint to land in: keep the tokens
+            if not segments:
+                raise ValueError("Every mint reverts: the price always moves past the slippage tolerance")
+            last = segments[-1]
+            segments[-1] = last._replace(value_out=last.value_out - failed_gas / scale1,
+                                         gas=last.gas + failed_gas / scale1)
+            break
+
+        start = checks[check]
+        lower, upper = tick_math.symmetric_tick_range(int(ticks[start]), config.tick_spacing, config.range_pct)
+        price = prices[start]
+
+        # Swap the wallet to the range's token ratio, then mint with everything
+        unit0, unit1 = tick_math_np.amounts_for_liquidity(sqrt_prices[start] * tick_math_np.Q96, lower, upper, 1.0)
+        value = held0 * price + held1
+        target_value0 = value * unit0 * price / (unit0 * price + unit1)
+        slippage = abs(held0 * price - target_value0) * (config.pool_fee + config.swap_slippage)
+        value_in = (value - slippage) * config.balance_factor
+        liquidity = value_in / (unit0 * price + unit1)
+        idle0, idle1 = (value - slippage - value_in) * unit0 / (unit0 * price + unit1), \
+            (value - slippage - value_in) * unit1 / (unit0 * price + unit1)
+
+        exit_check = first_exit(check_ticks, check + 1, lower, upper)
+        end = checks[exit_check] if exit_check is not None else count - 1
+
+        # Accrual over the ticks current from the mint up to the rebalance. Swap i
+        # trades from the tick left by event i - 1, so fees[i] pairs with tick[i - 1].
+        span = slice(start, end)
+        active = (ticks[span] >= lower) & (ticks[span] < upper)
+        if pool_liquidity is not None:
+            share = np.where(active, liquidity / (pool_liquidity[span] + liquidity), 0.0)
+        else:
+            share = np.zeros(end - start)
+        fees = float(np.dot(fees_per_event[start + 1:end + 1], share))
+        emissions = float(np.dot(durations[span], share)) * emission_value
+        time_in_range = float(np.dot(durations[span], active))
+
+        # Withdraw at the rebalance tick: position tokens, idle tokens and fees, minus gas
+        amount0, amount1 = tick_math_np.amounts_for_liquidity(sqrt_prices[end] * tick_math_np.Q96, lower, upper, liquidity)
+        gas = float(gas_wei * prices[end]) if exit_check is not None else 0.0
+        held0 = float(amount0 + idle0)
+        held1 = float(amount1 + idle1) + fees - gas
+        segments.append(Segment(
+            int(start), int(end), lower, upper, float(liquidity), float(value_in / scale1),
+            float((held0 * prices[end] + held1) / scale1), fees / scale1, emissions / scale1,
+            float((gas + failed_gas) / scale1), float(slippage / scale1), time_in_range
+        ))
+        if exit_check is None:
+            break
+        check = exit_check
+
+    return summarize(segments, events, timestamps, config), segments
+
+def summarize(segments, events, timestamps, config):
+    """Totals over all positions, compared with holding the first position's tokens"""
+    scale1 = 10.0 ** config.decimals1
+    ticks = events['tick']
+    start_price = np.exp(ticks[0] * tick_math_np.LOG_1_0001)
+    end_price = np.exp(ticks[-1] * tick_math_np.LOG_1_0001)
+
+    # Hold: the first mint's token ratio for the whole wallet, valued at the final price
+    first = segments[0]
+    amount0, amount1 = tick_math_np.amounts_for_liquidity(
+        np.sqrt(start_price) * tick_math_np.Q96, first.tick_lower, first.tick_upper,
+        first.liquidity / config.balance_factor
+    )
+    hold_value = float((amount0 * end_price + amount1) / scale1)
+
+    duration = float(timestamps[-1] - timestamps[0])
+    final_value = segments[-1].value_out
+    emissions = sum(segment.emissions for segment in segments)
+    return {
+        'events': len(ticks),
+        'blocks': int(events['block_number'][-1] - events['block_number'][0]),
+        'days': duration / 86400,
+        'rebalances': len(segments) - 1,
+        'capital': config.capital,
+        'final_value': final_value,
+        'hold_value': hold_value,
+        'fees': sum(segment.fees for segment in segments),
+        'emissions': emissions,
+        'gas': sum(segment.gas for segment in segments),
+        'slippage': sum(segment.slippage for segment in segments),
+        'time_in_range': sum(segment.time_in_range for segment in segments) / duration if duration else 0.0,
+        'return': (final_value + emissions) / config.capital - 1
+    }
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python backtest.py <events.csv|events.parquet> [range_pct]")
+        return
+    config = BacktestConfig()
+    if len(sys.argv) > 2:
+        config = config._replace(range_pct=float(sys.argv[2]))
+
+    events = load_events(sys.argv[1])
+    summary, _ = backtest(events, config)
+    print(f"\n+/-{config.range_pct}% strategy over {summary['days']:.1f} days "
+          f"({summary['blocks']:,} blocks, {summary['events']:,} events)")
+    print(f"Rebalances:    {summary['rebalances']}")
+    print(f"Time in range: {summary['time_in_range'] * 100:.1f}%")
+    print(f"Fees:          {summary['fees']:.2f}")
+    print(f"Emissions:     {summary['emissions']:.2f}")
+    print(f"Gas:           {summary['gas']:.2f}")
+    print(f"Slippage:      {summary['slippage']:.2f}")
+    print(f"Final value:   {summary['final_value']:.2f} (hold: {summary['hold_value']:.2f})")
+    print(f"Return:        {summary['return'] * 100:.2f}%")
+
+if __name__ == "__main__":
+    main()
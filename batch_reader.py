@@ -0,0 +1,152 @@
+# batch_reader.py
+from hexbytes import HexBytes
+from wallet_setup import web3, get_wallet_address
+from fee_engine import get_fee_engine, FEE_HISTORY_BLOCKS, PRIORITY_FEE_PERCENTILE
+from nonce_manager import get_nonce_manager
+from read_cache import get_read_cache
+
+def _to_int(value):
+    return int(value, 16) if isinstance(value, str) else value
+
+def _decode_fee_history(history):
+    return {
+        'baseFeePerGas': [_to_int(fee) for fee in history['baseFeePerGas']],
+        'reward': [[_to_int(tip) for tip in rewards] for rewards in history.get('reward') or []]
+    }
+
+def _block_param(block_identifier):
+    return hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+
+class BatchReader:
+    """Collects heterogeneous reads and sends them as one JSON-RPC batch.
+
+    Each add method returns the index of its result in the list returned
+    by execute(). Contract reads take multicall.Call objects; a failed read
+    marked allow_failure yields None, any other failure raises.
+    """
+
+    def __init__(self, block_identifier='latest', web3_instance=None):
+        self.web3 = web3_instance or web3
+        self.block_identifier = block_identifier
+        self._requests = []  # (method, params, decode, label, allow_failure)
+
+    def _add(self, method, params, decode, label=None, allow_failure=False):
+        self._requests.append((method, params, decode, label or method, allow_failure))
+        return len(self._requests) - 1
+
+    def call(self, call):
+        def decode(result):
+            return_data = HexBytes(result)
+            if not return_data:
+                raise ValueError("empty return data")
+            return call.decode(return_data)
+
+        return self._add(
+            'eth_call',
+            [{'to': call.contract.address, 'data': call.calldata()}, _block_param(self.block_identifier)],
+            decode,
+            f"{call.contract.address}.{call.fn_name}",
+            call.allow_failure
+        )
+
+    def balance(self, address):
+        return self._add('eth_getBalance', [address, _block_param(self.block_identifier)], _to_int)
+
+    def transaction_count(self, address, block_identifier='pending'):
+        return self._add('eth_getTransactionCount', [address, _block_param(block_identifier)], _to_int)
+
+    def gas_price(self):
+        return self._add('eth_gasPrice', [], _to_int)
+
+    def block_number(self):
+        return self._add('eth_blockNumber', [], _to_int)
+
+    def fee_history(self, block_count=FEE_HISTORY_BLOCKS, percentiles=(PRIORITY_FEE_PERCENTILE,)):
+        return self._add('eth_feeHistory', [hex(block_count), 'latest', list(percentiles)], _decode_fee_history)
+
+    def _send(self):
+        batch = [(method, params) for method, params, _, _, _ in self._requests]
+        try:
+            responses = self.web3.provider.make_batch_request(batch)
+        except NotImplementedError:
+            # Providers without batch support: same results, one request each
+            responses = [self.web3.provider.make_request(method, params) for method, params in batch]
+
+        if not isinstance(responses, list):
+            raise RuntimeError(f"Batch request failed: {responses.get('error')}")
+        return responses
+
+    def execute(self):
+        """Send all collected reads in one round trip and return decoded results in order"""
+        if not self._requests:
+            return []
+
+        results = []
+        for (method, params, decode, label, allow_failure), response in zip(self._requests, self._send()):
+            try:
+                if 'error' in response:
+                    raise ValueError(response['error'].get('message', response['error']))
+                results.append(decode(response['result']))
+            except Exception as e:
+                if not allow_failure:
+                    raise RuntimeError(f"Batched {label} failed: {e}") from e
+                results.append(None)
+
+        self._requests = []
+        return results
+
+def read_batch(calls, block_identifier='latest', use_cache=True):
+    """Execute several contract reads (multicall.Call objects) in one JSON-RPC batch.
+
+    Reads found in the read cache are not sent; the rest are cached.
+    """
+    cache = get_read_cache() if use_cache else None
+    if cache is None:
+        results, missing = [None] * len(calls), list(range(len(calls)))
+    else:
+        results, missing = cache.lookup(calls, block_identifier)
+
+    reader = BatchReader(block_identifier)
+    for i in missing:
+        reader.call(calls[i])
+    for i, value in zip(missing, reader.execute()):
+        results[i] = value
+
+    if cache is not None:
+        cache.store(calls, results, missing, block_identifier)
+    return results
+
+def gather_context(calls, address=None, use_cache=True):
+    """Pre-transaction reads for `address` in a single round trip.
+
+    Sends `calls` together with the fee history and pending nonce when the
+    fee engine and nonce manager do not have them yet, primes both, and
+    returns the decoded call results. Building and sending the transaction
+    afterwards then needs no extra reads besides gas estimation. Calls
+    served from the read cache are left out of the batch.
+    """
+    address = address or get_wallet_address()
+    fee_engine = get_fee_engine()
+    nonce_manager = get_nonce_manager(address)
+    cache = get_read_cache() if use_cache else None
+    if cache is None:
+        results, missing = [None] * len(calls), list(range(len(calls)))
+    else:
+        results, missing = cache.lookup(calls)
+
+    reader = BatchReader()
+    for i in missing:
+        reader.call(calls[i])
+    fee_index = reader.fee_history() if fee_engine.needs_refresh() else None
+    nonce_index = reader.transaction_count(address, 'pending') if nonce_manager.needs_sync() else None
+
+    batch_results = reader.execute()
+    for i, value in zip(missing, batch_results):
+        results[i] = value
+    if cache is not None:
+        cache.store(calls, results, missing)
+    if fee_index is not None:
+        fee_engine.prime(batch_results[fee_index])
+    if nonce_index is not None:
+        nonce_manager.prime(batch_results[nonce_index])
+    return results
@@ -0,0 +1,50 @@
+# confirmations.py
+import time
+import logging
+from wallet_setup import web3
+
+logger = logging.getLogger()
+
+# Polling starts fast (Base produces a block every ~2s) and backs off
+INITIAL_POLL_INTERVAL = 0.5  # seconds
+MAX_POLL_INTERVAL = 4  # seconds
+POLL_BACKOFF = 1.5
+DEFAULT_TIMEOUT = 60  # seconds
+
+def wait_until(predicate, timeout=DEFAULT_TIMEOUT, description="condition",
+               initial_interval=INITIAL_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+    """Poll `predicate` with adaptive backoff until it returns a truthy value.
+
+    Returns True as soon as the predicate holds, or False after `timeout`
+    seconds. Exceptions raised by the predicate (e.g. a lagging RPC node)
+    count as "not yet".
+    """
+    deadline = time.time() + timeout
+    interval = initial_interval
+
+    while True:
+        try:
+            if predicate():
+                return True
+        except Exception as e:
+            logger.debug(f"Waiting for {description}: {e}")
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            logger.warning(f"Timed out after {timeout}s waiting for {description}")
+            return False
+
+        time.sleep(min(interval, remaining))
+        interval = min(interval * POLL_BACKOFF, max_interval)
+
+def wait_for_block(target_block, timeout=DEFAULT_TIMEOUT):
+    """Wait until the node has reached `target_block`"""
+    return wait_until(
+        lambda: web3.eth.block_number >= target_block,
+        timeout=timeout,
+        description=f"block {target_block}"
+    )
+
+def wait_for_next_block(timeout=DEFAULT_TIMEOUT):
+    """Wait until the node has produced at least one block after the current one"""
+    return wait_for_block(web3.eth.block_number + 1, timeout=timeout)
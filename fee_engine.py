@@ -0,0 +1,125 @@
+# fee_engine.py
+import os
+import time
+import logging
+import threading
+from web3.exceptions import ContractLogicError
+from wallet_setup import web3, get_wallet_address
+from aerodrome_client import get_chain_id
+from simulation import TransactionReverted, revert_reason, record_estimate
+
+logger = logging.getLogger()
+
+# Gas limit = eth_estimateGas * margin
+GAS_LIMIT_MARGIN = float(os.getenv('AERODROME_GAS_MARGIN', '1.2'))
+
+# EIP-1559 fees are derived from a short eth_feeHistory window
+FEE_HISTORY_BLOCKS = 20
+PRIORITY_FEE_PERCENTILE = 50
+BASE_FEE_MULTIPLIER = 2  # headroom for the base fee rising over the next few blocks
+MIN_PRIORITY_FEE = 1000  # wei; Base tips are tiny but should not be zero
+FEE_CACHE_TTL = 6  # seconds, about three Base blocks
+
+class FeeEngine:
+    """EIP-1559 fee and gas limit source shared by all transaction builders.
+
+    maxPriorityFeePerGas is the median of the per-block tip percentile over
+    the fee history window; maxFeePerGas is the next block's base fee times
+    BASE_FEE_MULTIPLIER plus that tip. Only the effective price is paid, so
+    the multiplier caps the cost of a base fee spike rather than adding to it.
+    The fee history is fetched at most once per FEE_CACHE_TTL.
+    """
+
+    def __init__(self, web3_instance=None, gas_margin=GAS_LIMIT_MARGIN, cache_ttl=FEE_CACHE_TTL):
+        self.web3 = web3_instance or web3
+        self.gas_margin = gas_margin
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._fees = None
+        self._fetched_at = 0
+
+    def _fetch_fees(self):
+        history = self.web3.eth.fee_history(FEE_HISTORY_BLOCKS, 'latest', [PRIORITY_FEE_PERCENTILE])
+        return self.fees_from_history(history)
+
+    @staticmethod
+    def fees_from_history(history):
+        """Fee fields from an eth_feeHistory result (integer values)"""
+        # The last base fee entry is the one for the next (pending) block
+        next_base_fee = history['baseFeePerGas'][-1]
+        tips = sorted(rewards[0] for rewards in history['reward'] if rewards)
+        priority_fee = max(tips[len(tips) // 2] if tips else 0, MIN_PRIORITY_FEE)
+
+        return {
+            'maxPriorityFeePerGas': priority_fee,
+            'maxFeePerGas': next_base_fee * BASE_FEE_MULTIPLIER + priority_fee
+        }
+
+    def needs_refresh(self):
+        return self._fees is None or time.time() - self._fetched_at > self.cache_ttl
+
+    def prime(self, history):
+        """Store fees from a fee history fetched elsewhere (e.g. in a JSON-RPC batch)"""
+        with self._lock:
+            self._fees = self.fees_from_history(history)
+            self._fetched_at = time.time()
+
+    def fees(self, force=False):
+        """Current {'maxFeePerGas', 'maxPriorityFeePerGas'}, cached for cache_ttl seconds"""
+        with self._lock:
+            if force or self.needs_refresh():
+                self._fees = self._fetch_fees()
+                self._fetched_at = time.time()
+                logger.debug(f"Fees refreshed: max {self._fees['maxFeePerGas'] / 1e9:.6f} Gwei, "
+                             f"tip {self._fees['maxPriorityFeePerGas'] / 1e9:.6f} Gwei")
+            return dict(self._fees)
+
+    def estimate_gas(self, contract_function, tx_params):
+        """eth_estimateGas for a contract call, scaled by the gas margin.
+
+        Raises simulation.TransactionReverted with the decoded reason if the call reverts.
+        """
+        try:
+            estimate = contract_function.estimate_gas(tx_params)
+        except ContractLogicError as e:
+            raise TransactionReverted(revert_reason(e)) from e
+        return int(estimate * self.gas_margin)
+
+    def build_transaction(self, contract_function, tx_params=None, gas=None):
+        """Build a type-2 transaction for a contract call.
+
+        The gas limit comes from eth_estimateGas plus the margin unless `gas`
+        is given. Estimation simulates the call, so a transaction that would
+        revert raises TransactionReverted here instead of being broadcast,
+        and send_transaction() does not simulate it again.
+        """
+        params = {'from': get_wallet_address(), 'value': 0, 'chainId': get_chain_id()}
+        params.update(tx_params or {})
+        params.update(self.fees())
+        params['gas'] = gas if gas is not None else self.estimate_gas(
+            contract_function, {'from': params['from'], 'value': params['value']}
+        )
+        tx = contract_function.build_transaction(params)
+        if gas is None:
+            record_estimate(tx)
+        return tx
+
+_fee_engine = None
+_registry_lock = threading.Lock()
+
+def get_fee_engine():
+    """Get the process-wide fee engine"""
+    global _fee_engine
+    with _registry_lock:
+        if _fee_engine is None:
+            _fee_engine = FeeEngine()
+        return _fee_engine
+
+def build_transaction(contract_function, tx_params=None, gas=None):
+    """Build a transaction with estimated gas and EIP-1559 fees from the shared fee engine"""
+    return get_fee_engine().build_transaction(contract_function, tx_params, gas)
+
+def describe_fees(tx):
+    """Short human readable summary of a built transaction's gas settings"""
+    return (f"gas limit {tx['gas']:,}, max fee {tx['maxFeePerGas'] / 1e9:.6f} Gwei, "
+            f"tip {tx['maxPriorityFeePerGas'] / 1e9:.6f} Gwei")
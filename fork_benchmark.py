@@ -0,0 +1,236 @@
+# fork_benchmark.py
+# End-to-end rebalance benchmark on a local anvil fork of Base: runs
+# initialize_bot(), forces the position out of range and runs
+# monitor_and_rebalance(), reporting wall-clock time, blocks, RPC traffic
+# and gas for every step. No real funds are spent.
+#
+# Usage: python fork_benchmark.py [output.json]
+# Needs anvil (Foundry) on PATH and an archive-capable RPC URL to fork from.
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import tempfile
+import subprocess
+import importlib.util
+from collections import namedtuple
+from contextlib import contextmanager
+from web3 import Web3
+
+ANVIL = os.getenv('AERODROME_ANVIL', 'anvil')
+# RPC endpoint forked from; defaults to the first AERODROME_RPC_URLS entry
+FORK_URL = os.getenv('AERODROME_FORK_URL') or os.getenv('AERODROME_RPC_URLS', '').split(',')[0].strip()
+FORK_BLOCK = os.getenv('AERODROME_FORK_BLOCK')  # default: latest
+# anvil state file: loaded when it exists and written when anvil exits, so
+# every run after the first starts from the same saved state
+FORK_STATE = os.path.abspath(os.getenv('AERODROME_FORK_STATE', 'fork_state.json'))
+FORK_BLOCK_TIME = float(os.getenv('AERODROME_FORK_BLOCK_TIME', '0'))  # seconds; 0 mines every tx instantly
+FORK_PORT = int(os.getenv('AERODROME_FORK_PORT', '8545'))
+# anvil's first default development account, funded on the fork
+FORK_PRIVATE_KEY = os.getenv(
+    'AERODROME_FORK_PRIVATE_KEY', '0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80'
+)
+FUND_ETH = 20  # ETH balance set on the fork
+WRAP_ETH = 10  # of which wrapped into WETH for the first deposit
+STARTUP_TIMEOUT = 60  # seconds to wait for anvil to answer
+
+WETH_ADDRESS = "0x4200000000000000000000000000000000000006"
+BOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aerodrome-bot.py')
+
+# One measured step; depth > 0 marks a sub-step of the step listed after it
+Step = namedtuple('Step', [
+    'name', 'depth', 'seconds', 'blocks', 'round_trips', 'rpc_calls', 'transactions', 'gas_used', 'methods'
+])
+
+def start_anvil(rpc_url):
+    """Start anvil on FORK_PORT and wait until it answers; returns the process"""
+    if not FORK_URL:
+        raise ValueError("Set AERODROME_FORK_URL (or AERODROME_RPC_URLS) to the RPC endpoint to fork")
+
+    command = [ANVIL, '--fork-url', FORK_URL, '--port', str(FORK_PORT), '--state', FORK_STATE, '--silent']
+    if FORK_BLOCK:
+        command += ['--fork-block-number', FORK_BLOCK]
+    if FORK_BLOCK_TIME:
+        command += ['--block-time', str(FORK_BLOCK_TIME)]
+    process = subprocess.Popen(command)
+
+    fork = Web3(Web3.HTTPProvider(rpc_url))
+    deadline = time.time() + STARTUP_TIMEOUT
+    while not fork.is_connected():
+        if process.poll() is not None:
+            raise RuntimeError(f"anvil exited with code {process.returncode}")
+        if time.time() > deadline:
+            process.kill()
+            raise TimeoutError(f"anvil did not start within {STARTUP_TIMEOUT}s")
+        time.sleep(0.2)
+    return process
+
+def stop_anvil(process):
+    """Stop anvil with SIGINT so it writes FORK_STATE"""
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def fund_wallet(fork, account):
+    """Give the benchmark wallet ETH and WETH on the fork"""
+    fork.provider.make_request('anvil_setBalance', [account.address, hex(FUND_ETH * 10**18)])
+    # WETH mints to anyone sending it ETH
+    tx = {
+        'to': Web3.to_checksum_address(WETH_ADDRESS),
+        'value': WRAP_ETH * 10**18,
+        'gas': 100000,
+        'maxFeePerGas': fork.eth.gas_price * 2,
+        'maxPriorityFeePerGas': 0,
+        'nonce': fork.eth.get_transaction_count(account.address),
+        'chainId': fork.eth.chain_id
+    }
+    tx_hash = fork.eth.send_raw_transaction(account.sign_transaction(tx).raw_transaction)
+    fork.eth.wait_for_transaction_receipt(tx_hash)
+
+class Meter:
+    """Measures steps of the bot against the fork.
+
+    Time and RPC counters come from the bot's own provider; blocks and gas
+    are read afterwards over a separate connection so they do not count
+    as bot traffic.
+    """
+
+    def __init__(self, fork, provider, address):
+        self.fork = fork
+        self.provider = provider
+        self.address = address
+        self.steps = []
+        self._depth = 0
+
+    def _wallet_gas(self, from_block, to_block):
+        transactions = 0
+        gas_used = 0
+        for number in range(from_block + 1, to_block + 1):
+            for tx in self.fork.eth.get_block(number, full_transactions=True).transactions:
+                if tx['from'] == self.address:
+                    transactions += 1
+                    gas_used += self.fork.eth.get_transaction_receipt(tx['hash']).gasUsed
+        return transactions, gas_used
+
+    @contextmanager
+    def step(self, name):
+        depth = self._depth
+        self._depth += 1
+        block = self.fork.eth.block_number
+        stats = self.provider.stats()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self._depth -= 1
+            end_stats = self.provider.stats()
+            end_block = self.fork.eth.block_number
+            transactions, gas_used = self._wallet_gas(block, end_block)
+            methods = {
+                method: count - stats['methods'].get(method, 0)
+                for method, count in end_stats['methods'].items()
+                if count > stats['methods'].get(method, 0)
+            }
+            self.steps.append(Step(
+                name, depth, seconds, end_block - block, end_stats['round_trips'] - stats['round_trips'],
+                end_stats['calls'] - stats['calls'], transactions, gas_used, methods
+            ))
+
+    def wrap(self, module, name, label=None):
+        """Measure every call of module.<name> as a sub-step"""
+        original = getattr(module, name)
+
+        def measured(*args, **kwargs):
+            with self.step(label or name):
+                return original(*args, **kwargs)
+
+        setattr(module, name, measured)
+
+def load_bot():
+    """Import aerodrome-bot.py (not importable by name because of the hyphen)"""
+    spec = importlib.util.spec_from_file_location('aerodrome_bot', BOT_FILE)
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+    return bot
+
+def force_out_of_range(bot, token_id):
+    """Make the bot see `token_id` as out of range by moving its cached range above the pool tick"""
+    current_tick, tick_spacing, _, _ = bot.get_pool_info()
+    lower = (current_tick // tick_spacing + 10) * tick_spacing
+    bot.position_ranges[token_id] = (lower, lower + 10 * tick_spacing)
+
+def run_benchmark():
+    rpc_url = f"http://127.0.0.1:{FORK_PORT}"
+    work_dir = tempfile.mkdtemp(prefix='aerodrome_fork_')
+    fork = Web3(Web3.HTTPProvider(rpc_url))
+    account = fork.eth.account.from_key(FORK_PRIVATE_KEY)
+
+    # The bot's modules read these at import: point them at the fork and at
+    # throwaway state so the real state database and ledger are untouched.
+    # Running from the work directory also keeps a real active_position.json
+    # from being imported.
+    os.chdir(work_dir)
+    os.environ.update({
+        'AERODROME_RPC_URLS': rpc_url,
+        'AERODROME_WRITE_RPC_URL': rpc_url,
+        'AERODROME_WALLET_ADDRESS': account.address,
+        'AERODROME_STATE_DB': os.path.join(work_dir, 'state.db'),
+        'AERODROME_APPROVAL_LEDGER': os.path.join(work_dir, 'approval_ledger.json'),
+        'AERODROME_MONITOR_MODE': 'classic'
+    })
+
+    process = start_anvil(rpc_url)
+    try:
+        fund_wallet(fork, account)
+
+        import wallet_setup
+        wallet_setup.set_key_provider(wallet_setup.StaticKeyProvider(FORK_PRIVATE_KEY), account.address)
+        meter = Meter(fork, wallet_setup.web3.provider, account.address)
+
+        with meter.step('import bot'):
+            bot = load_bot()
+        import aerodrome_rewards_claim
+        import aerodrome_unstake
+        import aerodrome_withdraw
+        meter.wrap(aerodrome_rewards_claim, 'send_claim_rewards', 'claim rewards')
+        meter.wrap(aerodrome_unstake, 'unstake_position', 'unstake')
+        meter.wrap(aerodrome_withdraw, 'withdraw_position_atomic', 'withdraw')
+        meter.wrap(bot, 'create_position', 'create position')
+
+        with meter.step('initialize_bot'):
+            bot.initialize_bot()
+        if bot.active_position_id is None:
+            raise RuntimeError("initialize_bot() did not end with an active position")
+
+        force_out_of_range(bot, bot.active_position_id)
+        with meter.step('monitor_and_rebalance'):
+            bot.monitor_and_rebalance(force=True)
+        return meter.steps
+    finally:
+        stop_anvil(process)
+
+def print_report(steps):
+    print(f"\nRebalance benchmark on anvil fork (block time: {FORK_BLOCK_TIME or 'instant'})")
+    print(f"{'step':<28} {'seconds':>8} {'blocks':>7} {'HTTP':>6} {'calls':>6} {'txs':>4} {'gas':>10}")
+    for step in steps:
+        name = '  ' * step.depth + step.name
+        print(f"{name:<28} {step.seconds:>8.2f} {step.blocks:>7} {step.round_trips:>6} "
+              f"{step.rpc_calls:>6} {step.transactions:>4} {step.gas_used:>10,}")
+
+def main():
+    # Bot logs go to the console only, not to aerodrome_bot.log
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    steps = run_benchmark()
+    print_report(steps)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w') as f:
+            json.dump([step._asdict() for step in steps], f, indent=2)
+        print(f"\nResults written to {sys.argv[1]}")
+
+if __name__ == "__main__":
+    main()
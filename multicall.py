@@ -0,0 +1,78 @@
+# multicall.py
+from eth_utils import get_abi_output_types
+from wallet_setup import web3
+from read_cache import get_read_cache
+
+# Multicall3 is deployed at the same address on every EVM chain, including Base
+MULTICALL3_ADDRESS = web3.to_checksum_address("0xcA11bde05977b3631167028862bE2a173976CA11")
+
+MULTICALL3_ABI = '''[
+    {"inputs":[{"components":[{"internalType":"address","name":"target","type":"address"},{"internalType":"bool","name":"allowFailure","type":"bool"},{"internalType":"bytes","name":"callData","type":"bytes"}],"internalType":"struct Multicall3.Call3[]","name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"internalType":"bool","name":"success","type":"bool"},{"internalType":"bytes","name":"returnData","type":"bytes"}],"internalType":"struct Multicall3.Result[]","name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"},
+    {"inputs":[],"name":"getBlockNumber","outputs":[{"internalType":"uint256","name":"blockNumber","type":"uint256"}],"stateMutability":"view","type":"function"}
+]'''
+
+# Keep each eth_call comfortably below provider response size and gas limits
+MAX_CALLS_PER_BATCH = 500
+
+multicall_contract = web3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+
+class Call:
+    """A single contract read, executed inside aggregate3 or a JSON-RPC batch"""
+
+    def __init__(self, contract, fn_name, args=(), allow_failure=False):
+        self.contract = contract
+        self.fn_name = fn_name
+        self.args = list(args)
+        self.allow_failure = allow_failure
+
+    def calldata(self):
+        return self.contract.encode_abi(self.fn_name, args=self.args)
+
+    def encode(self):
+        return (self.contract.address, self.allow_failure, self.calldata())
+
+    def decode(self, return_data):
+        fn_abi = self.contract.get_function_by_name(self.fn_name).abi
+        output_types = get_abi_output_types(fn_abi)
+        values = web3.codec.decode(output_types, return_data)
+        return values[0] if len(values) == 1 else values
+
+def block_number_call(multicall=None):
+    """Call that returns the block number the batch was executed at"""
+    return Call(multicall or multicall_contract, 'getBlockNumber')
+
+def aggregate(calls, block_identifier='latest', multicall=None, use_cache=True):
+    """Execute calls through Multicall3.aggregate3 and return decoded results.
+
+    Results are returned in the same order as the calls. A call that was
+    marked allow_failure and reverted yields None instead of a value.
+    Reads pinned to a block number go through the read cache; 'latest'
+    batches are always sent whole so their results share one block.
+    """
+    multicall = multicall or multicall_contract
+    cache = get_read_cache() if use_cache and isinstance(block_identifier, int) else None
+    if cache is not None:
+        cached, missing = cache.lookup(calls, block_identifier)
+        if missing:
+            fetched = aggregate([calls[i] for i in missing], block_identifier, multicall, use_cache=False)
+            for i, value in zip(missing, fetched):
+                cached[i] = value
+            cache.store(calls, cached, missing, block_identifier)
+        return cached
+
+    results = []
+    for start in range(0, len(calls), MAX_CALLS_PER_BATCH):
+        batch = calls[start:start + MAX_CALLS_PER_BATCH]
+        raw_results = multicall.functions.aggregate3(
+            [call.encode() for call in batch]
+        ).call(block_identifier=block_identifier)
+
+        for call, (success, return_data) in zip(batch, raw_results):
+            if success and return_data:
+                results.append(call.decode(return_data))
+            elif call.allow_failure:
+                results.append(None)
+            else:
+                raise RuntimeError(f"Multicall to {call.contract.address}.{call.fn_name} failed")
+
+    return results
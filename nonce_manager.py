@@ -0,0 +1,303 @@
+# nonce_manager.py
+import time
+import heapq
+import logging
+import threading
+from hexbytes import HexBytes
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from web3.exceptions import TransactionNotFound, TimeExhausted, Web3RPCError
+from wallet_setup import web3, get_wallet_address, get_signer
+from read_cache import get_read_cache
+from simulation import simulate
+from receipt_tracker import get_receipt_tracker
+from rpc_provider import never_delivered
+
+logger = logging.getLogger()
+
+RECEIPT_TIMEOUT = 300  # seconds
+
+# eth_sendRawTransaction errors meaning the node already holds this exact transaction
+ALREADY_KNOWN_ERRORS = ('already known', 'known transaction', 'already imported')
+# ...and errors meaning the nonce is taken by another transaction
+NONCE_TAKEN_ERRORS = ('nonce too low', 'replacement transaction underpriced')
+
+def _error_matches(error, messages):
+    text = str(error).lower()
+    return any(message in text for message in messages)
+
+def _never_broadcast(error):
+    """Whether a failed send certainly did not reach the node's mempool.
+
+    True for a definite rejection (a JSON-RPC error or a 429) and for
+    connections that were never established. Timeouts, 5xx responses and
+    dropped connections are ambiguous: the node may have accepted the
+    transaction before the failure.
+    """
+    return isinstance(error, Web3RPCError) or never_delivered(error)
+
+class NonceManager:
+    """Hands out nonces locally so transactions can be sent back-to-back.
+
+    The chain is only asked for the transaction count on first use and after
+    sync(). Nonces of transactions that were never broadcast are released and
+    reused first so they do not leave a gap; broadcast transactions are kept
+    until mined so dropped ones can be re-sent by recover().
+    """
+
+    def __init__(self, address, web3_instance=None):
+        self.address = address
+        self.web3 = web3_instance or web3
+        self._lock = threading.Lock()
+        self._next_nonce = None
+        self._released = []
+        self.pending = {}  # nonce -> (tx_hash, raw_transaction) of the latest send
+        self._sent_hashes = {}  # every hash sent (replacements included) -> nonce
+
+    def sync(self):
+        """Reset the local counter from the node's pending transaction count"""
+        with self._lock:
+            self._next_nonce = self.web3.eth.get_transaction_count(self.address, 'pending')
+            self._released = []
+            mined = self.web3.eth.get_transaction_count(self.address, 'latest')
+            for nonce in [n for n in self.pending if n < mined]:
+                self._forget(nonce)
+        logger.info(f"Nonce manager for {self.address} synced at nonce {self._next_nonce}")
+
+    def needs_sync(self):
+        return self._next_nonce is None
+
+    def prime(self, pending_count):
+        """Initialise the counter from a pending transaction count fetched elsewhere"""
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = pending_count
+
+    def allocate(self):
+        """Reserve the next nonce"""
+        with self._lock:
+            if self._released:
+                return heapq.heappop(self._released)
+            if self._next_nonce is None:
+                self._next_nonce = self.web3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def release(self, nonce):
+        """Give back a nonce whose transaction was never broadcast"""
+        with self._lock:
+            if self._next_nonce is not None and nonce == self._next_nonce - 1:
+                self._next_nonce -= 1
+            else:
+                heapq.heappush(self._released, nonce)
+
+    def mark_sent(self, nonce, tx_hash, raw_transaction):
+        """Record a broadcast transaction, or a replacement re-sent with the same nonce"""
+        with self._lock:
+            self.pending[nonce] = (tx_hash, raw_transaction)
+            self._sent_hashes[HexBytes(tx_hash)] = nonce
+
+    def _forget(self, nonce):
+        self.pending.pop(nonce, None)
+        for tx_hash in [h for h, n in self._sent_hashes.items() if n == nonce]:
+            del self._sent_hashes[tx_hash]
+
+    def mark_mined(self, tx_hash):
+        """Drop the nonce of a mined transaction (any of its replacements' hashes works)"""
+        with self._lock:
+            nonce = self._sent_hashes.get(HexBytes(tx_hash))
+            if nonce is not None:
+                self._forget(nonce)
+
+    def recover(self):
+        """Clear mined transactions and re-broadcast any the node has dropped.
+
+        A dropped transaction leaves a nonce gap that blocks every later
+        transaction from this address, so it is re-sent from the stored
+        signed payload. Returns the number of transactions re-broadcast.
+        """
+        mined = self.web3.eth.get_transaction_count(self.address, 'latest')
+        with self._lock:
+            for nonce in [n for n in self.pending if n < mined]:
+                self._forget(nonce)
+            still_pending = sorted(self.pending.items())
+
+        rebroadcast = 0
+        for nonce, (tx_hash, raw_transaction) in still_pending:
+            try:
+                self.web3.eth.get_transaction(tx_hash)
+                continue
+            except TransactionNotFound:
+                pass
+            logger.warning(f"Transaction {HexBytes(tx_hash).hex()} (nonce {nonce}) was dropped, re-broadcasting")
+            try:
+                self.web3.eth.send_raw_transaction(raw_transaction)
+                rebroadcast += 1
+            except Exception as e:
+                # 'already known': the read endpoint had not seen it yet, the write endpoint has it
+                if not _error_matches(e, ALREADY_KNOWN_ERRORS):
+                    logger.error(f"Could not re-broadcast nonce {nonce} of {self.address}: {e}")
+        return rebroadcast
+
+_nonce_managers = {}
+_registry_lock = threading.Lock()
+
+def get_nonce_manager(address=None):
+    """Get the process-wide nonce manager for an address (default: the wallet)"""
+    address = address or get_wallet_address()
+    with _registry_lock:
+        if address not in _nonce_managers:
+            _nonce_managers[address] = NonceManager(address)
+        return _nonce_managers[address]
+
+def recover_dropped_transactions():
+    """Run recover() for every wallet with unmined transactions; call from idle tasks"""
+    for nonce_manager in list(_nonce_managers.values()):
+        if not nonce_manager.pending:
+            continue
+        try:
+            nonce_manager.recover()
+        except Exception as e:
+            logger.warning(f"Nonce gap recovery for {nonce_manager.address} failed: {e}")
+
+def _resend(signed_tx):
+    """Send a signed transaction again; its hash, or None if the node still did not confirm having it"""
+    try:
+        return HexBytes(web3.eth.send_raw_transaction(signed_tx.raw_transaction))
+    except Exception as e:
+        if _error_matches(e, ALREADY_KNOWN_ERRORS):
+            return HexBytes(signed_tx.hash)
+        logger.warning(f"Re-send of {HexBytes(signed_tx.hash).hex()} failed: {e}")
+        return None
+
+def send_transaction(tx, key=None, nonce_manager=None, preflight=True):
+    """Simulate a built transaction, then assign a managed nonce, sign and broadcast it.
+
+    The eth_call against the pending block raises simulation.TransactionReverted
+    with the decoded reason for a transaction that would fail, before a
+    nonce is used or gas is spent; pass preflight=False to skip it. It is
+    skipped anyway when build_transaction() has just estimated the gas,
+    since the estimate already ran the call.
+
+    Signs with the signer registered for tx['from'] (the process-wide signer
+    by default) unless a private `key` is given.
+    Returns the transaction hash without waiting for the receipt. The nonce
+    used is written back into `tx`. The receipt tracker watches the
+    transaction from here on and speeds it up if it gets stuck.
+    """
+    nonce_manager = nonce_manager or get_nonce_manager(tx.get('from'))
+    if preflight:
+        simulate(tx)
+
+    for attempt in range(2):
+        tx['nonce'] = nonce_manager.allocate()
+        try:
+            if key is None:
+                sign = get_signer(tx.get('from')).sign_transaction
+            else:
+                sign = lambda unsigned_tx: web3.eth.account.sign_transaction(unsigned_tx, key)
+            signed_tx = sign(tx)
+        except Exception:
+            nonce_manager.release(tx['nonce'])
+            raise
+
+        try:
+            tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception as e:
+            if _error_matches(e, ALREADY_KNOWN_ERRORS):
+                # An earlier attempt of this very send reached the node
+                tx_hash = HexBytes(signed_tx.hash)
+            elif attempt == 0 and _error_matches(e, NONCE_TAKEN_ERRORS):
+                # Someone else used our nonce (another process or a manual tx): resync once
+                logger.warning(f"Nonce {tx['nonce']} already used, resyncing")
+                nonce_manager.sync()
+                continue
+            elif _never_broadcast(e):
+                nonce_manager.release(tx['nonce'])
+                raise
+            else:
+                # The node may hold it: sending the identical transaction again is
+                # safe and tells us. If that fails too the nonce is kept, never
+                # reused for another transaction; recover() re-broadcasts it later.
+                logger.warning(f"Send of nonce {tx['nonce']} failed ambiguously ({e}), re-sending it")
+                tx_hash = _resend(signed_tx)
+                if tx_hash is None:
+                    nonce_manager.mark_sent(tx['nonce'], signed_tx.hash, signed_tx.raw_transaction)
+                    raise
+
+        nonce = tx['nonce']
+        nonce_manager.mark_sent(nonce, tx_hash, signed_tx.raw_transaction)
+        get_receipt_tracker().track(
+            tx_hash, tx, sign,
+            on_replace=lambda new_hash, raw_transaction: nonce_manager.mark_sent(nonce, new_hash, raw_transaction)
+        )
+        return tx_hash
+
+class WalletLane:
+    """Serial transaction worker for one wallet.
+
+    Work submitted to a lane runs in order on its single worker thread and
+    takes nonces from the wallet's NonceManager, so one wallet never races
+    itself while lanes of different wallets send in parallel.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.nonce_manager = get_nonce_manager(address)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"lane-{address[:10]}")
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the lane's worker; returns a Future"""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def send(self, build):
+        """Build a transaction with build() and send it on the worker; returns a Future of the hash"""
+        return self.submit(lambda: send_transaction(build(), nonce_manager=self.nonce_manager))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+_wallet_lanes = {}
+
+def get_wallet_lane(address):
+    """Get the process-wide transaction lane of a wallet"""
+    with _registry_lock:
+        lane = _wallet_lanes.get(address)
+    if lane is None:
+        lane = WalletLane(address)
+        with _registry_lock:
+            lane = _wallet_lanes.setdefault(address, lane)
+    return lane
+
+def _receipt_mined(tx_hash, receipt):
+    get_read_cache().invalidate_for_receipt(receipt)
+    for nonce_manager in list(_nonce_managers.values()):
+        # The receipt's hash differs from tx_hash when a replacement was mined
+        nonce_manager.mark_mined(receipt['transactionHash'])
+        nonce_manager.mark_mined(tx_hash)
+    return receipt
+
+def wait_for_receipt(tx_hash, timeout=RECEIPT_TIMEOUT):
+    """Wait for a single receipt, drop it from the pending set and invalidate cached reads it affects.
+
+    The receipt comes from the shared receipt tracker, so it may be the
+    receipt of a speed-up replacing `tx_hash`.
+    """
+    return _receipt_mined(tx_hash, get_receipt_tracker().wait(tx_hash, timeout))
+
+def wait_for_receipts(tx_hashes, timeout=RECEIPT_TIMEOUT):
+    """Wait for several receipts at once, returned in the same order.
+
+    All of them are resolved by the tracker's one block scan per new block.
+    """
+    tracker = get_receipt_tracker()
+    futures = [tracker.track(tx_hash) for tx_hash in tx_hashes]
+    deadline = time.monotonic() + timeout
+    receipts = []
+    for tx_hash, future in zip(tx_hashes, futures):
+        try:
+            receipt = future.result(max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            raise TimeExhausted(f"Transaction {HexBytes(tx_hash).hex()} is not in the chain after {timeout} seconds")
+        receipts.append(_receipt_mined(tx_hash, receipt))
+    return receipts
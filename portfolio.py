@@ -0,0 +1,529 @@
+# portfolio.py
+# Runs several Slipstream pool/gauge pairs from one process. Pool state for
+# every pool is read in one multicall per block, and rebalance transactions
+# for all pools go out back-to-back through the shared nonce manager.
+import os
+import json
+import time
+import logging
+from decimal import Decimal
+from collections import namedtuple
+from web3 import Web3
+from wallet_setup import get_wallet_address, wallet_addresses
+from nonce_manager import send_transaction, wait_for_receipts, get_wallet_lane, get_nonce_manager
+from fee_engine import build_transaction
+from batch_reader import read_batch
+from multicall import Call, aggregate
+from aerodrome_client import NPM_ADDRESS, POOL_ADDRESS, CL_GAUGE_ADDRESS, SWAP_ROUTER_ADDRESS, get_contract
+from aerodrome_pool_state import get_pool_state, snapshot_pools
+from aerodrome_positions import parse_mint_receipt
+from approval_ledger import get_approval_ledger
+from staked_index import get_staked_index
+from state_store import get_state_store, STATUS_OPEN, STATUS_STAKED, STATUS_BURNED
+from strategy_config import strategy
+import tick_math
+import tick_math_np
+
+logger = logging.getLogger()
+
+# JSON list of pools; without it the portfolio runs the default pool/gauge pair
+POOLS_CONFIG = os.getenv('AERODROME_POOLS_CONFIG', 'pools.json')
+POLL_INTERVAL = 2  # seconds, roughly one Base block
+IDLE_TASK_INTERVAL = 60  # seconds between staked index / approval ledger catch-ups
+# Budgets are swapped to the new range's ratio unless the swap is worth less
+# than this fraction of the pool's budget
+MIN_SWAP_FRACTION = Decimal('0.01')
+# A pool that cannot mint, or cannot exit a position, waits BACKOFF_BASE
+# seconds, doubling per further failure up to BACKOFF_CAP, before it is tried again
+BACKOFF_BASE = 60
+BACKOFF_CAP = 3600
+MAX_UINT128 = 2**128 - 1
+MAX_UINT256 = 2**256 - 1
+
+# One pool/gauge pair and its range strategy. share is the fraction of the
+# wallet's token balances a new position may use (default: split evenly);
+# slippage bounds the swap and mint amounts (default: the strategy's).
+PoolConfig = namedtuple('PoolConfig', [
+    'name', 'pool', 'gauge', 'strategy', 'range_pct', 'sigma_ticks', 'horizon_hours',
+    'reference_yield', 'rebalance_cost', 'share', 'slippage'
+], defaults=('fixed', 2.0, 40.0, 24.0, 0.002, 0.001, None, None))
+
+def load_pool_configs(path=POOLS_CONFIG):
+    """Read pool configs from a JSON list of PoolConfig fields"""
+    if not os.path.exists(path):
+        return [PoolConfig('default', POOL_ADDRESS, CL_GAUGE_ADDRESS, share=1.0)]
+
+    with open(path) as f:
+        entries = json.load(f)
+    configs = []
+    for entry in entries:
+        config = PoolConfig(**entry)
+        configs.append(config._replace(
+            pool=get_contract('pool', config.pool).address,
+            gauge=get_contract('gauge', config.gauge).address,
+            share=config.share if config.share is not None else 1.0 / len(entries)
+        ))
+    return configs
+
+def fixed_range(snapshot, config):
+    """Symmetric +/-range_pct range around the current tick (the bot's +/-2% rule by default)"""
+    return tick_math.symmetric_tick_range(snapshot.tick, snapshot.tick_spacing, config.range_pct)
+
+def scored_range(snapshot, config):
+    """Best scoring candidate range (see tick_math_np.best_range), relative to the fixed range"""
+    lower, upper, _ = tick_math_np.best_range(
+        snapshot.sqrt_price_x96,
+        snapshot.tick,
+        snapshot.tick_spacing,
+        sigma_ticks=config.sigma_ticks,
+        horizon=config.horizon_hours,
+        reference_range=fixed_range(snapshot, config),
+        reference_yield=config.reference_yield,
+        rebalance_cost=config.rebalance_cost
+    )
+    return lower, upper
+
+RANGE_STRATEGIES = {
+    'fixed': fixed_range,
+    'scored': scored_range
+}
+
+class PoolManager:
+    """One pool/gauge pair: its latest snapshot, range strategy and positions"""
+
+    def __init__(self, config, owner):
+        if config.strategy not in RANGE_STRATEGIES:
+            raise ValueError(f"Unknown range strategy {config.strategy!r} for pool {config.name}")
+        self.config = config
+        self.owner = owner
+        self.state = get_pool_state(config.pool)
+        self.gauge = get_contract('gauge', config.gauge)
+        self.staked_index = get_staked_index(owner, config.gauge)
+        self.slippage = Decimal(str(config.slippage if config.slippage is not None else strategy.slippage))
+        self.mint_failures = 0
+        self.mint_retry_at = 0
+        self.exit_failures = 0
+        self.exit_retry_at = 0
+
+    @property
+    def snapshot(self):
+        return self.state.last_snapshot
+
+    def can_mint(self):
+        """False while backing off after a failed mint"""
+        return time.time() >= self.mint_retry_at
+
+    def record_mint_result(self, succeeded, reason=None):
+        """Clear the mint backoff, or log why the mint failed and double the backoff"""
+        if succeeded:
+            self.mint_failures = 0
+            self.mint_retry_at = 0
+            return
+        delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** self.mint_failures)
+        self.mint_failures += 1
+        self.mint_retry_at = time.time() + delay
+        logger.warning(f"{self.config.name}: cannot mint a new position ({reason}); retrying in {delay}s")
+
+    def can_exit(self):
+        """False while backing off after a failed unstake or withdrawal"""
+        return time.time() >= self.exit_retry_at
+
+    def record_exit_result(self, succeeded, reason=None):
+        """Clear the exit backoff, or log why the exit failed and double the backoff"""
+        if succeeded:
+            self.exit_failures = 0
+            self.exit_retry_at = 0
+            return
+        delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** self.exit_failures)
+        self.exit_failures += 1
+        self.exit_retry_at = time.time() + delay
+        logger.warning(f"{self.config.name}: cannot exit out-of-range positions ({reason}); retrying in {delay}s")
+
+    def positions(self):
+        """Live (open or staked) positions of this pool from the state store"""
+        return [
+            position for position in get_state_store().list_positions(pool=self.config.pool, owner=self.owner)
+            if position['status'] in (STATUS_OPEN, STATUS_STAKED)
+        ]
+
+    def out_of_range(self):
+        """Live positions whose range no longer contains the current tick"""
+        tick = self.snapshot.tick
+        return [
+            position for position in self.positions()
+            if position['tick_lower'] is not None
+            and not tick_math.in_range(tick, position['tick_lower'], position['tick_upper'])
+        ]
+
+    def needs_exit(self):
+        """Out-of-range positions to exit, unless backing off from a failed exit"""
+        return self.can_exit() and bool(self.out_of_range())
+
+    def needs_position(self):
+        """No live position and not backing off from a failed mint"""
+        return not self.positions() and self.can_mint()
+
+    def target_range(self):
+        return RANGE_STRATEGIES[self.config.strategy](self.snapshot, self.config)
+
+class Portfolio:
+    """Manages N pool/gauge pairs with shared reads and a single nonce queue.
+
+    refresh() snapshots every pool in one aggregate3. When positions are
+    out of range, rebalance() runs each step (unstake, exit, swap to the
+    new range's ratio, approve, mint, approve NFT, stake) for all affected
+    pools at once: the
+    transactions of a step are sent back-to-back with consecutive nonces
+    and their receipts awaited together, so N pools take as many block
+    confirmations as one.
+    """
+
+    def __init__(self, configs=None, owner=None):
+        self.owner = Web3.to_checksum_address(owner or get_wallet_address())
+        self.managers = [PoolManager(config, self.owner) for config in (configs or load_pool_configs())]
+        self.npm = get_contract('npm')
+        self.swap_router = get_contract('swap_router')
+        self.last_block = None
+        self.last_idle_run = 0
+
+    def refresh(self):
+        """Snapshot every pool at one block; returns the block number"""
+        snapshots = snapshot_pools([manager.state for manager in self.managers])
+        return snapshots[0].block_number if snapshots else None
+
+    def sync_positions(self):
+        """Advance every gauge's staked index and fill in ranges of positions the store lacks"""
+        store = get_state_store()
+        missing = []
+        for manager in self.managers:
+            for token_id in manager.staked_index.update():
+                stored = store.get_position(token_id)
+                if stored is None or stored['tick_lower'] is None:
+                    missing.append((manager, token_id))
+
+        if not missing:
+            return
+        raw_positions = aggregate([Call(self.npm, 'positions', [token_id]) for _, token_id in missing])
+        with store.transaction():
+            for (manager, token_id), position in zip(missing, raw_positions):
+                store.record_position(
+                    token_id, owner=self.owner, pool=manager.config.pool, tick_lower=position[5],
+                    tick_upper=position[6], liquidity=position[7], status=STATUS_STAKED
+                )
+
+    def _build(self, contract_function):
+        return build_transaction(contract_function, {'from': self.owner})
+
+    def _send_all(self, label, items, build):
+        """Send one transaction per item back-to-back, then wait for all receipts.
+
+        Returns [(item, receipt)] for the transactions that succeeded.
+        """
+        sent = []
+        for item in items:
+            try:
+                sent.append((item, send_transaction(build(item))))
+            except Exception as e:
+                logger.error(f"{label} failed to send: {e}")
+
+        succeeded = []
+        for (item, _), receipt in zip(sent, wait_for_receipts([tx_hash for _, tx_hash in sent])):
+            if receipt.status == 1:
+                succeeded.append((item, receipt))
+            else:
+                logger.error(f"{label} reverted in tx {receipt.transactionHash.hex()}")
+        logger.info(f"{label}: {len(succeeded)}/{len(items)} succeeded")
+        return succeeded
+
+    def _exit(self, targets):
+        """Unstake and withdraw (decrease, collect, burn) every target position.
+
+        A pool whose positions did not all exit backs off before its next exit.
+        """
+        from aerodrome_withdraw import build_exit_calls
+
+        staked = [(manager, position) for manager, position in targets
+                  if manager.staked_index.is_staked(position['token_id'])]
+        for (manager, position), receipt in self._send_all(
+            "Unstake", staked,
+            lambda item: self._build(item[0].gauge.functions.withdraw(item[1]['token_id']))
+        ):
+            manager.staked_index.record(position['token_id'], False, receipt.blockNumber)
+
+        unstaked = [(manager, position) for manager, position in targets
+                    if not manager.staked_index.is_staked(position['token_id'])]
+        liquidities = read_batch([
+            Call(self.npm, 'positions', [position['token_id']]) for _, position in unstaked
+        ]) if unstaked else []
+        exits = [(manager, position, raw[7]) for (manager, position), raw in zip(unstaked, liquidities)]
+
+        exited = self._send_all(
+            "Withdraw", exits,
+            lambda item: self._build(self.npm.functions.multicall(build_exit_calls(item[1]['token_id'], item[2])))
+        )
+        store = get_state_store()
+        for (manager, position, _), receipt in exited:
+            store.set_position_status(position['token_id'], STATUS_BURNED, receipt.blockNumber)
+
+        burned = {position['token_id'] for (_, position, _), _ in exited}
+        for manager in {manager for manager, _ in targets}:
+            left = [position['token_id'] for owner, position in targets
+                    if owner is manager and position['token_id'] not in burned]
+            manager.record_exit_result(not left, f"unstake or withdrawal of {left} failed to send or reverted")
+        return [manager for (manager, _, _), _ in exited]
+
+    def _balances(self, tokens):
+        return dict(zip(tokens, read_batch([
+            Call(get_contract('erc20', token), 'balanceOf', [self.owner]) for token in tokens
+        ])))
+
+    def _budgets(self, manager, balances):
+        """`manager`'s share of the token0 and token1 balances"""
+        share = Decimal(str(manager.config.share))
+        return tuple(int(Decimal(balances[token]) * share) for token in (manager.snapshot.token0, manager.snapshot.token1))
+
+    def _swap_params(self, manager, tick_range, balances):
+        """exactInputSingle parameters bringing `manager`'s budget to the token ratio of
+        `tick_range`, or None if the budget is already close to it
+        """
+        snapshot = manager.snapshot
+        budget0, budget1 = self._budgets(manager, balances)
+        sqrt_lower, sqrt_upper = (tick_math.get_sqrt_ratio_at_tick(tick) for tick in tick_range)
+        zero_for_one, amount_in = tick_math.swap_amount_for_ratio(
+            snapshot.sqrt_price_x96, sqrt_lower, sqrt_upper, budget0, budget1
+        )
+        # Compare values in token1
+        value_in = tick_math.quote_at_price(snapshot.sqrt_price_x96, amount_in, True) if zero_for_one else amount_in
+        budget_value = tick_math.quote_at_price(snapshot.sqrt_price_x96, budget0, True) + budget1
+        if amount_in == 0 or value_in <= budget_value * MIN_SWAP_FRACTION:
+            return None
+
+        # The pool fee comes out of the slippage tolerance
+        amount_out = tick_math.quote_at_price(snapshot.sqrt_price_x96, amount_in, zero_for_one)
+        token_in, token_out = (snapshot.token0, snapshot.token1) if zero_for_one else (snapshot.token1, snapshot.token0)
+        return {
+            'tokenIn': token_in,
+            'tokenOut': token_out,
+            'tickSpacing': snapshot.tick_spacing,
+            'recipient': self.owner,
+            'deadline': int(time.time() + 3600),
+            'amountIn': amount_in,
+            'amountOutMinimum': int(Decimal(amount_out) * (1 - manager.slippage)),
+            'sqrtPriceLimitX96': 0
+        }
+
+    def _mint_params(self, manager, tick_range, balances):
+        """Mint parameters for a new position of `manager` in `tick_range` from its share of the balances"""
+        snapshot = manager.snapshot
+        lower, upper = tick_range
+        budget0, budget1 = self._budgets(manager, balances)
+
+        sqrt_lower = tick_math.get_sqrt_ratio_at_tick(lower)
+        sqrt_upper = tick_math.get_sqrt_ratio_at_tick(upper)
+        liquidity = tick_math.get_liquidity_for_amounts(snapshot.sqrt_price_x96, sqrt_lower, sqrt_upper, budget0, budget1)
+        if liquidity == 0:
+            return None
+        amount0, amount1 = tick_math.get_amounts_for_liquidity(snapshot.sqrt_price_x96, sqrt_lower, sqrt_upper, liquidity)
+
+        return {
+            'token0': snapshot.token0,
+            'token1': snapshot.token1,
+            'tickSpacing': snapshot.tick_spacing,
+            'tickLower': lower,
+            'tickUpper': upper,
+            'amount0Desired': amount0,
+            'amount1Desired': amount1,
+            'amount0Min': int(Decimal(amount0) * (1 - manager.slippage)),
+            'amount1Min': int(Decimal(amount1) * (1 - manager.slippage)),
+            'recipient': self.owner,
+            'deadline': int(time.time() + 3600),
+            'sqrtPriceX96': 0
+        }
+
+    def _approve_tokens(self, tokens, spender=NPM_ADDRESS):
+        """Max-approve `spender` for every token the ledger does not show as approved"""
+        ledger = get_approval_ledger()
+        unknown = [token for token in tokens if ledger.allowance(self.owner, token, spender) is None]
+        for token, allowance in zip(unknown, read_batch([
+            Call(get_contract('erc20', token), 'allowance', [self.owner, spender]) for token in unknown
+        ]) if unknown else []):
+            ledger.record_allowance(self.owner, token, spender, allowance)
+
+        # Spending is tracked by the ledger; re-approve well before the allowance runs out
+        needed = [token for token in tokens if ledger.allowance(self.owner, token, spender) < MAX_UINT128]
+        for token, receipt in self._send_all(
+            "Token approval", needed,
+            lambda token: self._build(get_contract('erc20', token).functions.approve(spender, MAX_UINT256))
+        ):
+            ledger.record_allowance(self.owner, token, spender, MAX_UINT256, receipt.blockNumber)
+
+    def _swap_to_ratios(self, managers, ranges, tokens, balances):
+        """Swap each pool's budget to the token ratio of its new range.
+
+        Returns the balances after the swaps; pool snapshots are refreshed
+        since the swaps moved prices.
+        """
+        swaps = []
+        for manager in managers:
+            params = self._swap_params(manager, ranges[manager], balances)
+            if params is not None:
+                swaps.append((manager, params))
+        if not swaps:
+            return balances
+
+        ledger = get_approval_ledger()
+        self._approve_tokens(sorted({params['tokenIn'] for _, params in swaps}), SWAP_ROUTER_ADDRESS)
+        for (_, params), _ in self._send_all(
+            "Swap", swaps, lambda item: self._build(self.swap_router.functions.exactInputSingle(item[1]))
+        ):
+            ledger.record_spend(self.owner, params['tokenIn'], SWAP_ROUTER_ADDRESS, params['amountIn'])
+        self.refresh()
+        return self._balances(tokens)
+
+    def _enter(self, managers):
+        """Swap to each new range's ratio, then mint and stake a new position in each pool"""
+        tokens = sorted({token for manager in managers for token in (manager.snapshot.token0, manager.snapshot.token1)})
+        ranges = {manager: manager.target_range() for manager in managers}
+        balances = self._swap_to_ratios(managers, ranges, tokens, self._balances(tokens))
+
+        mints = []
+        for manager in managers:
+            params = self._mint_params(manager, ranges[manager], balances)
+            if params is None:
+                manager.record_mint_result(False, f"balances too small for range {list(ranges[manager])}")
+            else:
+                mints.append((manager, params))
+        if not mints:
+            return []
+
+        self._approve_tokens(tokens)
+        ledger = get_approval_ledger()
+        store = get_state_store()
+        minted = []
+        for (manager, params), receipt in self._send_all(
+            "Mint", mints, lambda item: self._build(self.npm.functions.mint(item[1]))
+        ):
+            result = parse_mint_receipt(receipt, self.npm, self.owner)
+            if result is None:
+                continue
+            manager.record_mint_result(True)
+            ledger.record_spend(self.owner, params['token0'], NPM_ADDRESS, result['amount0'])
+            ledger.record_spend(self.owner, params['token1'], NPM_ADDRESS, result['amount1'])
+            ledger.record_nft_approval(NPM_ADDRESS, result['token_id'], None, result['block_number'])
+            store.record_position(
+                result['token_id'], owner=self.owner, pool=manager.config.pool, tick_lower=params['tickLower'],
+                tick_upper=params['tickUpper'], liquidity=result['liquidity'], status=STATUS_OPEN,
+                block_number=result['block_number']
+            )
+            logger.info(f"{manager.config.name}: minted position {result['token_id']} "
+                        f"[{params['tickLower']}, {params['tickUpper']}]")
+            minted.append((manager, result['token_id']))
+        minted_managers = {manager for manager, _ in minted}
+        for manager, _ in mints:
+            if manager not in minted_managers:
+                manager.record_mint_result(False, "mint failed to send or reverted")
+
+        for (manager, token_id), receipt in self._send_all(
+            "NFT approval", minted,
+            lambda item: self._build(self.npm.functions.approve(item[0].config.gauge, item[1]))
+        ):
+            ledger.record_nft_approval(NPM_ADDRESS, token_id, manager.config.gauge, receipt.blockNumber)
+
+        staked = self._send_all(
+            "Stake", minted, lambda item: self._build(item[0].gauge.functions.deposit(item[1]))
+        )
+        for (manager, token_id), receipt in staked:
+            manager.staked_index.record(token_id, True, receipt.blockNumber)
+            ledger.record_nft_approval(NPM_ADDRESS, token_id, None, receipt.blockNumber)
+        return [token_id for (_, token_id), _ in staked]
+
+    def rebalance(self):
+        """Exit out-of-range positions in every pool and re-enter pools left without a position"""
+        targets = [(manager, position) for manager in self.managers if manager.can_exit()
+                   for position in manager.out_of_range()]
+        if targets:
+            names = ', '.join(f"{manager.config.name}#{position['token_id']}" for manager, position in targets)
+            logger.info(f"Rebalancing {len(targets)} position(s): {names}")
+            self._exit(targets)
+
+        empty = [manager for manager in self.managers if manager.needs_position()]
+        if empty:
+            return self._enter(empty)
+        return []
+
+    def run_idle_tasks(self):
+        self.sync_positions()
+        tokens = {token for manager in self.managers for token in (manager.snapshot.token0, manager.snapshot.token1)}
+        get_approval_ledger().reconcile([self.owner], sorted(tokens) + [NPM_ADDRESS])
+        # Re-broadcast dropped transactions so a lost nonce does not block the wallet
+        nonce_manager = get_nonce_manager(self.owner)
+        if nonce_manager.pending:
+            nonce_manager.recover()
+        self.last_idle_run = time.time()
+
+    def step(self, block):
+        """Rebalance or do idle work for a new block; pool snapshots must already be at `block`"""
+        self.last_block = block
+        get_state_store().set_last_seen_block(block)
+
+        if any(manager.needs_exit() or manager.needs_position() for manager in self.managers):
+            self.rebalance()
+        elif time.time() - self.last_idle_run > IDLE_TASK_INTERVAL:
+            self.run_idle_tasks()
+
+    def run_once(self):
+        """Process the latest block once; returns False if there was no new block"""
+        block = self.refresh()
+        if block == self.last_block:
+            return False
+        self.step(block)
+        return True
+
+    def run(self):
+        """Poll once per block until interrupted"""
+        logger.info(f"Portfolio managing {len(self.managers)} pool(s): "
+                    f"{', '.join(manager.config.name for manager in self.managers)}")
+        self.refresh()
+        self.run_idle_tasks()
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error in portfolio loop: {e}")
+            time.sleep(POLL_INTERVAL)
+
+def run_wallets(owners=None, configs=None):
+    """Run one Portfolio per wallet until interrupted.
+
+    Pool snapshots are read once per block for all wallets. Each wallet's
+    step() runs on its own WalletLane, so wallets rebalance in parallel; a
+    wallet still busy with the previous block skips the new one.
+    """
+    configs = configs or load_pool_configs()
+    portfolios = [Portfolio(configs, owner) for owner in (owners or wallet_addresses())]
+    lanes = [get_wallet_lane(portfolio.owner) for portfolio in portfolios]
+    pool_states = [manager.state for manager in portfolios[0].managers]
+    logger.info(f"Running {len(configs)} pool(s) for {len(portfolios)} wallet(s): "
+                f"{', '.join(portfolio.owner for portfolio in portfolios)}")
+
+    snapshot_pools(pool_states)
+    for portfolio, lane in zip(portfolios, lanes):
+        lane.submit(portfolio.run_idle_tasks)
+
+    busy = {}
+    last_block = None
+    while True:
+        try:
+            block = snapshot_pools(pool_states)[0].block_number
+            if block != last_block:
+                last_block = block
+                for portfolio, lane in zip(portfolios, lanes):
+                    future = busy.get(portfolio.owner)
+                    if future is not None and not future.done():
+                        continue
+                    if future is not None and future.exception() is not None:
+                        logger.error(f"Error in portfolio of {portfolio.owner}: {future.exception()}")
+                    busy[portfolio.owner] = lane.submit(portfolio.step, block)
+        except Exception as e:
+            logger.error(f"Error in portfolio loop: {e}")
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,161 @@
+# read_cache.py
+import time
+import logging
+import threading
+from collections import OrderedDict
+from eth_utils import function_abi_to_4byte_selector
+
+logger = logging.getLogger()
+
+MAX_ENTRIES = 4096
+LATEST_TTL = 2  # seconds a 'latest' read stays valid, about one Base block
+BLOCK_HASH_HISTORY = 256  # blocks remembered for reorg detection
+
+class ReadCache:
+    """LRU cache of contract reads keyed by (contract, calldata, block).
+
+    Reads pinned to a block number never change unless that block is
+    reorged out, so they stay cached until evicted or until observe_block()
+    sees a different hash for their block. Reads at 'latest' (block None in
+    the key) expire after latest_ttl seconds or as soon as a newer block is
+    observed. Writes invalidate what they touched through invalidate() or
+    invalidate_for_receipt().
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, latest_ttl=LATEST_TTL):
+        self.max_entries = max_entries
+        self.latest_ttl = latest_ttl
+        self._entries = OrderedDict()  # key -> (value, stored_at, head_block)
+        self._block_hashes = OrderedDict()  # block number -> hash
+        self._lock = threading.Lock()
+        self.head = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(call, block_identifier='latest'):
+        block = block_identifier if isinstance(block_identifier, int) else None
+        return (call.contract.address, call.calldata(), block)
+
+    def _is_valid(self, key, entry):
+        if key[2] is not None:
+            return True
+        _, stored_at, head = entry
+        return time.time() - stored_at < self.latest_ttl and (self.head is None or head == self.head)
+
+    def get(self, key):
+        """Return (True, value) on a hit, (False, None) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_valid(key, entry):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[0]
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time(), self.head)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(self, calls, block_identifier='latest'):
+        """Split multicall.Call reads into cached results and misses.
+
+        Returns (results, missing) where results has None at every index
+        listed in missing; fill those in with store().
+        """
+        results = [None] * len(calls)
+        missing = []
+        for i, call in enumerate(calls):
+            hit, value = self.get(self.key(call, block_identifier))
+            if hit:
+                results[i] = value
+            else:
+                missing.append(i)
+        return results, missing
+
+    def store(self, calls, results, indexes, block_identifier='latest'):
+        """Cache the results of the calls at `indexes`; failed (None) reads are not stored"""
+        for i in indexes:
+            if results[i] is not None:
+                self.put(self.key(calls[i], block_identifier), results[i])
+
+    def _invalidate(self, address=None, selector=None, min_block=None):
+        removed = 0
+        for key in list(self._entries):
+            entry_address, calldata, block = key
+            if address is not None and entry_address.lower() != address.lower():
+                continue
+            if selector is not None and not calldata.startswith(selector):
+                continue
+            if min_block is not None and block is not None and block < min_block:
+                continue
+            del self._entries[key]
+            removed += 1
+        self.invalidations += removed
+        return removed
+
+    def invalidate(self, address=None, selector=None, min_block=None):
+        """Drop matching entries; with no arguments the whole cache is cleared.
+
+        min_block keeps reads pinned to earlier blocks (used for reorgs).
+        """
+        with self._lock:
+            return self._invalidate(address, selector, min_block)
+
+    def invalidate_function(self, contract, fn_name):
+        """Drop every cached read of one contract function, whatever its arguments"""
+        fn_abi = contract.get_function_by_name(fn_name).abi
+        selector = '0x' + function_abi_to_4byte_selector(fn_abi).hex()
+        return self.invalidate(contract.address, selector)
+
+    def invalidate_for_receipt(self, receipt):
+        """Drop reads of the called contract and of every contract that emitted a log"""
+        addresses = {log['address'] for log in receipt.get('logs', [])}
+        if receipt.get('to'):
+            addresses.add(receipt['to'])
+        return sum(self.invalidate(address) for address in addresses)
+
+    def observe_block(self, block_number, block_hash):
+        """Track the chain head; a changed hash for a known block invalidates from that block on"""
+        block_hash = bytes(block_hash) if not isinstance(block_hash, str) else bytes.fromhex(block_hash[2:])
+        with self._lock:
+            known_hash = self._block_hashes.get(block_number)
+            if known_hash is not None and known_hash != block_hash:
+                removed = self._invalidate(min_block=block_number)
+                logger.warning(f"Reorg detected at block {block_number}, dropped {removed} cached reads")
+            self._block_hashes[block_number] = block_hash
+            while len(self._block_hashes) > BLOCK_HASH_HISTORY:
+                self._block_hashes.popitem(last=False)
+            if self.head is None or block_number > self.head:
+                self.head = block_number
+
+    def observe_reorg(self, block_number):
+        """Invalidate from a block known to be reorged out (e.g. a removed log)"""
+        with self._lock:
+            self._block_hashes.pop(block_number, None)
+            removed = self._invalidate(min_block=block_number)
+        logger.warning(f"Reorg reported at block {block_number}, dropped {removed} cached reads")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries),
+            'invalidations': self.invalidations,
+            'head': self.head
+        }
+
+_read_cache = ReadCache()
+
+def get_read_cache():
+    """Get the process-wide read cache"""
+    return _read_cache
@@ -0,0 +1,298 @@
+# receipt_tracker.py
+# One watcher for every pending transaction: each new block is fetched once
+# with eth_getBlockReceipts and resolves all the hashes mined in it.
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from hexbytes import HexBytes
+from web3.exceptions import TransactionNotFound, BlockNotFound, MethodUnavailable, TimeExhausted
+from wallet_setup import web3
+
+logger = logging.getLogger()
+
+POLL_INTERVAL = 1  # seconds between head checks while transactions are pending
+MAX_CATCH_UP_BLOCKS = 20  # further behind, pending hashes are looked up directly instead
+# A transaction still pending this many blocks after it was sent is re-sent
+# with the same nonce and higher fees
+STUCK_BLOCKS = int(os.getenv('AERODROME_STUCK_BLOCKS', '10'))
+FEE_BUMP = 1.125  # nodes require at least +10% on both fee fields to accept a replacement
+MAX_REPLACEMENTS = 3
+
+class PendingTransaction:
+    """A sent transaction and every replacement of it; whichever is mined resolves `future`"""
+
+    def __init__(self, tx_hash, tx=None, sign=None, on_replace=None):
+        self.hashes = [tx_hash]
+        self.tx = dict(tx) if tx is not None else None
+        self.sign = sign
+        self.on_replace = on_replace
+        self.first_block = None
+        self.sent_block = None
+        self.checked = False
+        self.replacements = 0
+        self.waiters = 0  # callers blocked in wait()/wait_async()
+        self.future = Future()
+
+class ReceiptTracker:
+    """Resolves receipts of all pending transactions from one poller thread.
+
+    Each new block costs one eth_getBlockReceipts however many
+    transactions are pending (nodes without it fall back to
+    eth_getBlockByNumber plus one receipt per matching hash). Hashes are
+    looked up directly once when first tracked, so transactions mined
+    before tracking started still resolve. A transaction tracked with its
+    built tx and a sign function is replaced with bumped fees when it is
+    still pending STUCK_BLOCKS after being sent. Transactions that outlive
+    their last replacement, or whose last waiter timed out in wait(), are
+    dropped and their futures fail with TimeExhausted; a timeout while
+    other callers still wait only ends that caller's wait.
+    """
+
+    def __init__(self, web3_instance=None, stuck_blocks=STUCK_BLOCKS, poll_interval=POLL_INTERVAL,
+                 abandon_blocks=None):
+        self.web3 = web3_instance or web3
+        self.stuck_blocks = stuck_blocks
+        # By default a transaction is dropped stuck_blocks after its last
+        # possible replacement, replaceable or not
+        self.abandon_blocks = abandon_blocks or stuck_blocks * (MAX_REPLACEMENTS + 1)
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}  # tx hash -> PendingTransaction (replacements share the entry)
+        self._thread = None
+        self.last_block = None
+        self.block_receipts_supported = True
+
+    def track(self, tx_hash, tx=None, sign=None, on_replace=None):
+        """Watch a sent transaction; returns a Future of its receipt.
+
+        Pass the built `tx` and a `sign(tx)` function to allow speed-ups;
+        on_replace(new_hash, raw_transaction) is called after each one.
+        """
+        return self._track(tx_hash, tx, sign, on_replace).future
+
+    def _track(self, tx_hash, tx=None, sign=None, on_replace=None, waiting=False):
+        tx_hash = HexBytes(tx_hash)
+        with self._lock:
+            entry = self._pending.get(tx_hash)
+            if entry is None:
+                entry = PendingTransaction(tx_hash, tx, sign, on_replace)
+                self._pending[tx_hash] = entry
+            if waiting:
+                entry.waiters += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='receipt-tracker', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return entry
+
+    def wait(self, tx_hash, timeout):
+        """Block until the transaction (or a replacement of it) is mined.
+
+        Raises TimeExhausted after `timeout` seconds; the transaction stops
+        being tracked unless other callers are still waiting for it.
+        """
+        entry = self._track(tx_hash, waiting=True)
+        error = None
+        try:
+            return entry.future.result(timeout)
+        except FutureTimeoutError:
+            error = self._timeout_error(tx_hash, timeout)
+            raise error
+        finally:
+            self._stop_waiting(entry, error)
+
+    async def wait_async(self, tx_hash, timeout):
+        """Awaitable version of wait() for the asyncio monitor"""
+        entry = self._track(tx_hash, waiting=True)
+        error = None
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(entry.future)), timeout)
+        except asyncio.TimeoutError:
+            error = self._timeout_error(tx_hash, timeout)
+            raise error
+        finally:
+            self._stop_waiting(entry, error)
+
+    @staticmethod
+    def _timeout_error(tx_hash, timeout):
+        return TimeExhausted(f"Transaction {HexBytes(tx_hash).hex()} is not in the chain after {timeout} seconds")
+
+    def _stop_waiting(self, entry, error=None):
+        """End one caller's wait; after a timeout (`error`) the last waiter drops the transaction"""
+        with self._lock:
+            entry.waiters -= 1
+            abandoned = error is not None and entry.waiters == 0
+        if abandoned:
+            self._evict(entry, error)
+
+    def pending_count(self):
+        with self._lock:
+            return len({id(entry) for entry in self._pending.values()})
+
+    def _run(self):
+        while True:
+            if not self._pending:
+                self._wake.wait()
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"Receipt tracker poll failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def _resolve(self, entry, receipt):
+        with self._lock:
+            for tx_hash in entry.hashes:
+                self._pending.pop(tx_hash, None)
+        if not entry.future.done():
+            entry.future.set_result(receipt)
+
+    def _evict(self, entry, error):
+        """Stop tracking an entry and fail its future with `error`"""
+        with self._lock:
+            for tx_hash in entry.hashes:
+                self._pending.pop(tx_hash, None)
+        if not entry.future.done():
+            entry.future.set_exception(error)
+
+    def _entries(self):
+        with self._lock:
+            return list({id(entry): entry for entry in self._pending.values()}.values())
+
+    def _lookup(self, entry):
+        """Direct receipt lookup of every hash of one entry"""
+        for tx_hash in list(entry.hashes):
+            try:
+                receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+            if receipt is not None:
+                self._resolve(entry, receipt)
+                return True
+        return False
+
+    def _block_receipts(self, block_number):
+        """Receipts of one block that belong to tracked transactions; None if the block is not available yet"""
+        if self.block_receipts_supported:
+            try:
+                receipts = self.web3.eth.get_block_receipts(block_number)
+                if receipts is None:
+                    return None
+                return [receipt for receipt in receipts if receipt['transactionHash'] in self._pending]
+            except BlockNotFound:
+                return None
+            except (MethodUnavailable, ValueError) as e:
+                logger.info(f"eth_getBlockReceipts unavailable ({e}), reading blocks and receipts instead")
+                self.block_receipts_supported = False
+
+        try:
+            block = self.web3.eth.get_block(block_number)
+        except BlockNotFound:
+            return None
+        return [
+            self.web3.eth.get_transaction_receipt(tx_hash)
+            for tx_hash in block['transactions'] if tx_hash in self._pending
+        ]
+
+    def poll(self):
+        """Resolve everything mined since the last poll and speed up stuck transactions"""
+        head = self.web3.eth.block_number
+
+        for entry in self._entries():
+            if entry.sent_block is None:
+                entry.first_block = entry.sent_block = head
+            if not entry.checked:
+                entry.checked = True
+                self._lookup(entry)
+
+        if self.last_block is None or head - self.last_block > MAX_CATCH_UP_BLOCKS:
+            # Too far behind to read block by block: look every hash up directly
+            for entry in self._entries():
+                self._lookup(entry)
+            self.last_block = head
+        else:
+            for block_number in range(self.last_block + 1, head + 1):
+                receipts = self._block_receipts(block_number)
+                if receipts is None:
+                    break  # this endpoint has not seen the block yet; retry next poll
+                for receipt in receipts:
+                    entry = self._pending.get(receipt['transactionHash'])
+                    if entry is not None:
+                        self._resolve(entry, receipt)
+                self.last_block = block_number
+
+        for entry in self._entries():
+            if head - entry.sent_block < self.stuck_blocks:
+                continue
+            if self._replaceable(entry):
+                self._speed_up(entry, head)
+            elif head - entry.first_block >= self.abandon_blocks:
+                logger.warning(f"Transaction {entry.hashes[-1].hex()} still pending after "
+                               f"{head - entry.first_block} blocks and {entry.replacements} replacement(s), "
+                               f"no longer tracking it")
+                self._evict(entry, TimeExhausted(
+                    f"Transaction {entry.hashes[-1].hex()} is not in the chain after {head - entry.first_block} blocks"
+                ))
+
+    def _replaceable(self, entry):
+        return entry.tx is not None and entry.sign is not None and entry.replacements < MAX_REPLACEMENTS
+
+    def _bump_fees(self, tx):
+        """Copy of tx with fees raised enough to replace it, or None if it has no fee fields"""
+        from fee_engine import get_fee_engine
+
+        fees = get_fee_engine().fees(force=True)
+        tx = dict(tx)
+        if 'maxFeePerGas' in tx and 'maxPriorityFeePerGas' in tx:
+            tx['maxPriorityFeePerGas'] = max(int(tx['maxPriorityFeePerGas'] * FEE_BUMP), fees['maxPriorityFeePerGas'])
+            tx['maxFeePerGas'] = max(int(tx['maxFeePerGas'] * FEE_BUMP), fees['maxFeePerGas'], tx['maxPriorityFeePerGas'])
+        elif 'gasPrice' in tx:
+            # Legacy transaction: the gas price is paid in full, so only bump it
+            tx['gasPrice'] = int(tx['gasPrice'] * FEE_BUMP)
+        else:
+            return None
+        return tx
+
+    def _speed_up(self, entry, head):
+        """Re-send a stuck transaction with the same nonce and bumped fees"""
+        tx = self._bump_fees(entry.tx)
+        if tx is None:
+            logger.warning(f"Transaction {entry.hashes[-1].hex()} is stuck but has no fee fields to bump, not replacing it")
+            entry.sign = None
+            return
+
+        signed_tx = entry.sign(tx)
+        try:
+            new_hash = HexBytes(self.web3.eth.send_raw_transaction(signed_tx.raw_transaction))
+        except Exception as e:
+            # Usually 'nonce too low': the original was mined and shows up in the next block
+            logger.warning(f"Could not replace stuck transaction {entry.hashes[-1].hex()}: {e}")
+            entry.sent_block = head
+            return
+
+        with self._lock:
+            entry.hashes.append(new_hash)
+            self._pending[new_hash] = entry
+        entry.tx = tx
+        entry.sent_block = head
+        entry.replacements += 1
+        fee = tx.get('maxFeePerGas', tx.get('gasPrice'))
+        logger.warning(f"Transaction {entry.hashes[-2].hex()} stuck for {self.stuck_blocks} blocks, "
+                       f"replaced by {new_hash.hex()} (max fee {fee / 1e9:.6f} Gwei)")
+        if entry.on_replace is not None:
+            entry.on_replace(new_hash, signed_tx.raw_transaction)
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_receipt_tracker():
+    """Get the process-wide receipt tracker"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = ReceiptTracker()
+        return _tracker
@@ -0,0 +1,286 @@
+# rpc_provider.py
+# web3 provider over several JSON-RPC endpoints with pooled keep-alive
+# sessions, jittered exponential backoff and rate limit handling.
+import json
+import time
+import random
+import logging
+import threading
+import requests
+from collections import Counter
+from requests.adapters import HTTPAdapter
+from web3.providers.base import JSONBaseProvider
+
+logger = logging.getLogger()
+
+POOL_SIZE = 16  # keep-alive connections per endpoint
+REQUEST_TIMEOUT = 10  # seconds
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.25  # seconds
+BACKOFF_CAP = 8  # seconds
+RATE_LIMIT_COOLDOWN = 5  # seconds an endpoint is skipped after a 429 without Retry-After
+MAX_RETRY_AFTER = 30  # longest Retry-After honoured, in seconds
+ERROR_COOLDOWN = 15  # seconds an endpoint is skipped after a connection error or 5xx
+LATENCY_SMOOTHING = 0.2  # weight of the newest sample in the latency average
+LATENCY_MARGIN = 1.5  # reads rotate over endpoints up to this many times the fastest latency
+LAGGING_COOLDOWN = 2  # seconds an endpoint is skipped after it did not know a block (one Base block)
+
+# Requests that must always reach the same node: transaction submission and
+# filters (which only exist on the node that created them)
+PINNED_METHODS = {
+    'eth_sendRawTransaction',
+    'eth_sendTransaction',
+    'eth_newFilter',
+    'eth_newBlockFilter',
+    'eth_newPendingTransactionFilter',
+    'eth_getFilterChanges',
+    'eth_getFilterLogs',
+    'eth_uninstallFilter'
+}
+
+def is_pinned(method, params):
+    """Whether a request must go to the write endpoint"""
+    if method in PINNED_METHODS:
+        return True
+    # The pending nonce depends on the mempool of the node we send to
+    return method == 'eth_getTransactionCount' and bool(params) and params[-1] == 'pending'
+
+# Requests that must not be repeated once they may have reached the node: a
+# timed out or 5xx send may still have put the transaction in the mempool
+NON_IDEMPOTENT_METHODS = {'eth_sendRawTransaction', 'eth_sendTransaction'}
+
+# JSON-RPC error codes providers use for rate limiting on an HTTP 200
+RATE_LIMIT_ERROR_CODES = {429, -32005}
+
+# Error messages of a node that has not seen a block yet: a read pinned to a
+# block number reported by another, further ahead endpoint
+UNKNOWN_BLOCK_ERRORS = ('header not found', 'unknown block', 'block not found')
+
+class RateLimitedError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class UnknownBlockError(Exception):
+    """The endpoint is behind the block a request asked for"""
+
+def never_delivered(error):
+    """Whether a failed request certainly never reached the node.
+
+    True for rate limit rejections and for connections that were never
+    established. Timeouts, 5xx responses and dropped connections are
+    ambiguous: the node may have processed the request before the failure.
+    """
+    if isinstance(error, (RateLimitedError, requests.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        cause = error.args[0] if error.args else None
+        return 'NewConnectionError' in repr(cause)
+    return False
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def _errors(response):
+    responses = response if isinstance(response, list) else [response]
+    for item in responses:
+        error = item.get('error') if isinstance(item, dict) else None
+        if error:
+            yield error
+
+def _is_rate_limit_error(response):
+    return any(error.get('code') in RATE_LIMIT_ERROR_CODES
+               or 'rate limit' in str(error.get('message', '')).lower()
+               for error in _errors(response))
+
+def _is_unknown_block_error(response):
+    return any(pattern in str(error.get('message', '')).lower()
+               for error in _errors(response) for pattern in UNKNOWN_BLOCK_ERRORS)
+
+class Endpoint:
+    """One JSON-RPC URL with its own pooled session and health statistics"""
+
+    def __init__(self, url, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+        self.latency = None  # smoothed seconds per request
+        self.cooldown_until = 0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now=None):
+        return (now or time.monotonic()) >= self.cooldown_until
+
+    def cool_down(self, seconds):
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    def _record_latency(self, elapsed):
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency = (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * elapsed
+
+    def post(self, request_data):
+        """POST a JSON-RPC payload and return the decoded response"""
+        self.requests += 1
+        started = time.monotonic()
+        try:
+            response = self.session.post(self.url, data=request_data, timeout=self.timeout)
+            if response.status_code == 429:
+                raise RateLimitedError(f"{self.url} rate limited (HTTP 429)", _retry_after(response))
+            response.raise_for_status()
+            decoded = json.loads(response.content)
+        except Exception:
+            self.failures += 1
+            raise
+        self._record_latency(time.monotonic() - started)
+
+        if _is_rate_limit_error(decoded):
+            self.failures += 1
+            raise RateLimitedError(f"{self.url} rate limited (JSON-RPC error)")
+        if _is_unknown_block_error(decoded):
+            self.failures += 1
+            raise UnknownBlockError(f"{self.url} does not have the requested block yet")
+        return decoded
+
+    def __repr__(self):
+        latency = f"{self.latency * 1000:.0f}ms" if self.latency is not None else "n/a"
+        return f"Endpoint({self.url}, latency={latency}, failures={self.failures}/{self.requests})"
+
+class PooledRPCProvider(JSONBaseProvider):
+    """Spreads reads over several endpoints and pins writes to one.
+
+    Reads rotate over the available endpoints whose smoothed latency is
+    within LATENCY_MARGIN of the fastest (untried endpoints first, so every
+    endpoint gets measured). A rate limited or failing endpoint is put on
+    cooldown and the request moves to the next one, as does a read of a
+    block the endpoint does not have yet (a lagging node answering a read
+    pinned to a block another endpoint reported); only when no healthy
+    endpoint is left does the provider sleep, using jittered exponential
+    backoff or the server's Retry-After.
+    PINNED_METHODS always use the write endpoint and retry only on it.
+    NON_IDEMPOTENT_METHODS are retried only when the failed attempt never
+    reached the node; any other failure is raised to the caller.
+    Other JSON-RPC errors (e.g. reverts) are returned
+    to web3 unchanged.
+    """
+
+    def __init__(self, endpoint_urls, write_endpoint_url=None, pool_size=POOL_SIZE,
+                 timeout=REQUEST_TIMEOUT, max_attempts=MAX_ATTEMPTS, **kwargs):
+        super().__init__(**kwargs)
+        if isinstance(endpoint_urls, str):
+            endpoint_urls = [endpoint_urls]
+        if not endpoint_urls:
+            raise ValueError("At least one RPC endpoint is required")
+
+        self.endpoints = [Endpoint(url, pool_size, timeout) for url in endpoint_urls]
+        write_endpoint_url = write_endpoint_url or endpoint_urls[0]
+        self.write_endpoint = next(
+            (endpoint for endpoint in self.endpoints if endpoint.url == write_endpoint_url),
+            None
+        ) or Endpoint(write_endpoint_url, pool_size, timeout)
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._reads = 0  # rotates reads over the endpoints within the latency margin
+        self.round_trips = 0  # HTTP requests sent, a batch counts once
+        self.method_counts = Counter()  # JSON-RPC calls by method, batched ones included
+
+    def __str__(self):
+        return f"Pooled RPC connection to {len(self.endpoints)} endpoint(s)"
+
+    def _pick_read_endpoint(self):
+        """Next healthy endpoint near the fastest, or the one leaving cooldown first if none is healthy"""
+        with self._lock:
+            now = time.monotonic()
+            available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+            if not available:
+                return min(self.endpoints, key=lambda endpoint: endpoint.cooldown_until)
+            # Unmeasured endpoints go first so each one gets a latency sample
+            unmeasured = [endpoint for endpoint in available if endpoint.latency is None]
+            if unmeasured:
+                return unmeasured[0]
+            fastest = min(endpoint.latency for endpoint in available)
+            candidates = [endpoint for endpoint in available if endpoint.latency <= fastest * LATENCY_MARGIN]
+            self._reads += 1
+            return candidates[self._reads % len(candidates)]
+
+    def _send(self, request_data, pinned, idempotent=True):
+        last_error = None
+        retry_after = None
+        for attempt in range(self.max_attempts):
+            endpoint = self.write_endpoint if pinned else self._pick_read_endpoint()
+            if attempt > 0 and not endpoint.available():
+                # Nothing healthy to fail over to: back off before retrying
+                time.sleep(min(retry_after, MAX_RETRY_AFTER) if retry_after is not None else backoff_delay(attempt))
+
+            try:
+                return endpoint.post(request_data)
+            except RateLimitedError as e:
+                last_error, retry_after = e, e.retry_after
+                endpoint.cool_down(e.retry_after or RATE_LIMIT_COOLDOWN)
+                logger.warning(f"{e}; attempt {attempt + 1}/{self.max_attempts}")
+            except UnknownBlockError as e:
+                last_error, retry_after = e, None
+                endpoint.cool_down(LAGGING_COOLDOWN)
+                logger.warning(f"{e}; attempt {attempt + 1}/{self.max_attempts}")
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError, ValueError) as e:
+                last_error, retry_after = e, None
+                endpoint.cool_down(ERROR_COOLDOWN)
+                if not idempotent and not never_delivered(e):
+                    logger.warning(f"RPC request to {endpoint.url} failed after it may have been delivered: {e}")
+                    raise
+                logger.warning(f"RPC request to {endpoint.url} failed: {e}; attempt {attempt + 1}/{self.max_attempts}")
+
+        raise last_error
+
+    def _count(self, methods):
+        with self._lock:
+            self.round_trips += 1
+            self.method_counts.update(methods)
+
+    def stats(self):
+        """Copy of the traffic counters: {'round_trips': n, 'calls': n, 'methods': {method: n}}"""
+        with self._lock:
+            return {
+                'round_trips': self.round_trips,
+                'calls': sum(self.method_counts.values()),
+                'methods': dict(self.method_counts)
+            }
+
+    def make_request(self, method, params):
+        self._count([method])
+        request_data = self.encode_rpc_request(method, params)
+        return self._send(request_data, pinned=is_pinned(method, params),
+                          idempotent=method not in NON_IDEMPOTENT_METHODS)
+
+    def make_batch_request(self, batch_requests):
+        self._count([method for method, _ in batch_requests])
+        request_data = self.encode_batch_rpc_request(batch_requests)
+        pinned = any(is_pinned(method, params) for method, params in batch_requests)
+        idempotent = not any(method in NON_IDEMPOTENT_METHODS for method, _ in batch_requests)
+        response = self._send(request_data, pinned=pinned, idempotent=idempotent)
+        if not isinstance(response, list):
+            # RPC errors return only one response with the error object
+            return response
+        return sorted(response, key=lambda item: item.get('id', 0))
+
+    def is_connected(self, show_traceback=False):
+        try:
+            response = self.make_request('web3_clientVersion', [])
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+        return 'result' in response
@@ -0,0 +1,98 @@
+# simulation.py
+# Pre-flight eth_call of built transactions, so calls that would revert are
+# caught with their revert reason before anything is signed or broadcast.
+import time
+import logging
+import threading
+from hexbytes import HexBytes
+from eth_abi import decode
+from eth_abi.exceptions import DecodingError
+from web3.exceptions import ContractLogicError
+from wallet_setup import web3
+
+logger = logging.getLogger()
+
+ERROR_SELECTOR = bytes.fromhex('08c379a0')  # Error(string)
+PANIC_SELECTOR = bytes.fromhex('4e487b71')  # Panic(uint256)
+# A successful eth_estimateGas already executed the call, so simulate() skips
+# a transaction whose estimate succeeded this recently instead of repeating it
+ESTIMATE_TTL = 2  # seconds, about one Base block
+PANIC_CODES = {
+    0x01: 'assertion failed',
+    0x11: 'arithmetic overflow or underflow',
+    0x12: 'division by zero',
+    0x21: 'invalid enum value',
+    0x22: 'invalid storage byte array',
+    0x31: 'pop on an empty array',
+    0x32: 'array index out of bounds',
+    0x41: 'out of memory',
+    0x51: 'call to an uninitialized function'
+}
+
+class TransactionReverted(Exception):
+    """A transaction failed simulation; `reason` is the decoded revert reason"""
+
+    def __init__(self, reason, tx=None):
+        super().__init__(f"execution reverted: {reason}")
+        self.reason = reason
+        self.tx = tx
+
+def decode_revert_data(data):
+    """Readable reason from raw revert data (Error(string), Panic(uint256) or a custom error)"""
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:] if data.startswith('0x') else data)
+    if not data:
+        return "reverted without a reason"
+    if data[:4] == ERROR_SELECTOR:
+        return decode(['string'], data[4:])[0]
+    if data[:4] == PANIC_SELECTOR:
+        code = decode(['uint256'], data[4:])[0]
+        return f"panic: {PANIC_CODES.get(code, hex(code))}"
+    return f"custom error 0x{data[:4].hex()}"
+
+def revert_reason(error):
+    """Revert reason of a web3 ContractLogicError, preferring the raw revert data"""
+    data = error.data.get('data') if isinstance(error.data, dict) else error.data
+    if isinstance(data, (str, bytes)):
+        try:
+            return decode_revert_data(data)
+        except (ValueError, DecodingError):
+            pass
+    message = error.message or str(error)
+    return message.split('execution reverted:', 1)[-1].strip() if 'execution reverted:' in message else message
+
+_estimated = {}  # call fingerprint -> time its gas estimate succeeded
+_estimated_lock = threading.Lock()
+
+def _fingerprint(tx):
+    return (str(tx.get('from', '')).lower(), str(tx.get('to', '')).lower(),
+            HexBytes(tx.get('data', b'')), tx.get('value', 0))
+
+def record_estimate(tx):
+    """Note that eth_estimateGas just succeeded for a built transaction, so simulate() can skip it"""
+    now = time.time()
+    with _estimated_lock:
+        for key, estimated_at in list(_estimated.items()):
+            if now - estimated_at > ESTIMATE_TTL:
+                del _estimated[key]
+        _estimated[_fingerprint(tx)] = now
+
+def _take_estimate(tx):
+    with _estimated_lock:
+        estimated_at = _estimated.pop(_fingerprint(tx), None)
+    return estimated_at is not None and time.time() - estimated_at <= ESTIMATE_TTL
+
+def simulate(tx, block_identifier='pending', web3_instance=None):
+    """eth_call a built transaction (with its gas limit) and return the call result.
+
+    Raises TransactionReverted with the decoded reason if it would revert.
+    Returns None without a call if the transaction's gas estimate succeeded
+    within ESTIMATE_TTL (each estimate covers one simulate()).
+    """
+    if _take_estimate(tx):
+        return None
+    call = {key: tx[key] for key in ('from', 'to', 'data', 'value', 'gas') if key in tx}
+    try:
+        return (web3_instance or web3).eth.call(call, block_identifier)
+    except ContractLogicError as e:
+        raise TransactionReverted(revert_reason(e), tx) from e
@@ -0,0 +1,155 @@
+# staked_index.py
+# Which positions a wallet has staked in the CL gauge, kept up to date from
+# gauge Deposit/Withdraw logs instead of re-reading the chain every time.
+import json
+import logging
+import threading
+from web3 import Web3
+from wallet_setup import web3, get_wallet_address
+from multicall import Call, aggregate, block_number_call
+from aerodrome_client import CL_GAUGE_ADDRESS, get_contract
+from state_store import get_state_store, STATUS_OPEN, STATUS_STAKED, STATUS_BURNED
+
+logger = logging.getLogger()
+
+# Gauge events: Deposit/Withdraw(address indexed user, uint256 indexed tokenId, uint128 indexed liquidityToStake)
+DEPOSIT_TOPIC = Web3.to_hex(Web3.keccak(text="Deposit(address,uint256,uint128)"))
+WITHDRAW_TOPIC = Web3.to_hex(Web3.keccak(text="Withdraw(address,uint256,uint128)"))
+
+MAX_LOG_RANGE = 5000  # blocks per update(); a larger gap is resynced from stakedValues
+
+class StakedIndex:
+    """Set of token IDs `owner` has staked in `gauge`, as of `block`.
+
+    The index is seeded from the gauge's stakedValues(owner) and then
+    advanced with the Deposit/Withdraw logs of every new block range, so
+    each update costs one eth_getLogs no matter how many positions exist.
+    Lookups are answered from memory. The set and its block are kept in
+    the state store, so a restart resumes from where it stopped.
+    """
+
+    def __init__(self, owner=None, gauge_address=CL_GAUGE_ADDRESS, store=None, web3_instance=None):
+        self.owner = Web3.to_checksum_address(owner or get_wallet_address())
+        self.gauge = get_contract('gauge', gauge_address)
+        self.store = store or get_state_store()
+        self.web3 = web3_instance or web3
+        self._lock = threading.Lock()
+        self.staked = set()
+        self.block = None
+        self._load()
+
+    @property
+    def _meta_key(self):
+        return f"staked_index:{self.gauge.address}:{self.owner}".lower()
+
+    def _load(self):
+        value = self.store.get_meta(self._meta_key)
+        if value:
+            data = json.loads(value)
+            self.staked = set(data['token_ids'])
+            self.block = data['block']
+
+    def _save(self):
+        self.store.set_meta(self._meta_key, json.dumps({
+            'block': self.block, 'token_ids': sorted(self.staked)
+        }))
+
+    def resync(self):
+        """Rebuild the index from stakedValues(owner) at a single block"""
+        block_number, token_ids = aggregate([
+            block_number_call(),
+            Call(self.gauge, 'stakedValues', [self.owner])
+        ])
+        with self._lock:
+            self.staked = set(token_ids)
+            self.block = block_number
+            self._save()
+        logger.info(f"Staked index for {self.owner}: {len(self.staked)} position(s) at block {block_number}")
+        return self.staked
+
+    def apply_log(self, log):
+        """Apply one gauge Deposit/Withdraw log (ignored if it is for another owner).
+
+        The position's status in the state store follows, so stakes and
+        unstakes made outside the bot show up there too; burned positions
+        stay burned.
+        """
+        topics = log['topics']
+        if len(topics) < 3 or Web3.to_checksum_address('0x' + bytes(topics[1])[-20:].hex()) != self.owner:
+            return False
+        token_id = int.from_bytes(bytes(topics[2]), 'big')
+        event = Web3.to_hex(topics[0])
+        removed = log.get('removed', False)
+        staked = (event == DEPOSIT_TOPIC) != removed
+        if staked:
+            self.staked.add(token_id)
+        else:
+            self.staked.discard(token_id)
+
+        status = STATUS_STAKED if staked else STATUS_OPEN
+        stored = self.store.get_position(token_id)
+        if stored is None or stored['status'] not in (status, STATUS_BURNED):
+            self.store.record_position(token_id, owner=self.owner, status=status, block_number=log['blockNumber'])
+        return True
+
+    def update(self, to_block=None):
+        """Advance the index to `to_block` (default: latest) with one eth_getLogs"""
+        if self.block is None:
+            return self.resync()
+        to_block = to_block if to_block is not None else self.web3.eth.block_number
+        if to_block <= self.block:
+            return self.staked
+        if to_block - self.block > MAX_LOG_RANGE:
+            return self.resync()
+
+        logs = self.web3.eth.get_logs({
+            'fromBlock': self.block + 1,
+            'toBlock': to_block,
+            'address': self.gauge.address,
+            'topics': [[DEPOSIT_TOPIC, WITHDRAW_TOPIC], '0x' + '00' * 12 + self.owner.lower()[2:]]
+        })
+        with self._lock, self.store.transaction():
+            changed = [self.apply_log(log) for log in logs]
+            self.block = to_block
+            self._save()
+
+        if any(changed):
+            logger.info(f"Staked index updated to block {to_block}: {sorted(self.staked)}")
+        return self.staked
+
+    def record(self, token_id, staked, block_number=None):
+        """Apply our own mined stake/unstake without waiting for the next update.
+
+        The index block is not advanced; the same event seen again in the
+        next update() is a no-op.
+        """
+        with self._lock:
+            if staked:
+                self.staked.add(token_id)
+            else:
+                self.staked.discard(token_id)
+            self._save()
+        self.store.set_position_status(token_id, STATUS_STAKED if staked else STATUS_OPEN, block_number)
+
+    def is_staked(self, token_id):
+        return token_id in self.staked
+
+    def staked_positions(self):
+        """Staked token IDs, newest first"""
+        return sorted(self.staked, reverse=True)
+
+    def verify(self, token_id):
+        """Check one token against the gauge's stakedContains (for spot checks)"""
+        return self.gauge.functions.stakedContains(self.owner, token_id).call()
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_staked_index(owner=None, gauge_address=CL_GAUGE_ADDRESS):
+    """Get the process-wide staked index for `owner` (default: the wallet) in a gauge"""
+    owner = Web3.to_checksum_address(owner or get_wallet_address())
+    key = (owner, gauge_address.lower())
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = StakedIndex(owner, gauge_address)
+        return _indexes[key]
@@ -0,0 +1,240 @@
+# state_store.py
+# Embedded SQLite store for bot state: positions, their ranges and staking
+# status, the active position, rebalance history and the last seen block.
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+
+STATE_DB = os.getenv('AERODROME_STATE_DB', 'aerodrome_state.db')
+LEGACY_POSITION_FILE = "active_position.json"
+
+# Position lifecycle: minted -> staked <-> unstaked -> burned
+STATUS_OPEN = 'open'
+STATUS_STAKED = 'staked'
+STATUS_BURNED = 'burned'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    token_id INTEGER PRIMARY KEY,
+    owner TEXT,
+    pool TEXT,
+    tick_lower INTEGER,
+    tick_upper INTEGER,
+    liquidity TEXT,
+    status TEXT NOT NULL,
+    created_block INTEGER,
+    updated_block INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rebalances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    old_token_id INTEGER,
+    new_token_id INTEGER,
+    status TEXT NOT NULL,
+    reason TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class StateStore:
+    """SQLite-backed bot state shared by the bot and the standalone scripts.
+
+    Every write runs in its own transaction (or in an enclosing
+    transaction() block), so a crash never leaves partial state behind.
+    The connection is shared between threads behind a lock; WAL mode lets
+    the standalone scripts read while the bot writes.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._import_legacy_file()
+
+    @contextmanager
+    def transaction(self):
+        """Group several writes into one atomic transaction (nests)"""
+        with self._lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self.conn
+            except Exception:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute("COMMIT")
+
+    def _import_legacy_file(self):
+        """One-time import of the position ID from active_position.json"""
+        if self.get_meta('legacy_imported') or not os.path.exists(LEGACY_POSITION_FILE):
+            return
+        try:
+            with open(LEGACY_POSITION_FILE) as f:
+                token_id = json.load(f).get('position_id')
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not import {LEGACY_POSITION_FILE}: {e}")
+            return
+        with self.transaction():
+            if token_id:
+                # The file was only written after a successful stake
+                self.record_position(token_id, status=STATUS_STAKED)
+                self.set_active_position(token_id)
+            self.set_meta('legacy_imported', '1')
+        logger.info(f"Imported position {token_id} from {LEGACY_POSITION_FILE}")
+
+    # Key/value metadata
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, None if value is None else str(value))
+            )
+
+    def active_position_id(self):
+        value = self.get_meta('active_position_id')
+        return int(value) if value else None
+
+    def set_active_position(self, token_id):
+        self.set_meta('active_position_id', token_id)
+
+    def last_seen_block(self):
+        value = self.get_meta('last_seen_block')
+        return int(value) if value else None
+
+    def set_last_seen_block(self, block_number):
+        """Advance the last seen block (never moves backwards)"""
+        with self.transaction():
+            current = self.last_seen_block()
+            if current is None or block_number > current:
+                self.set_meta('last_seen_block', block_number)
+
+    # Positions
+
+    def record_position(self, token_id, owner=None, pool=None, tick_lower=None, tick_upper=None,
+                        liquidity=None, status=None, block_number=None):
+        """Insert or update a position; fields passed as None keep their stored value.
+
+        A new position without a status is recorded as open.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO positions (token_id, owner, pool, tick_lower, tick_upper, liquidity,
+                                       status, created_block, updated_block, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, ?), ?, ?, ?)
+                ON CONFLICT(token_id) DO UPDATE SET
+                    owner = COALESCE(excluded.owner, positions.owner),
+                    pool = COALESCE(excluded.pool, positions.pool),
+                    tick_lower = COALESCE(excluded.tick_lower, positions.tick_lower),
+                    tick_upper = COALESCE(excluded.tick_upper, positions.tick_upper),
+                    liquidity = COALESCE(excluded.liquidity, positions.liquidity),
+                    status = CASE WHEN ? IS NULL THEN positions.status ELSE excluded.status END,
+                    updated_block = COALESCE(excluded.updated_block, positions.updated_block),
+                    updated_at = excluded.updated_at
+                """,
+                (token_id, owner, pool, tick_lower, tick_upper,
+                 None if liquidity is None else str(liquidity),
+                 status, STATUS_OPEN, block_number, block_number, time.time(), status)
+            )
+
+    def set_position_status(self, token_id, status, block_number=None):
+        self.record_position(token_id, status=status, block_number=block_number)
+
+    @staticmethod
+    def _position_from_row(row):
+        position = dict(row)
+        if position['liquidity'] is not None:
+            position['liquidity'] = int(position['liquidity'])
+        return position
+
+    def get_position(self, token_id):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM positions WHERE token_id = ?", (token_id,)).fetchone()
+        return self._position_from_row(row) if row else None
+
+    def list_positions(self, status=None, pool=None, owner=None):
+        """Stored positions, newest first, optionally filtered by status, pool and owner"""
+        conditions = []
+        params = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if pool is not None:
+            conditions.append("lower(pool) = ?")
+            params.append(pool.lower())
+        if owner is not None:
+            conditions.append("lower(owner) = ?")
+            params.append(owner.lower())
+        query = "SELECT * FROM positions"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY token_id DESC", params).fetchall()
+        return [self._position_from_row(row) for row in rows]
+
+    # Rebalance history
+
+    def start_rebalance(self, old_token_id, reason=None):
+        """Record the start of a rebalance and return its ID"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO rebalances (old_token_id, status, reason, started_at) VALUES (?, 'started', ?, ?)",
+                (old_token_id, reason, time.time())
+            )
+            return cursor.lastrowid
+
+    def finish_rebalance(self, rebalance_id, status, new_token_id=None):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE rebalances SET status = ?, new_token_id = ?, finished_at = ? WHERE id = ?",
+                (status, new_token_id, time.time(), rebalance_id)
+            )
+
+    def rebalance_history(self, limit=20):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM rebalances ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_state_store():
+    """Get the process-wide state store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StateStore()
+        return _store
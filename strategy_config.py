@@ -0,0 +1,45 @@
+# strategy_config.py
+# Tunable strategy parameters. Defaults are the bot's original constants;
+# a strategy file (a single entry, or a ranked table written by sweep.py)
+# overrides them.
+import os
+import json
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger()
+
+STRATEGY_CONFIG = os.getenv('AERODROME_STRATEGY_CONFIG', 'strategy.json')
+# Row of a ranked sweep table to use (1 = best)
+STRATEGY_RANK = int(os.getenv('AERODROME_STRATEGY_RANK', '1'))
+
+StrategyParams = namedtuple('StrategyParams', [
+    'range_pct',       # +/- width of the position range in percent
+    'check_interval',  # seconds between throttled range checks
+    'slippage',        # mint amountMin tolerance
+    'balance_factor'   # share of the WETH balance deposited
+], defaults=(2.0, 300, 0.005, 0.995))
+
+def load_strategy_params(path=STRATEGY_CONFIG, rank=STRATEGY_RANK):
+    """Strategy parameters from `path`, or the defaults if it does not exist.
+
+    The file holds either one object or a list of rows ranked best first
+    (sweep.py output), of which row `rank` is used. Keys other than the
+    StrategyParams fields (scores, rank) are ignored.
+    """
+    if not os.path.exists(path):
+        return StrategyParams()
+
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        if not 1 <= rank <= len(data):
+            raise ValueError(f"{path} has {len(data)} rows, cannot use rank {rank}")
+        data = data[rank - 1]
+
+    params = StrategyParams(**{field: data[field] for field in StrategyParams._fields if field in data})
+    logger.info(f"Strategy parameters from {path}: {dict(params._asdict())}")
+    return params
+
+# Parameters of this process, shared by the bot and the deposit module
+strategy = load_strategy_params()
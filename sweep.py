@@ -0,0 +1,137 @@
+# sweep.py
+# Grid search of the strategy parameters (range width, check interval,
+# slippage tolerance, balance factor) with the backtester, run on every core.
+#
+# Usage: python sweep.py <events.csv|events.parquet> [output.json]
+# The output is a ranked table (best first) that the bot loads directly:
+# AERODROME_STRATEGY_CONFIG=<output.json> (see strategy_config.py).
+import os
+import sys
+import json
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import backtest
+from strategy_config import StrategyParams
+
+# Values tried for each StrategyParams field
+GRID = {
+    'range_pct': [0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0],
+    'check_interval': [0, 60, 300, 900],
+    'slippage': [0.001, 0.0025, 0.005, 0.01],
+    'balance_factor': [0.95, 0.98, 0.995, 1.0]
+}
+
+# Strategy parameter -> BacktestConfig field
+CONFIG_FIELDS = {
+    'range_pct': 'range_pct',
+    'check_interval': 'check_interval',
+    'slippage': 'slippage_tolerance',
+    'balance_factor': 'balance_factor'
+}
+
+class SharedEvents:
+    """Event arrays copied once into shared memory.
+
+    Workers map the blocks by name (see _attach), so the dataset is not
+    pickled or copied per worker or per task.
+    """
+
+    def __init__(self, events):
+        self.blocks = []
+        self.specs = {}
+        for name, values in events.items():
+            values = np.ascontiguousarray(values, dtype=np.float64)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=np.float64, buffer=block.buf)[:] = values
+            self.blocks.append(block)
+            self.specs[name] = (block.name, values.shape)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Per-worker state set up by _attach
+_events = None
+_base_config = None
+_blocks = []
+
+def _attach(specs, base_config):
+    """Worker initializer: map the shared event arrays"""
+    global _events, _base_config
+    _events = {}
+    for name, (block_name, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _blocks.append(block)  # keep the mapping alive for the worker's lifetime
+        _events[name] = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+    _base_config = base_config
+
+def _evaluate(params):
+    config = _base_config._replace(**{CONFIG_FIELDS[name]: value for name, value in params.items()})
+    summary, _ = backtest.backtest(_events, config)
+    row = dict(params)
+    row.update({
+        'return': summary['return'],
+        'final_value': summary['final_value'],
+        'fees': summary['fees'],
+        'emissions': summary['emissions'],
+        'gas': summary['gas'],
+        'swap_cost': summary['slippage'],
+        'rebalances': summary['rebalances'],
+        'time_in_range': summary['time_in_range']
+    })
+    return row
+
+def sweep(events, grid=GRID, base_config=backtest.BacktestConfig(), workers=None):
+    """Backtest every combination in `grid`; returns rows ranked by return, best first"""
+    unknown = set(grid) - set(StrategyParams._fields)
+    if unknown:
+        raise ValueError(f"Not strategy parameters: {', '.join(sorted(unknown))}")
+
+    combinations = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    workers = workers or os.cpu_count()
+    with SharedEvents(events) as shared, ProcessPoolExecutor(
+        max_workers=workers, initializer=_attach, initargs=(shared.specs, base_config)
+    ) as executor:
+        rows = list(executor.map(_evaluate, combinations, chunksize=max(1, len(combinations) // (workers * 4))))
+
+    rows.sort(key=lambda row: row['return'], reverse=True)
+    for rank, row in enumerate(rows, 1):
+        row['rank'] = rank
+    return rows
+
+def save_table(rows, path):
+    with open(path, 'w') as f:
+        json.dump(rows, f, indent=2)
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python sweep.py <events.csv|events.parquet> [output.json]")
+        return
+    output = sys.argv[2] if len(sys.argv) > 2 else 'strategy_sweep.json'
+
+    events = backtest.load_events(sys.argv[1])
+    combinations = np.prod([len(values) for values in GRID.values()])
+    print(f"Backtesting {combinations} parameter sets over {len(events['tick']):,} events on {os.cpu_count()} cores...")
+    rows = sweep(events)
+    save_table(rows, output)
+
+    print(f"\n{'rank':>4} {'range %':>8} {'check s':>8} {'slippage':>9} {'balance':>8} "
+          f"{'return %':>9} {'rebal':>6} {'in range':>9}")
+    for row in rows[:10]:
+        print(f"{row['rank']:>4} {row['range_pct']:>8} {row['check_interval']:>8} {row['slippage']:>9} "
+              f"{row['balance_factor']:>8} {row['return'] * 100:>9.2f} {row['rebalances']:>6} "
+              f"{row['time_in_range'] * 100:>8.1f}%")
+    print(f"\nRanked table written to {output}; run the bot with AERODROME_STRATEGY_CONFIG={output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# tests/conftest.py
+# The bot's modules read their configuration at import, so the environment
+# is pointed at throwaway state before anything is imported. Chain access
+# goes through FakeChain, an in-process JSON-RPC provider.
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+import subprocess
+
+STATE_DIR = tempfile.mkdtemp(prefix='aerodrome_tests_')
+# anvil's first default development account
+PRIVATE_KEY = '0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80'
+WALLET = '0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266'
+
+os.environ.update({
+    'AERODROME_RPC_URLS': 'http://127.0.0.1:9',
+    'AERODROME_WALLET_ADDRESS': WALLET,
+    'AERODROME_STATE_DB': os.path.join(STATE_DIR, 'state.db'),
+    'AERODROME_APPROVAL_LEDGER': os.path.join(STATE_DIR, 'approval_ledger.json'),
+    'AERODROME_STRATEGY_CONFIG': os.path.join(STATE_DIR, 'strategy.json'),
+    'AERODROME_POOLS_CONFIG': os.path.join(STATE_DIR, 'pools.json')
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from hexbytes import HexBytes
+from eth_utils import get_abi_output_types
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+import wallet_setup
+
+wallet_setup.set_key_provider(wallet_setup.StaticKeyProvider(PRIVATE_KEY), WALLET)
+
+class Revert(Exception):
+    """Raised by a fake contract function to make the call revert"""
+
+class RPCError(Exception):
+    """Raised by a FakeChain response function to answer with a JSON-RPC error"""
+
+class FakeContract:
+    """Answers eth_call for one contract from python functions keyed by ABI function name"""
+
+    def __init__(self, contract, functions):
+        self.contract = contract
+        self.functions = functions
+
+    def call(self, data):
+        """Return (success, return data) for raw calldata"""
+        function, params = self.contract.decode_function_input(data)
+        handler = self.functions.get(function.abi['name'])
+        if handler is None:
+            return False, b''
+        args = [params[item['name']] for item in function.abi['inputs']]
+        try:
+            value = handler(*args)
+        except Revert:
+            return False, b''
+        output_types = get_abi_output_types(function.abi)
+        values = value if len(output_types) > 1 else [value]
+        return True, wallet_setup.web3.codec.encode(output_types, values)
+
+class FakeChain(JSONBaseProvider):
+    """In-process JSON-RPC node.
+
+    eth_call is served by FakeContracts registered with add_contract(),
+    and aggregate3 calls to Multicall3 are unpacked and dispatched to them.
+    Any other method is answered from `responses` (a value or a function
+    of the params, which may raise RPCError for an error response or any
+    other exception to fail the transport). Every request is recorded in
+    `requests`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.block_number = 100
+        self.contracts = {}
+        self.responses = {'eth_chainId': hex(8453)}
+        self.requests = []
+
+    def add_contract(self, contract, **functions):
+        self.contracts[contract.address.lower()] = FakeContract(contract, functions)
+
+    def _call(self, to, data):
+        import multicall
+        if to.lower() == multicall.MULTICALL3_ADDRESS.lower():
+            function, params = multicall.multicall_contract.decode_function_input(data)
+            if function.abi['name'] == 'getBlockNumber':
+                return True, wallet_setup.web3.codec.encode(['uint256'], [self.block_number])
+            results = [self._call(call['target'], call['callData']) for call in params['calls']]
+            for call, (success, _) in zip(params['calls'], results):
+                if not success and not call['allowFailure']:
+                    return False, b''
+            return True, wallet_setup.web3.codec.encode(['(bool,bytes)[]'], [results])
+        contract = self.contracts.get(to.lower())
+        if contract is None:
+            return True, b''
+        return contract.call(data)
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        if method == 'eth_call':
+            success, return_data = self._call(params[0]['to'], HexBytes(params[0]['data']))
+            if not success:
+                return {'jsonrpc': '2.0', 'id': 1, 'error': {'code': 3, 'message': 'execution reverted', 'data': '0x'}}
+            return {'jsonrpc': '2.0', 'id': 1, 'result': '0x' + return_data.hex()}
+        if method == 'eth_blockNumber':
+            return {'jsonrpc': '2.0', 'id': 1, 'result': hex(self.block_number)}
+        if method not in self.responses:
+            return {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32601, 'message': f"{method} not faked"}}
+        response = self.responses[method]
+        try:
+            result = response(params) if callable(response) else response
+        except RPCError as e:
+            return {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': str(e)}}
+        return {'jsonrpc': '2.0', 'id': 1, 'result': result}
+
+    def make_batch_request(self, requests):
+        return [dict(self.make_request(method, params), id=i) for i, (method, params) in enumerate(requests)]
+
+    def methods(self):
+        return [method for method, _ in self.requests]
+
+@pytest.fixture
+def chain():
+    """Swap the shared web3 provider for a FakeChain and start from an empty read cache"""
+    from read_cache import get_read_cache
+    original = wallet_setup.web3.provider
+    fake = FakeChain()
+    wallet_setup.web3.provider = fake
+    get_read_cache().invalidate()
+    yield fake
+    wallet_setup.web3.provider = original
+    get_read_cache().invalidate()
+
+@pytest.fixture
+def tracker(chain, monkeypatch):
+    """A fresh process-wide receipt tracker polling the FakeChain"""
+    import receipt_tracker
+    fresh = receipt_tracker.ReceiptTracker(Web3(chain), poll_interval=0.01)
+    monkeypatch.setattr(receipt_tracker, '_tracker', fresh)
+    yield fresh
+    # Nothing left to poll: the tracker thread goes idle
+    fresh._pending.clear()
+
+# Base fork for tests that need deployed contracts; skipped without anvil or
+# an RPC URL to fork (AERODROME_FORK_URL)
+ANVIL = os.getenv('AERODROME_ANVIL', 'anvil')
+FORK_URL = os.getenv('AERODROME_FORK_URL')
+TEST_FORK_PORT = int(os.getenv('AERODROME_TEST_FORK_PORT', '8546'))
+
+@pytest.fixture(scope='session')
+def fork():
+    """Web3 connected to a throwaway anvil fork of Base"""
+    if shutil.which(ANVIL) is None or not FORK_URL:
+        pytest.skip("needs anvil on PATH and AERODROME_FORK_URL")
+
+    process = subprocess.Popen([ANVIL, '--fork-url', FORK_URL, '--port', str(TEST_FORK_PORT), '--silent'])
+    fork_web3 = Web3(Web3.HTTPProvider(f"http://127.0.0.1:{TEST_FORK_PORT}"))
+    deadline = time.time() + 60
+    while not fork_web3.is_connected():
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            pytest.fail("anvil fork did not start")
+        time.sleep(0.2)
+    yield fork_web3
+    process.send_signal(signal.SIGINT)
+    process.wait(timeout=30)
@@ -0,0 +1,75 @@
+# tests/test_approval_ledger.py
+import pytest
+from hexbytes import HexBytes
+from approval_ledger import ApprovalLedger, APPROVAL_TOPIC, RECONCILE_MAX_BLOCKS
+
+OWNER = '0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266'
+TOKEN = '0x4200000000000000000000000000000000000006'
+NPM = '0x827922686190790b37229fd06084350e74485b72'
+SPENDER = '0xBE6D8f0d05cC4be24d5167a3eF062215bE6D18a5'
+GAUGE = '0xF33a96b5932D9E9B9A0eDA447AbD8C9d48d2e0c8'
+
+def topic(value):
+    if isinstance(value, str):
+        return HexBytes(bytes(12) + bytes.fromhex(value[2:]))
+    return HexBytes(value.to_bytes(32, 'big'))
+
+class FakeEth:
+    def __init__(self, block_number, logs=()):
+        self.block_number = block_number
+        self.logs = list(logs)
+        self.log_filters = []
+
+    def get_logs(self, params):
+        self.log_filters.append(params)
+        return [log for log in self.logs if params['fromBlock'] <= log['blockNumber'] <= params['toBlock']]
+
+class FakeWeb3:
+    def __init__(self, block_number, logs=()):
+        self.eth = FakeEth(block_number, logs)
+
+@pytest.fixture
+def ledger(tmp_path):
+    def make(block_number, logs=()):
+        return ApprovalLedger(str(tmp_path / 'ledger.json'), FakeWeb3(block_number, logs))
+    return make
+
+def test_first_run_only_sets_the_starting_block(ledger):
+    first = ledger(1000)
+
+    assert first.reconcile([OWNER], [TOKEN]) == 0
+    assert first.last_block == 1000
+    assert first.web3.eth.log_filters == []
+    # The starting block is persisted
+    assert ledger(1200).last_block == 1000
+
+def test_reconcile_pages_through_max_blocks_per_call(ledger):
+    first = ledger(100)
+    first.reconcile([OWNER], [TOKEN])
+    first.web3.eth.block_number = 100 + 2 * RECONCILE_MAX_BLOCKS + 10
+
+    for _ in range(4):
+        first.reconcile([OWNER], [TOKEN])
+
+    ranges = [(params['fromBlock'], params['toBlock']) for params in first.web3.eth.log_filters]
+    assert ranges == [(101, 5100), (5101, 10100), (10101, 10110)]
+    assert first.last_block == 10110
+
+def test_reconcile_applies_only_logs_newer_than_the_entry(ledger):
+    logs = [
+        {'address': TOKEN, 'topics': [HexBytes(APPROVAL_TOPIC), topic(OWNER), topic(SPENDER)],
+         'data': HexBytes((10**18).to_bytes(32, 'big')), 'blockNumber': 150},
+        {'address': TOKEN, 'topics': [HexBytes(APPROVAL_TOPIC), topic(OWNER), topic(SPENDER)],
+         'data': HexBytes((5).to_bytes(32, 'big')), 'blockNumber': 120},
+        {'address': NPM, 'topics': [HexBytes(APPROVAL_TOPIC), topic(OWNER), topic(GAUGE), topic(42)],
+         'data': HexBytes(b''), 'blockNumber': 160}
+    ]
+    first = ledger(100, logs)
+    first.reconcile([OWNER], [TOKEN, NPM])
+    first.record_allowance(OWNER, TOKEN, SPENDER, 7, block_number=130)
+    first.web3.eth.block_number = 200
+
+    assert first.reconcile([OWNER], [TOKEN, NPM]) == 2
+
+    assert first.allowance(OWNER, TOKEN, SPENDER) == 10**18
+    assert first.nft_approval(NPM, 42) == (True, GAUGE)
@@ -0,0 +1,59 @@
+# tests/test_backtest.py
+import numpy as np
+import pytest
+import backtest
+import tick_math
+import tick_math_np
+from backtest import BacktestConfig, first_exit
+
+def events(ticks, timestamps=None):
+    ticks = np.array(ticks, dtype=np.float64)
+    return {
+        'block_number': np.arange(len(ticks), dtype=np.float64),
+        'tick': ticks,
+        'timestamp': np.array(timestamps if timestamps is not None else np.arange(len(ticks)) * 2, dtype=np.float64),
+        'liquidity': np.full(len(ticks), 1e20),
+        'amount0': np.full(len(ticks), 1e15),
+        'amount1': np.full(len(ticks), -3e6)
+    }
+
+def test_upper_tick_is_out_of_range():
+    assert tick_math.in_range(-200, -200, 200)
+    assert not tick_math.in_range(200, -200, 200)
+    assert first_exit(np.array([0, 199, 200, 0]), 0, -200, 200) == 2
+    assert first_exit(np.array([0, -200, 199]), 0, -200, 200) is None
+
+def test_position_at_the_upper_tick_exits_and_earns_nothing():
+    # +/-2% at spacing 100 is [-200, 200]
+    summary, segments = backtest.backtest(events([0, 0, 200, 200, 200]), BacktestConfig())
+
+    assert segments[0].end_index == 2
+    assert segments[0].time_in_range == 4
+    assert summary['rebalances'] == 1
+
+def test_mints_that_keep_reverting_end_the_run():
+    # Every check after the first exit moves past the 0.5% tolerance before the mint lands
+    ticks = events([0, 0, 0, 500, 5000, 9000, 13000])
+    _, segments = backtest.backtest(ticks, BacktestConfig())
+    _, free_segments = backtest.backtest(ticks, BacktestConfig(gas_per_mint=0))
+
+    assert [segment.end_index for segment in segments] == [3]
+    # Failed mints at the checks of events 3, 4 and 5 are charged to the last position
+    config = BacktestConfig()
+    prices = tick_math_np.sqrt_prices_at_ticks(np.array([500, 5000, 9000])) ** 2
+    failed_gas = float(np.sum(config.gas_per_mint * config.gas_price_gwei * 1e9 * prices)) / 10 ** config.decimals1
+    assert segments[0].gas - free_segments[0].gas == pytest.approx(failed_gas)
+    assert free_segments[0].value_out - segments[0].value_out == pytest.approx(failed_gas)
+
+def test_no_successful_mint_is_an_error():
+    with pytest.raises(ValueError):
+        backtest.backtest(events([0, 5000, 10000]), BacktestConfig())
+
+def test_no_pool_liquidity_earns_no_emissions():
+    ticks = events([0, 0, 0, 0])
+    del ticks['liquidity']
+    summary, segments = backtest.backtest(ticks, BacktestConfig(emissions_per_second=1.0))
+
+    assert segments[0].time_in_range > 0
+    assert segments[0].emissions == 0
+    assert segments[0].fees == 0
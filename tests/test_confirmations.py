@@ -0,0 +1,72 @@
+# tests/test_confirmations.py
+import pytest
+import confirmations
+from confirmations import wait_until, wait_for_block, wait_for_next_block
+
+class FakeClock:
+    """Replaces the time module in confirmations; sleep() advances the clock and runs on_sleep"""
+
+    def __init__(self, on_sleep=None):
+        self.now = 1_000_000.0
+        self.sleeps = []
+        self.on_sleep = on_sleep
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep()
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(confirmations, 'time', fake)
+    return fake
+
+def test_poll_interval_backs_off_up_to_the_cap(clock):
+    polls = []
+
+    assert wait_until(lambda: polls.append(1) or len(polls) == 8, timeout=60)
+
+    assert clock.sleeps == pytest.approx([0.5, 0.75, 1.125, 1.6875, 2.53125, 3.796875, 4])
+
+def test_timeout_returns_false_without_oversleeping(clock):
+    assert not wait_until(lambda: False, timeout=3)
+
+    assert sum(clock.sleeps) == pytest.approx(3)
+    assert clock.now == pytest.approx(1_000_003)
+
+def test_predicate_errors_count_as_not_yet(clock):
+    answers = [RuntimeError('header not found'), False, True]
+
+    def predicate():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert wait_until(predicate)
+    assert len(clock.sleeps) == 2
+
+def test_block_already_past_the_target_returns_without_sleeping(chain, clock):
+    chain.block_number = 120
+
+    assert wait_for_block(110)
+    assert clock.sleeps == []
+
+def test_waits_for_the_chain_to_reach_the_block(chain, clock):
+    def mine():
+        chain.block_number += 1
+    clock.on_sleep = mine
+
+    assert wait_for_next_block()
+
+    assert chain.block_number == 101
+    assert len(clock.sleeps) == 1
+
+def test_block_that_never_arrives_times_out(chain, clock):
+    assert not wait_for_block(200, timeout=5)
+    assert sum(clock.sleeps) == pytest.approx(5)
@@ -0,0 +1,86 @@
+# tests/test_event_bot.py
+import os
+import asyncio
+import threading
+import importlib.util
+from types import SimpleNamespace
+import pytest
+from hexbytes import HexBytes
+from read_cache import get_read_cache
+from state_store import get_state_store
+
+pytest.importorskip('schedule')
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'aerodrome-bot.py')
+
+class Stop(Exception):
+    pass
+
+@pytest.fixture
+def bot(chain, monkeypatch):
+    """A fresh aerodrome-bot module with its chain reads and idle tasks stubbed out"""
+    spec = importlib.util.spec_from_file_location('aerodrome_bot', BOT_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    module.checks = []
+    module.release = threading.Event()
+
+    def monitor_and_rebalance(force=False, min_interval=None):
+        if min_interval == module.EVENT_CHECK_INTERVAL:
+            module.checks.append('event')
+            module.release.wait(5)
+        else:
+            module.checks.append('periodic')
+
+    monkeypatch.setattr(module, 'monitor_and_rebalance', monitor_and_rebalance)
+    for name in ('update_staked_index', 'reconcile_approvals', 'recover_dropped_transactions'):
+        monkeypatch.setattr(module, name, lambda: None)
+    monkeypatch.setattr(module, 'pool_state', SimpleNamespace(snapshot=lambda: SimpleNamespace(tick=0)))
+    block_numbers = {HexBytes(b'\x01' * 32): 5000}
+    monkeypatch.setattr(module, 'web3', SimpleNamespace(
+        eth=SimpleNamespace(get_block=lambda block_hash: {'number': block_numbers[block_hash]}),
+        to_hex=lambda value: value.hex()
+    ))
+    return module
+
+def test_new_blocks_advance_the_cache_head_and_last_seen_block(bot, monkeypatch):
+    monitors = []
+
+    class FakeMonitor:
+        def __init__(self, pool, on_tick_change, on_new_block=None, initial_tick=None):
+            self.on_new_block = on_new_block
+            monitors.append(self)
+
+        async def run(self):
+            await self.on_new_block(HexBytes(b'\x01' * 32))
+            raise Stop()
+
+    monkeypatch.setattr(bot, 'TickMonitor', FakeMonitor)
+    with pytest.raises(Stop):
+        asyncio.run(bot.run_event_driven_bot())
+
+    assert monitors[0].on_new_block is not None
+    assert get_read_cache().head >= 5000
+    assert get_state_store().last_seen_block() >= 5000
+
+def test_tick_change_schedules_the_rebalance_without_blocking_the_monitor(bot, monkeypatch):
+    class FakeMonitor:
+        def __init__(self, pool, on_tick_change, on_new_block=None, initial_tick=None):
+            self.on_tick_change = on_tick_change
+
+        async def run(self):
+            # Let the periodic safety check run and go to sleep first
+            await asyncio.sleep(0.1)
+            await asyncio.wait_for(self.on_tick_change(5000, 101), 1)
+            await asyncio.sleep(0.1)
+            # The rebalance is still running, so a second tick change starts nothing
+            await asyncio.wait_for(self.on_tick_change(5001, 102), 1)
+            assert bot.checks == ['periodic', 'event']
+            bot.release.set()
+            raise Stop()
+
+    monkeypatch.setattr(bot, 'TickMonitor', FakeMonitor)
+    with pytest.raises(Stop):
+        asyncio.run(bot.run_event_driven_bot())
+    bot.release.set()
@@ -0,0 +1,98 @@
+# tests/test_monitor.py
+import asyncio
+from hexbytes import HexBytes
+from wallet_setup import web3
+from aerodrome_monitor import TickMonitor, SWAP_EVENT_TOPIC, decode_swap_log
+from read_cache import get_read_cache
+
+POOL = '0xb2cc224c1c9feE385f8ad6a55b4d94E92359DC59'
+
+def swap_log(tick, block_number, sqrt_price_x96=2**96, removed=False):
+    return {
+        'address': POOL,
+        'topics': [HexBytes(SWAP_EVENT_TOPIC)],
+        'data': HexBytes(web3.codec.encode(
+            ['int256', 'int256', 'uint160', 'uint128', 'int24'], [-10**18, 3 * 10**9, sqrt_price_x96, 10**20, tick]
+        )),
+        'blockNumber': block_number,
+        'blockHash': HexBytes(block_number.to_bytes(32, 'big')),
+        'removed': removed
+    }
+
+class FakeFilter:
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def get_new_entries(self):
+        return self.batches.pop(0) if self.batches else []
+
+class FakeEth:
+    def __init__(self, swap_batches, block_batches=()):
+        self.filters = {'logs': FakeFilter(swap_batches), 'latest': FakeFilter(block_batches)}
+        self.filter_params = []
+
+    def filter(self, params):
+        self.filter_params.append(params)
+        return self.filters['latest' if params == 'latest' else 'logs']
+
+class FakeWeb3:
+    to_checksum_address = staticmethod(web3.to_checksum_address)
+
+    def __init__(self, swap_batches, block_batches=()):
+        self.eth = FakeEth(swap_batches, block_batches)
+
+def run_monitor(monitor, polls):
+    async def main():
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(monitor.poll_interval * polls)
+        monitor.stop()
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(main())
+
+def test_decode_swap_log():
+    assert decode_swap_log(swap_log(-199_000, 7, sqrt_price_x96=123)) == (-199_000, 123, 7)
+
+def test_only_tick_changes_are_reported():
+    changes = []
+    batches = [
+        [swap_log(100, 1), swap_log(100, 1), swap_log(101, 2)],
+        [swap_log(101, 3), swap_log(-5, 3)],
+        [swap_log(-5, 4)]
+    ]
+    fake = FakeWeb3(batches)
+    monitor = TickMonitor(POOL, lambda tick, block: changes.append((tick, block)),
+                          ws_url=None, poll_interval=0.01, web3_instance=fake, initial_tick=100)
+
+    run_monitor(monitor, polls=10)
+
+    assert changes == [(101, 2), (-5, 3)]
+    assert fake.eth.filter_params == [{'address': POOL, 'topics': [SWAP_EVENT_TOPIC]}]
+
+def test_coroutine_callbacks_and_new_blocks():
+    changes = []
+    blocks = []
+
+    async def on_tick_change(tick, block):
+        changes.append(tick)
+
+    fake = FakeWeb3([[swap_log(1, 1)], [swap_log(2, 2)]], block_batches=[[b'a'], [b'b', b'c']])
+    monitor = TickMonitor(POOL, on_tick_change, on_new_block=blocks.append,
+                          ws_url=None, poll_interval=0.01, web3_instance=fake)
+
+    run_monitor(monitor, polls=10)
+
+    assert changes == [1, 2]
+    assert blocks == [b'a', b'b', b'c']
+
+def test_removed_logs_invalidate_cache_without_callback():
+    changes = []
+    cache = get_read_cache()
+    fake = FakeWeb3([[swap_log(50, 9, removed=True)], [swap_log(51, 10)]])
+    monitor = TickMonitor(POOL, lambda tick, block: changes.append(tick),
+                          ws_url=None, poll_interval=0.01, web3_instance=fake, initial_tick=0)
+
+    run_monitor(monitor, polls=10)
+
+    assert changes == [51]
+    assert cache.head >= 10
@@ -0,0 +1,216 @@
+# tests/test_nonce_manager.py
+import pytest
+import requests
+from urllib3.exceptions import NewConnectionError
+from eth_utils import keccak
+from hexbytes import HexBytes
+from conftest import WALLET, RPCError
+import nonce_manager
+from nonce_manager import NonceManager, send_transaction
+
+RECIPIENT = '0x000000000000000000000000000000000000dEaD'
+
+def transfer():
+    return {
+        'from': WALLET, 'to': RECIPIENT, 'value': 1, 'gas': 21000,
+        'maxFeePerGas': 2 * 10**9, 'maxPriorityFeePerGas': 10**6, 'chainId': 8453
+    }
+
+@pytest.fixture
+def node(chain, tracker):
+    """FakeChain with a transaction count and a scripted eth_sendRawTransaction.
+
+    Each send pops the next outcome from node.outcomes (an exception to
+    raise, or None to accept); sent raw transactions are kept in node.sent.
+    """
+    chain.counts = {'latest': 3, 'pending': 3}
+    chain.outcomes = []
+    chain.sent = []
+    chain.known = set()
+
+    def send_raw_transaction(params):
+        raw = HexBytes(params[0])
+        chain.sent.append(raw)
+        outcome = chain.outcomes.pop(0) if chain.outcomes else None
+        if outcome is not None:
+            raise outcome
+        chain.known.add(HexBytes(keccak(raw)))
+        return '0x' + keccak(raw).hex()
+
+    def get_transaction(params):
+        if HexBytes(params[0]) not in chain.known:
+            return None
+        return {'hash': params[0], 'blockHash': None, 'blockNumber': None}
+
+    chain.responses.update({
+        'eth_getTransactionCount': lambda params: hex(chain.counts[params[1]]),
+        'eth_sendRawTransaction': send_raw_transaction,
+        'eth_getTransactionByHash': get_transaction
+    })
+    return chain
+
+@pytest.fixture
+def manager(node):
+    return NonceManager(WALLET)
+
+def test_sends_use_consecutive_nonces_and_stay_pending(node, manager):
+    hashes = [send_transaction(transfer(), nonce_manager=manager, preflight=False) for _ in range(3)]
+
+    assert node.methods().count('eth_getTransactionCount') == 1
+    assert sorted(manager.pending) == [3, 4, 5]
+    assert [manager.pending[nonce][0] for nonce in (3, 4, 5)] == hashes
+
+    manager.mark_mined(hashes[0])
+    assert sorted(manager.pending) == [4, 5]
+
+def test_already_known_counts_as_sent(node, manager):
+    node.outcomes = [RPCError('already known')]
+    tx = transfer()
+
+    tx_hash = send_transaction(tx, nonce_manager=manager, preflight=False)
+
+    assert tx_hash == HexBytes(keccak(node.sent[0]))
+    assert manager.pending[tx['nonce']][0] == tx_hash
+    assert manager.allocate() == tx['nonce'] + 1
+
+def test_ambiguous_failure_resends_the_same_transaction(node, manager):
+    node.outcomes = [requests.ReadTimeout('read timed out')]
+
+    tx_hash = send_transaction(transfer(), nonce_manager=manager, preflight=False)
+
+    assert len(node.sent) == 2 and node.sent[0] == node.sent[1]
+    assert tx_hash == HexBytes(keccak(node.sent[0]))
+    assert 3 in manager.pending
+
+def test_ambiguous_failure_never_reuses_the_nonce(node, manager):
+    node.outcomes = [requests.ReadTimeout('read timed out'), requests.HTTPError('502 Bad Gateway')]
+    tx = transfer()
+
+    with pytest.raises(requests.ReadTimeout):
+        send_transaction(tx, nonce_manager=manager, preflight=False)
+
+    assert manager.pending[3][1] == node.sent[0]
+    assert manager.allocate() == 4
+
+def test_rejected_send_releases_the_nonce(node, manager):
+    node.outcomes = [RPCError('insufficient funds for gas * price + value')]
+
+    with pytest.raises(Exception, match='insufficient funds'):
+        send_transaction(transfer(), nonce_manager=manager, preflight=False)
+
+    assert manager.pending == {}
+    assert manager.allocate() == 3
+
+def test_refused_connection_releases_the_nonce(node, manager):
+    node.outcomes = [requests.ConnectionError(NewConnectionError(None, 'Connection refused'))]
+
+    with pytest.raises(requests.ConnectionError):
+        send_transaction(transfer(), nonce_manager=manager, preflight=False)
+
+    assert len(node.sent) == 1
+    assert manager.allocate() == 3
+
+def test_nonce_taken_elsewhere_resyncs_once(node, manager):
+    manager.prime(3)
+    node.counts = {'latest': 5, 'pending': 5}
+    node.outcomes = [RPCError('nonce too low')]
+    tx = transfer()
+
+    send_transaction(tx, nonce_manager=manager, preflight=False)
+
+    assert tx['nonce'] == 5
+    assert sorted(manager.pending) == [5]
+
+def test_recover_rebroadcasts_dropped_transactions(node, manager):
+    kept = send_transaction(transfer(), nonce_manager=manager, preflight=False)
+    manager.mark_sent(4, HexBytes(b'\x01' * 32), b'dropped raw transaction')
+    manager.mark_sent(2, HexBytes(b'\x02' * 32), b'mined long ago')
+
+    assert manager.recover() == 1
+
+    assert node.sent[-1] == HexBytes(b'dropped raw transaction')
+    assert sorted(manager.pending) == [3, 4]
+    assert manager.pending[3][0] == kept
+
+def test_recover_dropped_transactions_covers_every_wallet(node, monkeypatch):
+    manager = NonceManager(WALLET)
+    manager.mark_sent(3, HexBytes(b'\x01' * 32), b'dropped')
+    monkeypatch.setattr(nonce_manager, '_nonce_managers', {WALLET: manager})
+
+    nonce_manager.recover_dropped_transactions()
+
+    assert node.sent == [HexBytes(b'dropped')]
+
+def test_allocate_fetches_the_pending_count_once(node, manager):
+    assert [manager.allocate() for _ in range(3)] == [3, 4, 5]
+    assert node.methods().count('eth_getTransactionCount') == 1
+
+def test_release_of_the_last_nonce_rewinds_the_counter(manager):
+    manager.prime(3)
+    nonce = manager.allocate()
+
+    manager.release(nonce)
+
+    assert manager.allocate() == 3
+    assert manager.allocate() == 4
+
+def test_released_nonces_are_reused_lowest_first(manager):
+    manager.prime(3)
+    for _ in range(4):  # 3, 4, 5, 6
+        manager.allocate()
+
+    manager.release(5)
+    manager.release(3)
+
+    assert [manager.allocate() for _ in range(3)] == [3, 5, 7]
+
+def test_sync_resets_the_counter_and_forgets_mined_nonces(node, manager):
+    manager.prime(3)
+    for nonce in range(3, 6):
+        manager.mark_sent(manager.allocate(), HexBytes(bytes([nonce]) * 32), b'raw')
+    manager.release(manager.allocate())
+    manager.allocate()
+    node.counts = {'latest': 5, 'pending': 6}
+
+    manager.sync()
+
+    assert sorted(manager.pending) == [5]
+    assert manager.allocate() == 6
+    manager.mark_mined(HexBytes(b'\x03' * 32))
+    assert sorted(manager.pending) == [5]
+
+def test_prime_does_not_override_a_started_counter(manager):
+    manager.prime(3)
+    manager.allocate()
+
+    manager.prime(10)
+
+    assert manager.allocate() == 4
+
+def test_wallet_lane_is_shared_and_uses_the_wallet_nonce_manager(node, monkeypatch):
+    monkeypatch.setattr(nonce_manager, '_nonce_managers', {})
+    monkeypatch.setattr(nonce_manager, '_wallet_lanes', {})
+
+    lane = nonce_manager.get_wallet_lane(WALLET)
+
+    assert nonce_manager.get_wallet_lane(WALLET) is lane
+    assert lane.nonce_manager is nonce_manager.get_nonce_manager(WALLET)
+    lane.shutdown()
+
+def test_wallet_lane_runs_work_in_order(node, monkeypatch):
+    monkeypatch.setattr(nonce_manager, 'simulate', lambda tx: None)
+    lane = nonce_manager.WalletLane(WALLET)
+    lane.nonce_manager = NonceManager(WALLET)
+    built = []
+
+    def build():
+        tx = transfer()
+        built.append(tx)
+        return tx
+
+    futures = [lane.send(build) for _ in range(3)]
+    hashes = [future.result(5) for future in futures]
+    lane.shutdown()
+
+    assert [tx['nonce'] for tx in built] == [3, 4, 5]
+    assert hashes == [HexBytes(keccak(raw)) for raw in node.sent]
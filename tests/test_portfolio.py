@@ -0,0 +1,121 @@
+# tests/test_portfolio.py
+import time
+from decimal import Decimal
+import pytest
+import portfolio
+import tick_math
+from portfolio import Portfolio, PoolConfig
+from aerodrome_client import POOL_ADDRESS, CL_GAUGE_ADDRESS
+from aerodrome_pool_state import PoolSnapshot
+from strategy_config import strategy
+
+TOKEN0 = '0x4200000000000000000000000000000000000006'
+TOKEN1 = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+
+def snapshot(tick=0):
+    return PoolSnapshot(1, time.time(), tick_math.get_sqrt_ratio_at_tick(tick), tick, 10**20,
+                        0, 0, 100, TOKEN0, TOKEN1, 18, 6)
+
+@pytest.fixture
+def wallet(chain, monkeypatch):
+    """A one-pool Portfolio with no positions and no chain access past its pool snapshot.
+
+    Transactions are not sent: wallet.sent lists the labels of _send_all
+    batches, which all fail; swaps still move wallet.balances at the
+    minimum output.
+    """
+    result = Portfolio([PoolConfig('default', POOL_ADDRESS, CL_GAUGE_ADDRESS, share=1.0)])
+    manager, = result.managers
+    manager.state.last_snapshot = snapshot()
+    result.last_idle_run = time.time()
+    result.sent = []
+    result.balances = {TOKEN0: 0, TOKEN1: 0}
+
+    def send_all(label, items, build):
+        result.sent.append(label)
+        if label == 'Swap':
+            for _, params in items:
+                result.balances[params['tokenIn']] -= params['amountIn']
+                result.balances[params['tokenOut']] += params['amountOutMinimum']
+        return []
+
+    monkeypatch.setattr(result, '_send_all', send_all)
+    monkeypatch.setattr(result, '_approve_tokens', lambda tokens, spender=None: None)
+    monkeypatch.setattr(result, '_balances', lambda tokens: dict(result.balances))
+    monkeypatch.setattr(result, 'refresh', lambda: 1)
+    monkeypatch.setattr(manager, 'positions', lambda: [])
+    return result
+
+def test_pool_that_cannot_mint_backs_off_and_says_why(wallet, monkeypatch, caplog):
+    rebalances = []
+    rebalance = wallet.rebalance
+    monkeypatch.setattr(wallet, 'rebalance', lambda: rebalances.append(1) or rebalance())
+    manager, = wallet.managers
+
+    wallet.step(1)
+    wallet.step(2)
+
+    assert rebalances == [1]
+    assert manager.mint_failures == 1
+    assert manager.mint_retry_at - time.time() == pytest.approx(portfolio.BACKOFF_BASE, abs=5)
+    assert 'balances too small' in caplog.text
+
+def test_mint_backoff_doubles_and_resets(wallet):
+    manager, = wallet.managers
+    for _ in range(8):
+        manager.record_mint_result(False, 'test')
+    assert manager.mint_retry_at - time.time() == pytest.approx(portfolio.BACKOFF_CAP, abs=5)
+    assert not manager.needs_position()
+
+    manager.record_mint_result(True)
+    assert manager.mint_failures == 0 and manager.needs_position()
+
+def test_one_sided_balances_are_swapped_before_the_mint(wallet):
+    manager, = wallet.managers
+    wallet.balances = {TOKEN0: 10**18, TOKEN1: 0}
+
+    wallet.rebalance()
+
+    assert wallet.sent[:2] == ['Swap', 'Mint']
+    assert manager.mint_failures == 1
+
+def test_swap_params_bring_the_budget_to_the_range_ratio(wallet):
+    manager, = wallet.managers
+
+    params = wallet._swap_params(manager, (-1000, 1000), {TOKEN0: 10**18, TOKEN1: 0})
+
+    assert (params['tokenIn'], params['tokenOut']) == (TOKEN0, TOKEN1)
+    assert params['amountIn'] == pytest.approx(10**18 // 2, rel=1e-9)
+    assert params['amountOutMinimum'] == int(Decimal(params['amountIn']) * (1 - manager.slippage))
+    assert wallet._swap_params(manager, (-1000, 1000), {TOKEN0: 10**18, TOKEN1: 10**18}) is None
+
+    params = wallet._swap_params(manager, (200, 1000), {TOKEN0: 0, TOKEN1: 10**18})
+    assert (params['tokenIn'], params['amountIn']) == (TOKEN1, 10**18)
+
+def test_slippage_comes_from_the_pool_config_or_the_strategy(chain):
+    default, custom = Portfolio([
+        PoolConfig('default', POOL_ADDRESS, CL_GAUGE_ADDRESS, share=0.5),
+        PoolConfig('custom', POOL_ADDRESS, CL_GAUGE_ADDRESS, share=0.5, slippage=0.02)
+    ]).managers
+
+    assert default.slippage == Decimal(str(strategy.slippage))
+    assert custom.slippage == Decimal('0.02')
+
+def test_failed_exit_is_not_retried_during_backoff(wallet, monkeypatch):
+    manager, = wallet.managers
+    position = {'token_id': 9, 'tick_lower': 1000, 'tick_upper': 2000, 'status': 'open'}
+    monkeypatch.setattr(manager, 'positions', lambda: [position])
+    monkeypatch.setattr(manager.staked_index, 'is_staked', lambda token_id: False)
+    monkeypatch.setattr(portfolio, 'read_batch', lambda calls: [(0,) * 7 + (10**18,)] * len(calls))
+
+    wallet.step(1)
+    wallet.step(2)
+
+    assert wallet.sent.count('Withdraw') == 1
+    assert manager.exit_failures == 1
+    assert manager.exit_retry_at - time.time() == pytest.approx(portfolio.BACKOFF_BASE, abs=5)
+
+    manager.exit_retry_at = time.time() - 1
+    wallet.step(3)
+    assert wallet.sent.count('Withdraw') == 2
+    assert manager.exit_failures == 2
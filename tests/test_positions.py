@@ -0,0 +1,65 @@
+# tests/test_positions.py
+from conftest import WALLET, Revert
+from aerodrome_client import get_contract
+from aerodrome_positions import get_positions_snapshot
+import aerodrome_stake
+
+TOKEN0 = '0x4200000000000000000000000000000000000006'
+TOKEN1 = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+
+def position_tuple(token_id):
+    return (0, '0x' + '00' * 20, TOKEN0, TOKEN1, 100, -200 - token_id, 200 + token_id,
+            token_id * 1000, 0, 0, 0, 0)
+
+def fake_npm(chain, token_ids):
+    def token_of_owner_by_index(owner, index):
+        if owner != WALLET or index >= len(token_ids):
+            raise Revert()
+        return token_ids[index]
+
+    chain.add_contract(
+        get_contract('npm'),
+        balanceOf=lambda owner: len(token_ids) if owner == WALLET else 0,
+        tokenOfOwnerByIndex=token_of_owner_by_index,
+        positions=position_tuple
+    )
+
+def test_snapshot_reads_everything_in_two_aggregate3_calls(chain):
+    fake_npm(chain, [7, 3, 12])
+
+    snapshot = get_positions_snapshot(WALLET)
+
+    assert chain.methods().count('eth_call') == 2
+    assert snapshot['block_number'] == chain.block_number
+    assert snapshot['balance'] == 3
+    assert [position['token_id'] for position in snapshot['positions']] == [7, 3, 12]
+    position = snapshot['positions'][2]
+    assert (position['tick_lower'], position['tick_upper'], position['liquidity']) == (-212, 212, 12000)
+    assert position['token0'] == TOKEN0
+
+def test_snapshot_fetches_indexes_past_the_prefetch(chain):
+    token_ids = list(range(1, 6))
+    fake_npm(chain, token_ids)
+
+    snapshot = get_positions_snapshot(WALLET, prefetch=2)
+
+    assert chain.methods().count('eth_call') == 3
+    assert [position['token_id'] for position in snapshot['positions']] == token_ids
+
+def test_empty_wallet_needs_one_call(chain):
+    fake_npm(chain, [])
+
+    snapshot = get_positions_snapshot(WALLET)
+
+    assert chain.methods().count('eth_call') == 1
+    assert snapshot['positions'] == []
+
+def test_latest_position_is_the_newest_mint_not_the_last_index(chain):
+    fake_npm(chain, [7, 12, 3])
+
+    assert aerodrome_stake.get_latest_position_id() == 12
+
+def test_latest_position_without_positions(chain):
+    fake_npm(chain, [])
+
+    assert aerodrome_stake.get_latest_position_id() is None
@@ -0,0 +1,87 @@
+# tests/test_read_cache.py
+from types import SimpleNamespace
+import pytest
+import read_cache
+from read_cache import ReadCache
+from aerodrome_client import get_contract
+from multicall import Call
+
+OWNER = '0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266'
+
+def balance_call(owner=OWNER):
+    return Call(get_contract('erc20', '0x4200000000000000000000000000000000000006'), 'balanceOf', [owner])
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(read_cache, 'time', SimpleNamespace(time=lambda: clock[0]))
+    return clock
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ReadCache(max_entries=2)
+    cache.put(('a', '0x01', 1), 'a')
+    cache.put(('b', '0x01', 1), 'b')
+    assert cache.get(('a', '0x01', 1)) == (True, 'a')
+
+    cache.put(('c', '0x01', 1), 'c')
+
+    assert cache.get(('b', '0x01', 1)) == (False, None)
+    assert cache.get(('a', '0x01', 1)) == (True, 'a')
+    assert cache.get(('c', '0x01', 1)) == (True, 'c')
+
+def test_latest_reads_expire_after_the_ttl(now):
+    cache = ReadCache(latest_ttl=2)
+    calls = [balance_call()]
+    cache.store(calls, [5], [0])
+
+    now[0] += 1.9
+    assert cache.lookup(calls) == ([5], [])
+    now[0] += 0.2
+    assert cache.lookup(calls) == ([None], [0])
+
+def test_latest_reads_expire_on_a_new_head(now):
+    cache = ReadCache()
+    cache.observe_block(100, '0x' + '11' * 32)
+    calls = [balance_call()]
+    cache.store(calls, [5], [0])
+    cache.store(calls, [7], [0], block_identifier=100)
+
+    cache.observe_block(101, '0x' + '22' * 32)
+
+    assert cache.lookup(calls) == ([None], [0])
+    # Reads pinned to a block do not depend on the head
+    assert cache.lookup(calls, 100) == ([7], [])
+
+def test_changed_block_hash_drops_reads_from_that_block_on():
+    cache = ReadCache()
+    calls = [balance_call()]
+    for block in (99, 100, 101):
+        cache.observe_block(block, '0x' + f"{block:064x}")
+        cache.store(calls, [block], [0], block_identifier=block)
+
+    cache.observe_block(100, '0x' + 'ff' * 32)
+
+    assert cache.lookup(calls, 99) == ([99], [])
+    assert cache.lookup(calls, 100)[1] == [0]
+    assert cache.lookup(calls, 101)[1] == [0]
+
+def test_observe_reorg_drops_reads_from_the_removed_block_on():
+    cache = ReadCache()
+    calls = [balance_call()]
+    for block in (99, 100, 101):
+        cache.store(calls, [block], [0], block_identifier=block)
+
+    cache.observe_reorg(100)
+
+    assert cache.lookup(calls, 99) == ([99], [])
+    assert cache.lookup(calls, 100)[1] == [0]
+    assert cache.lookup(calls, 101)[1] == [0]
+    assert cache.invalidations == 2
+
+def test_failed_reads_are_not_stored():
+    cache = ReadCache()
+    calls = [balance_call(), balance_call('0x0000000000000000000000000000000000000001')]
+
+    cache.store(calls, [None, 3], [0, 1], block_identifier=5)
+
+    assert cache.lookup(calls, 5) == ([None, 3], [0])
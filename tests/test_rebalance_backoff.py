@@ -0,0 +1,63 @@
+# tests/test_rebalance_backoff.py
+import os
+import importlib.util
+import pytest
+
+pytest.importorskip('schedule')
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'aerodrome-bot.py')
+
+@pytest.fixture
+def bot(chain, monkeypatch):
+    """A fresh aerodrome-bot module whose active position is out of range and fails to unstake"""
+    spec = importlib.util.spec_from_file_location('aerodrome_bot', BOT_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    import aerodrome_rewards_claim
+    import aerodrome_unstake
+    module.unstake_calls = []
+    monkeypatch.setattr(aerodrome_rewards_claim, 'send_claim_rewards', lambda token_id: None)
+    monkeypatch.setattr(aerodrome_unstake, 'unstake_position', lambda token_id: module.unstake_calls.append(token_id))
+    monkeypatch.setattr(module, 'check_position_in_range', lambda token_id: False)
+    module.active_position_id = 42
+    return module
+
+def test_failed_rebalance_is_not_retried_during_backoff(bot):
+    bot.monitor_and_rebalance(force=True)
+    bot.monitor_and_rebalance(force=True)
+    bot.monitor_and_rebalance(min_interval=0)
+
+    assert bot.unstake_calls == [42]
+    assert bot.rebalance_failures == 1
+    assert bot.rebalance_retry_at > 0
+
+def test_backoff_doubles_per_failure_up_to_the_cap(bot, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(bot.time, 'time', lambda: now)
+    delays = []
+    for _ in range(8):
+        bot.monitor_and_rebalance(force=True)
+        delays.append(bot.rebalance_retry_at - now)
+        now = bot.rebalance_retry_at
+
+    assert len(bot.unstake_calls) == 8
+    assert delays == [60, 120, 240, 480, 960, 1920, 3600, 3600]
+
+def test_success_clears_the_backoff(bot):
+    bot.record_rebalance_result(False)
+    bot.record_rebalance_result(False)
+    bot.record_rebalance_result(True)
+
+    assert bot.rebalance_failures == 0
+    assert bot.rebalance_retry_at == 0
+
+def test_checks_are_throttled_without_force(bot, monkeypatch):
+    checks = []
+    monkeypatch.setattr(bot, 'check_position_in_range', lambda token_id: checks.append(token_id))
+
+    bot.monitor_and_rebalance(min_interval=bot.EVENT_CHECK_INTERVAL)
+    bot.monitor_and_rebalance(min_interval=bot.EVENT_CHECK_INTERVAL)
+    bot.monitor_and_rebalance(force=True)
+
+    assert checks == [42, 42]
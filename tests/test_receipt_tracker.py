@@ -0,0 +1,134 @@
+# tests/test_receipt_tracker.py
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+from eth_utils import keccak
+from hexbytes import HexBytes
+from web3.exceptions import TransactionNotFound, TimeExhausted
+import fee_engine
+from receipt_tracker import ReceiptTracker, MAX_REPLACEMENTS
+
+TX_HASH = HexBytes(b'\x11' * 32)
+
+class FakeEth:
+    """Chain head, mined receipts and a log of re-sent raw transactions"""
+
+    def __init__(self):
+        self.block_number = 100
+        self.receipts = {}  # block number -> [receipt]
+        self.sent = []
+
+    def get_block_receipts(self, block_number):
+        return self.receipts.get(block_number, [])
+
+    def get_transaction_receipt(self, tx_hash):
+        for receipts in self.receipts.values():
+            for receipt in receipts:
+                if receipt['transactionHash'] == tx_hash:
+                    return receipt
+        raise TransactionNotFound(tx_hash)
+
+    def send_raw_transaction(self, raw):
+        self.sent.append(json.loads(raw))
+        return keccak(raw)
+
+def sign(tx):
+    raw = json.dumps(tx).encode()
+    return SimpleNamespace(raw_transaction=raw, hash=keccak(raw))
+
+@pytest.fixture
+def tracker(monkeypatch):
+    """A ReceiptTracker over FakeEth, polled by hand instead of by its thread"""
+    monkeypatch.setattr(fee_engine, 'get_fee_engine', lambda: SimpleNamespace(
+        fees=lambda force=False: {'maxFeePerGas': 0, 'maxPriorityFeePerGas': 0}
+    ))
+    result = ReceiptTracker(SimpleNamespace(eth=FakeEth()), stuck_blocks=2)
+    result._thread = 'polled by the test'
+    return result
+
+def advance(tracker, blocks):
+    tracker.web3.eth.block_number += blocks
+    tracker.poll()
+
+def test_mined_transaction_resolves(tracker):
+    future = tracker.track(TX_HASH)
+    tracker.poll()
+    receipt = {'transactionHash': TX_HASH, 'status': 1}
+    tracker.web3.eth.receipts[101] = [receipt]
+
+    advance(tracker, 1)
+
+    assert future.result(0) is receipt
+    assert tracker.pending_count() == 0
+
+def test_wait_timeout_stops_tracking(tracker):
+    future = tracker.track(TX_HASH)
+
+    with pytest.raises(TimeExhausted):
+        tracker.wait(TX_HASH, 0.01)
+
+    assert tracker.pending_count() == 0
+    assert isinstance(future.exception(0), TimeExhausted)
+
+def test_legacy_transactions_are_sped_up_by_gas_price(tracker):
+    tracker.track(TX_HASH, {'nonce': 7, 'gasPrice': 1000}, sign)
+    tracker.poll()
+
+    advance(tracker, 2)
+
+    assert tracker.web3.eth.sent == [{'nonce': 7, 'gasPrice': 1125}]
+    assert tracker.pending_count() == 1
+
+def test_transactions_without_fee_fields_are_not_replaced(tracker, caplog):
+    future = tracker.track(TX_HASH, {'nonce': 7}, sign)
+    tracker.poll()
+
+    advance(tracker, 2)
+
+    assert tracker.web3.eth.sent == []
+    assert 'no fee fields' in caplog.text
+    assert not future.done()
+
+def test_dropped_after_the_last_replacement(tracker):
+    future = tracker.track(TX_HASH, {'nonce': 7, 'maxFeePerGas': 1000, 'maxPriorityFeePerGas': 100}, sign)
+    tracker.poll()
+
+    for _ in range(MAX_REPLACEMENTS):
+        advance(tracker, 2)
+    assert len(tracker.web3.eth.sent) == MAX_REPLACEMENTS
+    assert not future.done()
+
+    advance(tracker, 2)
+
+    assert len(tracker.web3.eth.sent) == MAX_REPLACEMENTS
+    assert tracker.pending_count() == 0
+    assert isinstance(future.exception(0), TimeExhausted)
+
+def test_unreplaceable_transactions_are_dropped_after_the_same_number_of_blocks(tracker):
+    future = tracker.track(TX_HASH)
+    tracker.poll()
+
+    advance(tracker, tracker.abandon_blocks - 1)
+    assert not future.done()
+
+    advance(tracker, 1)
+    assert isinstance(future.exception(0), TimeExhausted)
+
+def test_timeout_of_one_waiter_does_not_fail_the_others(tracker):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        patient = executor.submit(tracker.wait, TX_HASH, 5)
+        impatient = executor.submit(tracker.wait, TX_HASH, 0.2)
+
+        with pytest.raises(TimeExhausted):
+            impatient.result(1)
+        assert tracker.pending_count() == 1
+        assert not patient.done()
+
+        tracker.poll()
+        receipt = {'transactionHash': TX_HASH, 'status': 1}
+        tracker.web3.eth.receipts[101] = [receipt]
+        advance(tracker, 1)
+
+        assert patient.result(1) is receipt
+    assert tracker.pending_count() == 0
@@ -0,0 +1,175 @@
+# tests/test_rpc_provider.py
+import json
+import pytest
+import requests
+from urllib3.exceptions import NewConnectionError
+import rpc_provider
+from rpc_provider import PooledRPCProvider, RateLimitedError
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(body if body is not None else {}).encode()
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+class FakeSession:
+    """Stands in for an Endpoint's requests.Session.
+
+    Each post pops the next scripted outcome: an exception to raise, a
+    FakeResponse, or None to answer with a successful result. Payloads
+    are recorded in posts.
+    """
+
+    def __init__(self, name, script=()):
+        self.name = name
+        self.script = list(script)
+        self.posts = []
+
+    def post(self, url, data, timeout):
+        request = json.loads(data)
+        self.posts.append(request)
+        outcome = self.script.pop(0) if self.script else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome is not None:
+            return outcome
+        if isinstance(request, list):
+            return FakeResponse(body=[{'jsonrpc': '2.0', 'id': item['id'], 'result': self.name} for item in request])
+        return FakeResponse(body={'jsonrpc': '2.0', 'id': request['id'], 'result': self.name})
+
+def refused():
+    return requests.ConnectionError(NewConnectionError(None, 'Connection refused'))
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(rpc_provider.time, 'sleep', slept.append)
+    return slept
+
+def pooled(*scripts, **kwargs):
+    urls = [f"http://node{index}" for index in range(len(scripts))]
+    provider = PooledRPCProvider(urls, **kwargs)
+    for index, (endpoint, script) in enumerate(zip(provider.endpoints, scripts)):
+        endpoint.session = FakeSession(f"node{index}", script)
+    return provider
+
+def test_failed_endpoint_fails_over_and_cools_down(sleeps):
+    provider = pooled([refused()], [])
+
+    assert provider.make_request('eth_blockNumber', [])['result'] == 'node1'
+    assert provider.make_request('eth_blockNumber', [])['result'] == 'node1'
+
+    first, second = provider.endpoints
+    assert len(first.session.posts) == 1 and len(second.session.posts) == 2
+    assert not first.available() and first.failures == 1
+    assert sleeps == []
+
+def test_reads_prefer_the_fastest_endpoint(sleeps):
+    provider = pooled([], [])
+    provider.endpoints[0].latency = 0.5
+    provider.endpoints[1].latency = 0.05
+
+    assert provider.make_request('eth_chainId', [])['result'] == 'node1'
+
+def test_reads_rotate_over_endpoints_within_the_latency_margin(sleeps):
+    provider = pooled([], [], [])
+    provider.endpoints[0].latency = 0.10
+    provider.endpoints[1].latency = 0.12
+    provider.endpoints[2].latency = 0.50
+
+    results = [provider.make_request('eth_chainId', [])['result'] for _ in range(4)]
+
+    assert sorted(set(results)) == ['node0', 'node1']
+    assert results.count('node0') == results.count('node1') == 2
+
+def test_read_of_an_unknown_block_fails_over(sleeps):
+    lagging = FakeResponse(body={'jsonrpc': '2.0', 'id': 0, 'error': {'code': -32000, 'message': 'header not found'}})
+    provider = pooled([lagging], [])
+
+    assert provider.make_request('eth_call', [{'to': '0x0', 'data': '0x'}, hex(1234)])['result'] == 'node1'
+
+    assert not provider.endpoints[0].available()
+    assert sleeps == []
+
+def test_batch_with_an_unknown_block_fails_over(sleeps):
+    lagging = FakeResponse(body=[
+        {'jsonrpc': '2.0', 'id': 0, 'result': '0x1'},
+        {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'unknown block'}}
+    ])
+    provider = pooled([lagging], [])
+
+    response = provider.make_batch_request([('eth_blockNumber', []), ('eth_getBalance', ['0x0', hex(1234)])])
+
+    assert [item['result'] for item in response] == ['node1', 'node1']
+
+def test_429_retry_after_is_honoured_when_no_endpoint_is_left(sleeps):
+    provider = pooled([FakeResponse(429, headers={'Retry-After': '2'})])
+
+    assert provider.make_request('eth_blockNumber', [])['result'] == 'node0'
+
+    assert sleeps == [2.0]
+    assert len(provider.endpoints[0].session.posts) == 2
+
+def test_retry_after_is_capped(sleeps):
+    provider = pooled([FakeResponse(429, headers={'Retry-After': '600'})])
+
+    provider.make_request('eth_blockNumber', [])
+
+    assert sleeps == [rpc_provider.MAX_RETRY_AFTER]
+
+def test_json_rpc_rate_limit_errors_fail_over(sleeps):
+    limited = FakeResponse(body={'jsonrpc': '2.0', 'id': 0, 'error': {'code': -32005, 'message': 'limit exceeded'}})
+    provider = pooled([limited], [])
+
+    assert provider.make_request('eth_blockNumber', [])['result'] == 'node1'
+    assert sleeps == []
+
+def test_gives_up_after_max_attempts(sleeps):
+    provider = pooled([FakeResponse(429)] * 3, max_attempts=3)
+
+    with pytest.raises(RateLimitedError):
+        provider.make_request('eth_blockNumber', [])
+
+    assert len(sleeps) == 2
+
+def test_pinned_methods_use_the_write_endpoint(sleeps):
+    provider = pooled([], [], write_endpoint_url='http://node1')
+    provider.endpoints[1].latency = 1.0
+
+    assert provider.make_request('eth_getTransactionCount', ['0x0', 'pending'])['result'] == 'node1'
+    assert provider.make_request('eth_getTransactionCount', ['0x0', 'latest'])['result'] == 'node0'
+
+@pytest.mark.parametrize('failure', [
+    requests.ReadTimeout('read timed out'),
+    FakeResponse(502),
+    requests.ConnectionError('Connection aborted')
+])
+def test_possibly_delivered_send_is_not_retried(sleeps, failure):
+    provider = pooled([failure], [])
+
+    with pytest.raises((requests.Timeout, requests.HTTPError, requests.ConnectionError)):
+        provider.make_request('eth_sendRawTransaction', ['0x01'])
+
+    assert len(provider.endpoints[0].session.posts) == 1
+    assert provider.endpoints[1].session.posts == []
+
+@pytest.mark.parametrize('failure', [refused(), requests.ConnectTimeout('connect timed out'), FakeResponse(429)])
+def test_undelivered_send_is_retried_on_the_write_endpoint(sleeps, failure):
+    provider = pooled([failure], [])
+
+    assert provider.make_request('eth_sendRawTransaction', ['0x01'])['result'] == 'node0'
+
+    assert len(provider.endpoints[0].session.posts) == 2
+    assert provider.endpoints[1].session.posts == []
+
+def test_batches_are_sorted_and_counted(sleeps):
+    provider = pooled([])
+
+    response = provider.make_batch_request([('eth_blockNumber', []), ('eth_chainId', [])])
+
+    assert [item['id'] for item in response] == sorted(item['id'] for item in response)
+    assert provider.stats() == {'round_trips': 1, 'calls': 2, 'methods': {'eth_blockNumber': 1, 'eth_chainId': 1}}
@@ -0,0 +1,67 @@
+# tests/test_simulation.py
+import pytest
+from eth_abi import encode
+import simulation
+from simulation import TransactionReverted, simulate, record_estimate, decode_revert_data
+from fee_engine import FeeEngine
+from aerodrome_client import NPM_ADDRESS, get_contract
+from conftest import WALLET, Revert
+
+TOKEN = '0x4200000000000000000000000000000000000006'
+
+@pytest.fixture
+def token(chain):
+    def approve(spender, amount):
+        if amount == 0:
+            raise Revert()
+        return True
+
+    chain.add_contract(get_contract('erc20', TOKEN), approve=approve)
+    chain.responses.update({
+        'eth_estimateGas': lambda params: hex(40_000),
+        'eth_feeHistory': {'oldestBlock': '0x1', 'baseFeePerGas': ['0x64', '0x64'], 'gasUsedRatio': [0.5],
+                           'reward': [['0x3e8']]}
+    })
+    return get_contract('erc20', TOKEN)
+
+def built(token, amount):
+    return token.functions.approve(NPM_ADDRESS, amount).build_transaction({
+        'from': WALLET, 'gas': 50_000, 'chainId': 8453, 'maxFeePerGas': 10**9, 'maxPriorityFeePerGas': 1000
+    })
+
+def test_simulation_follows_a_fresh_gas_estimate_without_an_eth_call(chain, token):
+    tx = FeeEngine().build_transaction(token.functions.approve(NPM_ADDRESS, 1), {'from': WALLET})
+    assert tx['gas'] == 48_000
+
+    simulate(tx)
+    assert chain.methods().count('eth_call') == 0
+
+    # Each estimate covers one send
+    simulate(tx)
+    assert chain.methods().count('eth_call') == 1
+
+def test_stale_estimates_are_simulated(chain, token, monkeypatch):
+    tx = built(token, 1)
+    now = 1_000_000.0
+    monkeypatch.setattr(simulation.time, 'time', lambda: now)
+    record_estimate(tx)
+    now += simulation.ESTIMATE_TTL + 1
+
+    simulate(tx)
+
+    assert chain.methods().count('eth_call') == 1
+
+def test_reverting_simulation_raises_the_decoded_reason(chain, token):
+    tx = built(token, 0)
+
+    with pytest.raises(TransactionReverted) as raised:
+        simulate(tx)
+
+    assert raised.value.reason == "reverted without a reason"
+    assert raised.value.tx is tx
+
+def test_decode_revert_data():
+    assert decode_revert_data('0x08c379a0' + encode(['string'], ['STF']).hex()) == "STF"
+    assert decode_revert_data(bytes.fromhex('4e487b71') + encode(['uint256'], [0x11])) == \
+        "panic: arithmetic overflow or underflow"
+    assert decode_revert_data('0xdeadbeef') == "custom error 0xdeadbeef"
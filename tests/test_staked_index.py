@@ -0,0 +1,68 @@
+# tests/test_staked_index.py
+import pytest
+from hexbytes import HexBytes
+from conftest import WALLET
+from aerodrome_client import CL_GAUGE_ADDRESS, get_contract
+from state_store import StateStore, STATUS_OPEN, STATUS_STAKED, STATUS_BURNED
+from staked_index import StakedIndex, DEPOSIT_TOPIC, WITHDRAW_TOPIC
+
+OTHER = '0x0000000000000000000000000000000000000001'
+
+def gauge_log(topic, token_id, block_number, user=WALLET, removed=False):
+    return {
+        'address': CL_GAUGE_ADDRESS,
+        'topics': [HexBytes(topic), HexBytes(bytes(12) + bytes.fromhex(user[2:])),
+                   HexBytes(token_id.to_bytes(32, 'big')), HexBytes(bytes(32))],
+        'blockNumber': block_number,
+        'removed': removed
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / 'state.db'))
+    yield store
+    store.close()
+
+@pytest.fixture
+def index(chain, store):
+    return StakedIndex(WALLET, CL_GAUGE_ADDRESS, store=store)
+
+def test_deposit_and_withdraw_logs_update_the_index_and_the_store(index, store):
+    index.apply_log(gauge_log(DEPOSIT_TOPIC, 7, 10))
+    assert index.is_staked(7)
+    assert store.get_position(7)['status'] == STATUS_STAKED
+
+    # An unstake made outside the bot
+    index.apply_log(gauge_log(WITHDRAW_TOPIC, 7, 11))
+    assert not index.is_staked(7)
+    assert store.get_position(7)['status'] == STATUS_OPEN
+    assert store.get_position(7)['updated_block'] == 11
+
+def test_removed_withdraw_log_restakes(index, store):
+    index.apply_log(gauge_log(DEPOSIT_TOPIC, 7, 10))
+    index.apply_log(gauge_log(WITHDRAW_TOPIC, 7, 11))
+
+    index.apply_log(gauge_log(WITHDRAW_TOPIC, 7, 11, removed=True))
+
+    assert index.is_staked(7)
+    assert store.get_position(7)['status'] == STATUS_STAKED
+
+def test_logs_of_other_owners_are_ignored(index, store):
+    assert not index.apply_log(gauge_log(DEPOSIT_TOPIC, 8, 10, user=OTHER))
+
+    assert not index.is_staked(8)
+    assert store.get_position(8) is None
+
+def test_burned_positions_stay_burned(index, store):
+    store.record_position(9, status=STATUS_BURNED)
+
+    index.apply_log(gauge_log(WITHDRAW_TOPIC, 9, 12))
+
+    assert store.get_position(9)['status'] == STATUS_BURNED
+
+def test_verify_asks_the_gauge(chain, index):
+    chain.add_contract(get_contract('gauge', CL_GAUGE_ADDRESS),
+                       stakedContains=lambda owner, token_id: owner == WALLET and token_id == 7)
+
+    assert index.verify(7)
+    assert not index.verify(8)
@@ -0,0 +1,57 @@
+# tests/test_state_store.py
+import json
+import pytest
+import state_store
+from state_store import StateStore, STATUS_OPEN, STATUS_STAKED
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / 'state.db'))
+    yield store
+    store.close()
+
+def test_update_without_status_keeps_the_stored_status(store):
+    store.record_position(5, tick_lower=-200, tick_upper=200, status=STATUS_STAKED)
+    store.record_position(5, liquidity=1234)
+
+    position = store.get_position(5)
+    assert position['status'] == STATUS_STAKED
+    assert position['liquidity'] == 1234
+    assert (position['tick_lower'], position['tick_upper']) == (-200, 200)
+
+def test_new_position_without_status_is_open(store):
+    store.record_position(6, liquidity=1)
+
+    assert store.get_position(6)['status'] == STATUS_OPEN
+
+def test_nested_transaction_rolls_back_as_a_whole(store):
+    store.record_position(1, status=STATUS_OPEN)
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.set_position_status(1, STATUS_STAKED)
+            with store.transaction():
+                store.set_active_position(1)
+                raise RuntimeError("crash mid-rebalance")
+
+    assert store.get_position(1)['status'] == STATUS_OPEN
+    assert store.active_position_id() is None
+    # The store is usable again afterwards
+    store.set_active_position(1)
+    assert store.active_position_id() == 1
+
+def test_legacy_position_file_is_imported_once(tmp_path, monkeypatch):
+    legacy = tmp_path / 'active_position.json'
+    legacy.write_text(json.dumps({'position_id': 77}))
+    monkeypatch.setattr(state_store, 'LEGACY_POSITION_FILE', str(legacy))
+    path = str(tmp_path / 'state.db')
+
+    store = StateStore(path)
+    assert store.active_position_id() == 77
+    assert store.get_position(77)['status'] == STATUS_STAKED
+    store.set_position_status(77, STATUS_OPEN)
+    store.close()
+
+    # Reopening does not import the file again over newer state
+    store = StateStore(path)
+    assert store.get_position(77)['status'] == STATUS_OPEN
+    store.close()
@@ -0,0 +1,185 @@
+# tests/test_tick_math.py
+# Property tests of the TickMath/LiquidityAmounts port: against the Solidity
+# helper contract on an anvil fork, and of the vectorized tick_math_np
+# against the scalar port.
+import numpy as np
+import pytest
+from hypothesis import assume, given, settings, HealthCheck, strategies as st
+from web3.exceptions import ContractLogicError
+import tick_math
+import tick_math_np
+from aerodrome_client import HELPER_ADDRESS, get_abi
+
+# Helper functions the bot does not call, so they are not in the shared HELPER_ABI
+EXTRA_HELPER_ABI = [
+    {"inputs": [{"internalType": "uint160", "name": "sqrtPriceX96", "type": "uint160"}],
+     "name": "getTickAtSqrtRatio",
+     "outputs": [{"internalType": "int24", "name": "tick", "type": "int24"}],
+     "stateMutability": "pure", "type": "function"},
+    {"inputs": [{"internalType": "uint256", "name": "amount0", "type": "uint256"},
+                {"internalType": "uint256", "name": "amount1", "type": "uint256"},
+                {"internalType": "uint160", "name": "sqrtRatioX96", "type": "uint160"},
+                {"internalType": "uint160", "name": "sqrtRatioAX96", "type": "uint160"},
+                {"internalType": "uint160", "name": "sqrtRatioBX96", "type": "uint160"}],
+     "name": "getLiquidityForAmounts",
+     "outputs": [{"internalType": "uint128", "name": "liquidity", "type": "uint128"}],
+     "stateMutability": "pure", "type": "function"}
+]
+
+ticks = st.integers(tick_math.MIN_TICK, tick_math.MAX_TICK)
+sqrt_ratios = st.integers(tick_math.MIN_SQRT_RATIO, tick_math.MAX_SQRT_RATIO - 1)
+liquidities = st.integers(0, tick_math.MAX_UINT128)
+amounts = st.integers(0, 2**128)
+# Ticks where float64 prices keep full relative precision
+float_ticks = st.integers(-400000, 400000)
+
+def tick_ranges(tick_strategy=ticks):
+    return st.tuples(tick_strategy, tick_strategy).filter(lambda pair: pair[0] != pair[1]).map(sorted)
+
+fork_settings = settings(max_examples=200, deadline=None, suppress_health_check=[HealthCheck.function_scoped_fixture])
+
+@pytest.fixture(scope='module')
+def helper(fork):
+    return fork.eth.contract(address=HELPER_ADDRESS, abi=get_abi('helper') + EXTRA_HELPER_ABI)
+
+def test_tick_bounds():
+    assert tick_math.get_sqrt_ratio_at_tick(tick_math.MIN_TICK) == tick_math.MIN_SQRT_RATIO
+    assert tick_math.get_sqrt_ratio_at_tick(tick_math.MAX_TICK) == tick_math.MAX_SQRT_RATIO
+    assert tick_math.get_sqrt_ratio_at_tick(0) == tick_math.Q96
+    assert tick_math.get_tick_at_sqrt_ratio(tick_math.MIN_SQRT_RATIO) == tick_math.MIN_TICK
+    assert tick_math.get_tick_at_sqrt_ratio(tick_math.MAX_SQRT_RATIO - 1) == tick_math.MAX_TICK - 1
+    with pytest.raises(ValueError):
+        tick_math.get_sqrt_ratio_at_tick(tick_math.MAX_TICK + 1)
+    with pytest.raises(ValueError):
+        tick_math.get_sqrt_ratio_at_tick(tick_math.MIN_TICK - 1)
+    with pytest.raises(ValueError):
+        tick_math.get_tick_at_sqrt_ratio(tick_math.MAX_SQRT_RATIO)
+    with pytest.raises(ValueError):
+        tick_math.get_tick_at_sqrt_ratio(tick_math.MIN_SQRT_RATIO - 1)
+
+@given(st.integers(tick_math.MIN_TICK, tick_math.MAX_TICK - 1))
+def test_tick_round_trip(tick):
+    sqrt_ratio = tick_math.get_sqrt_ratio_at_tick(tick)
+    assert sqrt_ratio < tick_math.get_sqrt_ratio_at_tick(tick + 1)
+    assert tick_math.get_tick_at_sqrt_ratio(sqrt_ratio) == tick
+    assert tick_math.get_tick_at_sqrt_ratio(tick_math.get_sqrt_ratio_at_tick(tick + 1) - 1) == tick
+
+@given(sqrt_ratios)
+def test_tick_at_sqrt_ratio_is_the_greatest_tick_below(sqrt_ratio):
+    tick = tick_math.get_tick_at_sqrt_ratio(sqrt_ratio)
+    assert tick_math.get_sqrt_ratio_at_tick(tick) <= sqrt_ratio
+    if tick < tick_math.MAX_TICK:
+        assert tick_math.get_sqrt_ratio_at_tick(tick + 1) > sqrt_ratio
+
+# Against the Solidity libraries through the helper contract on a fork
+
+@pytest.mark.parametrize('tick', [tick_math.MIN_TICK, tick_math.MIN_TICK + 1, -1, 0, 1,
+                                  tick_math.MAX_TICK - 1, tick_math.MAX_TICK])
+def test_sqrt_ratio_at_boundary_ticks_matches_helper(helper, tick):
+    assert tick_math.get_sqrt_ratio_at_tick(tick) == helper.functions.getSqrtRatioAtTick(tick).call()
+
+@pytest.mark.parametrize('sqrt_ratio', [tick_math.MIN_SQRT_RATIO, tick_math.MIN_SQRT_RATIO + 1,
+                                        tick_math.Q96, tick_math.MAX_SQRT_RATIO - 1])
+def test_tick_at_boundary_sqrt_ratios_matches_helper(helper, sqrt_ratio):
+    assert tick_math.get_tick_at_sqrt_ratio(sqrt_ratio) == helper.functions.getTickAtSqrtRatio(sqrt_ratio).call()
+
+@fork_settings
+@given(tick=ticks)
+def test_sqrt_ratio_at_tick_matches_helper(helper, tick):
+    assert tick_math.get_sqrt_ratio_at_tick(tick) == helper.functions.getSqrtRatioAtTick(tick).call()
+
+@fork_settings
+@given(sqrt_ratio=sqrt_ratios)
+def test_tick_at_sqrt_ratio_matches_helper(helper, sqrt_ratio):
+    assert tick_math.get_tick_at_sqrt_ratio(sqrt_ratio) == helper.functions.getTickAtSqrtRatio(sqrt_ratio).call()
+
+@fork_settings
+@given(sqrt_ratio=sqrt_ratios, tick_range=tick_ranges(), liquidity=liquidities)
+def test_amounts_for_liquidity_matches_helper(helper, sqrt_ratio, tick_range, liquidity):
+    sqrt_lower, sqrt_upper = (tick_math.get_sqrt_ratio_at_tick(tick) for tick in tick_range)
+    local = tick_math.get_amounts_for_liquidity(sqrt_ratio, sqrt_lower, sqrt_upper, liquidity)
+    onchain = helper.functions.getAmountsForLiquidity(sqrt_ratio, sqrt_lower, sqrt_upper, liquidity).call()
+    assert local == tuple(onchain)
+
+@fork_settings
+@given(sqrt_ratio=sqrt_ratios, tick_range=tick_ranges(), amount0=amounts, amount1=amounts)
+def test_liquidity_for_amounts_matches_helper(helper, sqrt_ratio, tick_range, amount0, amount1):
+    sqrt_lower, sqrt_upper = (tick_math.get_sqrt_ratio_at_tick(tick) for tick in tick_range)
+    call = helper.functions.getLiquidityForAmounts(amount0, amount1, sqrt_ratio, sqrt_lower, sqrt_upper)
+    try:
+        local = tick_math.get_liquidity_for_amounts(sqrt_ratio, sqrt_lower, sqrt_upper, amount0, amount1)
+    except ValueError:
+        # The port raises exactly where the Solidity version reverts
+        with pytest.raises(ContractLogicError):
+            call.call()
+        return
+    assert local == call.call()
+
+# tick_math_np against the scalar port
+
+@given(st.lists(ticks, min_size=1, max_size=50))
+def test_np_exact_sqrt_ratios_match_scalar(tick_list):
+    result = tick_math_np.sqrt_price_x96_at_ticks(tick_list, exact=True)
+    assert list(result) == [tick_math.get_sqrt_ratio_at_tick(tick) for tick in tick_list]
+
+@given(st.lists(float_ticks, min_size=1, max_size=50))
+def test_np_float_sqrt_ratios_track_scalar(tick_list):
+    result = tick_math_np.sqrt_price_x96_at_ticks(tick_list)
+    expected = [float(tick_math.get_sqrt_ratio_at_tick(tick)) for tick in tick_list]
+    np.testing.assert_allclose(result, expected, rtol=1e-9)
+
+@given(sqrt_ratio=sqrt_ratios, tick_range=tick_ranges(), liquidity=liquidities)
+def test_np_exact_amounts_match_scalar(sqrt_ratio, tick_range, liquidity):
+    amount0, amount1 = tick_math_np.amounts_for_liquidity(sqrt_ratio, *tick_range, liquidity, exact=True)
+    sqrt_lower, sqrt_upper = (tick_math.get_sqrt_ratio_at_tick(tick) for tick in tick_range)
+    assert (amount0, amount1) == tick_math.get_amounts_for_liquidity(sqrt_ratio, sqrt_lower, sqrt_upper, liquidity)
+
+@given(tick=float_ticks, tick_range=tick_ranges(float_ticks), liquidity=st.integers(0, 2**100))
+def test_np_float_amounts_track_scalar(tick, tick_range, liquidity):
+    # At a price exactly on a range end float rounding decides which side it is on
+    assume(tick not in tick_range)
+    sqrt_ratio = tick_math.get_sqrt_ratio_at_tick(tick)
+    amount0, amount1 = tick_math_np.amounts_for_liquidity(sqrt_ratio, *tick_range, liquidity)
+    sqrt_lower, sqrt_upper = (tick_math.get_sqrt_ratio_at_tick(t) for t in tick_range)
+    expected0, expected1 = tick_math.get_amounts_for_liquidity(sqrt_ratio, sqrt_lower, sqrt_upper, liquidity)
+    assert float(amount0) == pytest.approx(expected0, rel=1e-6, abs=2)
+    assert float(amount1) == pytest.approx(expected1, rel=1e-6, abs=2)
+
+@given(tick=float_ticks, tick_range=tick_ranges(float_ticks),
+       amount0=st.integers(0, 2**90), amount1=st.integers(0, 2**90))
+def test_np_float_liquidity_tracks_scalar(tick, tick_range, amount0, amount1):
+    # At a price exactly on a range end float rounding decides which side it is on
+    assume(tick not in tick_range)
+    sqrt_ratio = tick_math.get_sqrt_ratio_at_tick(tick)
+    sqrt_lower, sqrt_upper = (tick_math.get_sqrt_ratio_at_tick(t) for t in tick_range)
+    try:
+        expected = tick_math.get_liquidity_for_amounts(sqrt_ratio, sqrt_lower, sqrt_upper, amount0, amount1)
+    except ValueError:
+        assume(False)
+    result = tick_math_np.liquidity_for_amounts(sqrt_ratio, *tick_range, amount0, amount1)
+    assert float(result) == pytest.approx(expected, rel=1e-6, abs=2)
+
+@given(tick=float_ticks, tick_range=tick_ranges(float_ticks),
+       amount0=st.integers(0, 2**90), amount1=st.integers(0, 2**90))
+def test_swap_amount_for_ratio_leaves_the_range_ratio(tick, tick_range, amount0, amount1):
+    sqrt_ratio = tick_math.get_sqrt_ratio_at_tick(tick)
+    sqrt_lower, sqrt_upper = (tick_math.get_sqrt_ratio_at_tick(t) for t in tick_range)
+    zero_for_one, amount_in = tick_math.swap_amount_for_ratio(sqrt_ratio, sqrt_lower, sqrt_upper, amount0, amount1)
+    amount_out = tick_math.quote_at_price(sqrt_ratio, amount_in, zero_for_one)
+    if zero_for_one:
+        amount0, amount1 = amount0 - amount_in, amount1 + amount_out
+    else:
+        amount0, amount1 = amount0 + amount_out, amount1 - amount_in
+    assert amount0 >= 0 and amount1 >= 0
+
+    # A mint at this price uses all of the swapped amounts, up to rounding to
+    # whole token units; dust amounts are all rounding
+    value = tick_math.quote_at_price(sqrt_ratio, amount0, True) + amount1
+    assume(value > 10**9)
+    try:
+        liquidity = tick_math.get_liquidity_for_amounts(sqrt_ratio, sqrt_lower, sqrt_upper, amount0, amount1)
+    except ValueError:
+        assume(False)
+    used0, used1 = tick_math.get_amounts_for_liquidity(sqrt_ratio, sqrt_lower, sqrt_upper, liquidity)
+    unused = tick_math.quote_at_price(sqrt_ratio, amount0 - used0, True) + amount1 - used1
+    assert unused <= value // 10**6 + 3 * tick_math.quote_at_price(sqrt_ratio, 1, True) + 3
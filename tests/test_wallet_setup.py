@@ -0,0 +1,25 @@
+# tests/test_wallet_setup.py
+import pytest
+import wallet_setup
+import nonce_manager
+import staked_index
+from conftest import WALLET
+
+# anvil's second dev account
+OTHER_KEY = '0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d'
+OTHER_WALLET = '0x70997970C51812dc3A010C7d01b50e0d17dc79C8'
+
+@pytest.fixture
+def other_signer(monkeypatch):
+    monkeypatch.setattr(wallet_setup, '_signer', wallet_setup._signer)
+    monkeypatch.setattr(nonce_manager, '_nonce_managers', {})
+    wallet_setup.set_key_provider(wallet_setup.StaticKeyProvider(OTHER_KEY), OTHER_WALLET)
+
+def test_default_wallet_follows_the_signer_set_after_import(other_signer):
+    assert wallet_setup.get_wallet_address() == OTHER_WALLET
+    assert wallet_setup.wallet_address == OTHER_WALLET
+    assert nonce_manager.get_nonce_manager().address == OTHER_WALLET
+    assert staked_index.StakedIndex().owner == OTHER_WALLET
+
+def test_signer_is_restored():
+    assert wallet_setup.get_wallet_address() == WALLET
@@ -0,0 +1,205 @@
+# tick_math.py
+# Integer port of the Uniswap v3 / Slipstream TickMath, FullMath and
+# LiquidityAmounts libraries. Every function returns exactly what the
+# Solidity version returns, and raises ValueError where it would revert.
+import math
+
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+
+Q96 = 2**96
+MAX_UINT128 = 2**128 - 1
+MAX_UINT256 = 2**256 - 1
+
+# Q128 multipliers for each bit of |tick|, i.e. 1 / sqrt(1.0001) ** (2 ** bit)
+_TICK_BIT_RATIOS = (
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+)
+
+def mul_div(a, b, denominator):
+    """FullMath.mulDiv: floor(a * b / denominator) with 512-bit intermediate"""
+    if denominator == 0:
+        raise ValueError("mulDiv: division by zero")
+    result = (a * b) // denominator
+    if result > MAX_UINT256:
+        raise ValueError("mulDiv: result overflows uint256")
+    return result
+
+def to_uint128(value):
+    """SafeCast.toUint128"""
+    if value > MAX_UINT128:
+        raise ValueError("toUint128: value overflows uint128")
+    return value
+
+def get_sqrt_ratio_at_tick(tick):
+    """TickMath.getSqrtRatioAtTick: sqrt(1.0001^tick) * 2^96 as a Q64.96"""
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK:
+        raise ValueError(f"Tick {tick} out of bounds")
+
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 0x100000000000000000000000000000000
+    for bit, multiplier in _TICK_BIT_RATIOS:
+        if abs_tick & bit:
+            ratio = (ratio * multiplier) >> 128
+
+    if tick > 0:
+        ratio = MAX_UINT256 // ratio
+
+    # Divide by 1<<32 rounding up, so getTickAtSqrtRatio of the result is consistent
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+def get_tick_at_sqrt_ratio(sqrt_price_x96):
+    """TickMath.getTickAtSqrtRatio: greatest tick with getSqrtRatioAtTick(tick) <= sqrt_price_x96"""
+    if not MIN_SQRT_RATIO <= sqrt_price_x96 < MAX_SQRT_RATIO:
+        raise ValueError(f"Sqrt ratio {sqrt_price_x96} out of bounds")
+
+    ratio = sqrt_price_x96 << 32
+    msb = ratio.bit_length() - 1
+    r = ratio >> (msb - 127) if msb >= 128 else ratio << (127 - msb)
+
+    # Integer part of log2 in Q64.64, then 14 bits of the fractional part
+    log_2 = (msb - 128) << 64
+    for shift in range(63, 49, -1):
+        r = (r * r) >> 127
+        f = r >> 128
+        log_2 |= f << shift
+        r >>= f
+
+    log_sqrt10001 = log_2 * 255738958999603826347141  # 128.128 number
+
+    tick_low = (log_sqrt10001 - 3402992956809132418596140100660247210) >> 128
+    tick_high = (log_sqrt10001 + 291339464771989622907027621153398088495) >> 128
+
+    if tick_low == tick_high:
+        return tick_low
+    return tick_high if get_sqrt_ratio_at_tick(tick_high) <= sqrt_price_x96 else tick_low
+
+def _sorted(sqrt_ratio_a_x96, sqrt_ratio_b_x96):
+    if sqrt_ratio_a_x96 > sqrt_ratio_b_x96:
+        return sqrt_ratio_b_x96, sqrt_ratio_a_x96
+    return sqrt_ratio_a_x96, sqrt_ratio_b_x96
+
+def get_liquidity_for_amount0(sqrt_ratio_a_x96, sqrt_ratio_b_x96, amount0):
+    """LiquidityAmounts.getLiquidityForAmount0"""
+    sqrt_ratio_a_x96, sqrt_ratio_b_x96 = _sorted(sqrt_ratio_a_x96, sqrt_ratio_b_x96)
+    intermediate = mul_div(sqrt_ratio_a_x96, sqrt_ratio_b_x96, Q96)
+    return to_uint128(mul_div(amount0, intermediate, sqrt_ratio_b_x96 - sqrt_ratio_a_x96))
+
+def get_liquidity_for_amount1(sqrt_ratio_a_x96, sqrt_ratio_b_x96, amount1):
+    """LiquidityAmounts.getLiquidityForAmount1"""
+    sqrt_ratio_a_x96, sqrt_ratio_b_x96 = _sorted(sqrt_ratio_a_x96, sqrt_ratio_b_x96)
+    return to_uint128(mul_div(amount1, Q96, sqrt_ratio_b_x96 - sqrt_ratio_a_x96))
+
+def get_liquidity_for_amounts(sqrt_ratio_x96, sqrt_ratio_a_x96, sqrt_ratio_b_x96, amount0, amount1):
+    """LiquidityAmounts.getLiquidityForAmounts: max liquidity mintable from the given amounts"""
+    sqrt_ratio_a_x96, sqrt_ratio_b_x96 = _sorted(sqrt_ratio_a_x96, sqrt_ratio_b_x96)
+
+    if sqrt_ratio_x96 <= sqrt_ratio_a_x96:
+        return get_liquidity_for_amount0(sqrt_ratio_a_x96, sqrt_ratio_b_x96, amount0)
+    if sqrt_ratio_x96 < sqrt_ratio_b_x96:
+        liquidity0 = get_liquidity_for_amount0(sqrt_ratio_x96, sqrt_ratio_b_x96, amount0)
+        liquidity1 = get_liquidity_for_amount1(sqrt_ratio_a_x96, sqrt_ratio_x96, amount1)
+        return min(liquidity0, liquidity1)
+    return get_liquidity_for_amount1(sqrt_ratio_a_x96, sqrt_ratio_b_x96, amount1)
+
+def get_amount0_for_liquidity(sqrt_ratio_a_x96, sqrt_ratio_b_x96, liquidity):
+    """LiquidityAmounts.getAmount0ForLiquidity"""
+    sqrt_ratio_a_x96, sqrt_ratio_b_x96 = _sorted(sqrt_ratio_a_x96, sqrt_ratio_b_x96)
+    return mul_div(
+        liquidity << 96,
+        sqrt_ratio_b_x96 - sqrt_ratio_a_x96,
+        sqrt_ratio_b_x96
+    ) // sqrt_ratio_a_x96
+
+def get_amount1_for_liquidity(sqrt_ratio_a_x96, sqrt_ratio_b_x96, liquidity):
+    """LiquidityAmounts.getAmount1ForLiquidity"""
+    sqrt_ratio_a_x96, sqrt_ratio_b_x96 = _sorted(sqrt_ratio_a_x96, sqrt_ratio_b_x96)
+    return mul_div(liquidity, sqrt_ratio_b_x96 - sqrt_ratio_a_x96, Q96)
+
+def get_amounts_for_liquidity(sqrt_ratio_x96, sqrt_ratio_a_x96, sqrt_ratio_b_x96, liquidity):
+    """LiquidityAmounts.getAmountsForLiquidity: token amounts represented by a liquidity value"""
+    sqrt_ratio_a_x96, sqrt_ratio_b_x96 = _sorted(sqrt_ratio_a_x96, sqrt_ratio_b_x96)
+    amount0 = 0
+    amount1 = 0
+
+    if sqrt_ratio_x96 <= sqrt_ratio_a_x96:
+        amount0 = get_amount0_for_liquidity(sqrt_ratio_a_x96, sqrt_ratio_b_x96, liquidity)
+    elif sqrt_ratio_x96 < sqrt_ratio_b_x96:
+        amount0 = get_amount0_for_liquidity(sqrt_ratio_x96, sqrt_ratio_b_x96, liquidity)
+        amount1 = get_amount1_for_liquidity(sqrt_ratio_a_x96, sqrt_ratio_x96, liquidity)
+    else:
+        amount1 = get_amount1_for_liquidity(sqrt_ratio_a_x96, sqrt_ratio_b_x96, liquidity)
+
+    return amount0, amount1
+
+def ticks_for_percent(percent):
+    """Number of ticks spanning a `percent` price move"""
+    return int(math.log(1 + percent / 100) / math.log(1.0001))
+
+def symmetric_tick_range(current_tick, tick_spacing, percent=2.0):
+    """(lower, upper) ticks of a +/-percent range centred on current_tick.
+
+    The midpoint is rounded to the nearest tick spacing and the half width
+    to a whole number of spacings (at least one), so both ends are usable
+    and the range is symmetric. Not part of the Solidity libraries; this is
+    the bot's range rule, shared with the backtester.
+    """
+    half_range = ticks_for_percent(percent)
+    midpoint_rounded = round(current_tick / tick_spacing) * tick_spacing
+    half_range_ticks = max(1, round(half_range / tick_spacing)) * tick_spacing
+    return midpoint_rounded - half_range_ticks, midpoint_rounded + half_range_ticks
+
+def in_range(tick, tick_lower, tick_upper):
+    """Whether a position's liquidity is active at `tick`.
+
+    The pool counts a position as active for tickLower <= tick < tickUpper:
+    at tick == tickUpper it holds only token1 and earns no fees. The bot,
+    the portfolio and the backtester all use this rule.
+    """
+    return tick_lower <= tick < tick_upper
+
+def quote_at_price(sqrt_ratio_x96, amount, zero_for_one):
+    """Value of `amount` of token0 (zero_for_one) or token1 in the other token at a price.
+
+    Ignores the pool fee and price impact. Not part of the Solidity libraries.
+    """
+    if zero_for_one:
+        return mul_div(mul_div(amount, sqrt_ratio_x96, Q96), sqrt_ratio_x96, Q96)
+    return mul_div(mul_div(amount, Q96, sqrt_ratio_x96), Q96, sqrt_ratio_x96)
+
+def swap_amount_for_ratio(sqrt_ratio_x96, sqrt_ratio_a_x96, sqrt_ratio_b_x96, amount0, amount1):
+    """(zero_for_one, amount_in) to swap so amount0/amount1 match the token ratio of a range.
+
+    The swap is valued at the current price without fee or price impact, so
+    the result is close rather than exact; mint amounts should be computed
+    from the balances after the swap. Not part of the Solidity libraries.
+    """
+    ratio0, ratio1 = get_amounts_for_liquidity(sqrt_ratio_x96, sqrt_ratio_a_x96, sqrt_ratio_b_x96, MAX_UINT128)
+    # Values in token1, scaled by 2**192
+    price_x192 = sqrt_ratio_x96 * sqrt_ratio_x96
+    value = amount0 * price_x192 + amount1 * Q96 * Q96
+    ratio_value = ratio0 * price_x192 + ratio1 * Q96 * Q96
+    target0 = value * ratio0 // ratio_value
+    if amount0 >= target0:
+        return True, amount0 - target0
+    return False, amount1 - value * ratio1 // ratio_value
@@ -0,0 +1,152 @@
+# tick_math_np.py
+# Vectorized tick/price/amount math for scanning many ranges at once.
+# The float64 path is for scoring and backtests; pass exact=True to get
+# bit-exact Python integers from tick_math (as object arrays) when needed.
+import numpy as np
+import tick_math
+
+Q96 = float(2**96)
+LOG_1_0001 = np.log(1.0001)
+
+_exact_sqrt_ratio = np.frompyfunc(tick_math.get_sqrt_ratio_at_tick, 1, 1)
+_exact_amounts = np.frompyfunc(tick_math.get_amounts_for_liquidity, 4, 2)
+
+def sqrt_prices_at_ticks(ticks):
+    """sqrt(1.0001^tick) for an array of ticks (not scaled by 2^96)"""
+    return np.exp(np.asarray(ticks, dtype=np.float64) * (LOG_1_0001 / 2))
+
+def sqrt_price_x96_at_ticks(ticks, exact=False):
+    """sqrtPriceX96 for an array of ticks.
+
+    With exact=True the result is an object array of ints identical to
+    TickMath.getSqrtRatioAtTick; otherwise a float64 approximation.
+    """
+    if exact:
+        return _exact_sqrt_ratio(np.asarray(ticks, dtype=object))
+    return sqrt_prices_at_ticks(ticks) * Q96
+
+def prices_at_ticks(ticks, decimals0=18, decimals1=6):
+    """Price of token0 in token1 (decimal adjusted) for an array of ticks"""
+    return np.exp(np.asarray(ticks, dtype=np.float64) * LOG_1_0001) * 10.0 ** (decimals0 - decimals1)
+
+def prices_from_sqrt_price_x96(sqrt_price_x96, decimals0=18, decimals1=6):
+    """Price of token0 in token1 (decimal adjusted) for an array of sqrtPriceX96 values"""
+    sqrt_price = np.asarray(sqrt_price_x96, dtype=np.float64) / Q96
+    return sqrt_price ** 2 * 10.0 ** (decimals0 - decimals1)
+
+def amounts_for_liquidity(sqrt_price_x96, lower_ticks, upper_ticks, liquidity, exact=False):
+    """Token amounts (raw units) held by `liquidity` in each (lower, upper) range.
+
+    All arguments broadcast against each other. With exact=True the result
+    matches LiquidityAmounts.getAmountsForLiquidity exactly.
+    """
+    if exact:
+        return _exact_amounts(
+            np.asarray(sqrt_price_x96, dtype=object),
+            sqrt_price_x96_at_ticks(lower_ticks, exact=True),
+            sqrt_price_x96_at_ticks(upper_ticks, exact=True),
+            np.asarray(liquidity, dtype=object)
+        )
+
+    sqrt_price = np.asarray(sqrt_price_x96, dtype=np.float64) / Q96
+    sqrt_lower = sqrt_prices_at_ticks(lower_ticks)
+    sqrt_upper = sqrt_prices_at_ticks(upper_ticks)
+    liquidity = np.asarray(liquidity, dtype=np.float64)
+
+    # Clamp the current price into the range; the formulas then cover all three cases
+    sqrt_clamped = np.clip(sqrt_price, sqrt_lower, sqrt_upper)
+    amount0 = liquidity * (sqrt_upper - sqrt_clamped) / (sqrt_clamped * sqrt_upper)
+    amount1 = liquidity * (sqrt_clamped - sqrt_lower)
+    return amount0, amount1
+
+def liquidity_for_amounts(sqrt_price_x96, lower_ticks, upper_ticks, amount0, amount1):
+    """Maximum liquidity mintable from (amount0, amount1) in each range (float64)"""
+    sqrt_price = np.asarray(sqrt_price_x96, dtype=np.float64) / Q96
+    sqrt_lower = sqrt_prices_at_ticks(lower_ticks)
+    sqrt_upper = sqrt_prices_at_ticks(upper_ticks)
+    sqrt_clamped = np.clip(sqrt_price, sqrt_lower, sqrt_upper)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        liquidity0 = amount0 * sqrt_clamped * sqrt_upper / (sqrt_upper - sqrt_clamped)
+        liquidity1 = amount1 / (sqrt_clamped - sqrt_lower)
+
+    # Outside the range only one of the tokens counts
+    liquidity0 = np.where(sqrt_clamped < sqrt_upper, liquidity0, np.inf)
+    liquidity1 = np.where(sqrt_clamped > sqrt_lower, liquidity1, np.inf)
+    return np.minimum(liquidity0, liquidity1)
+
+def candidate_ranges(current_tick, tick_spacing, max_spacings=64):
+    """All (lower, upper) ranges aligned to tick_spacing that contain current_tick.
+
+    The narrowest candidate is the single tick spacing holding the current
+    tick; each side is then widened by 0 to max_spacings - 1 further
+    spacings, so the default yields 64 * 64 = 4096 candidates.
+    """
+    base_tick = (current_tick // tick_spacing) * tick_spacing
+    steps = np.arange(max_spacings) * tick_spacing
+    lower_steps, upper_steps = np.meshgrid(steps, steps, indexing='ij')
+    lower_ticks = base_tick - lower_steps.ravel()
+    upper_ticks = base_tick + tick_spacing + upper_steps.ravel()
+    return lower_ticks, upper_ticks
+
+def _normal_cdf(x):
+    # Abramowitz & Stegun 7.1.26 erf approximation, |error| < 1.5e-7
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+def expected_time_in_range(current_tick, lower_ticks, upper_ticks, sigma_ticks, horizon, steps=48):
+    """Expected fraction of `horizon` the pool tick spends inside each range.
+
+    The tick is modelled as a driftless random walk with standard deviation
+    sigma_ticks per unit of time (use the same unit for horizon).
+    """
+    times = np.linspace(horizon / steps, horizon, steps)[:, None]
+    spread = sigma_ticks * np.sqrt(times)
+    lower = (np.asarray(lower_ticks, dtype=np.float64)[None, :] - current_tick) / spread
+    upper = (np.asarray(upper_ticks, dtype=np.float64)[None, :] - current_tick) / spread
+    return (_normal_cdf(upper) - _normal_cdf(lower)).mean(axis=0)
+
+def exit_probability(current_tick, lower_ticks, upper_ticks, sigma_ticks, horizon):
+    """Probability the tick leaves each range within `horizon` (reflection principle)"""
+    spread = sigma_ticks * np.sqrt(horizon)
+    below = (current_tick - np.asarray(lower_ticks, dtype=np.float64)) / spread
+    above = (np.asarray(upper_ticks, dtype=np.float64) - current_tick) / spread
+    return np.minimum(1.0, 2.0 * (1.0 - _normal_cdf(below)) + 2.0 * (1.0 - _normal_cdf(above)))
+
+def liquidity_per_capital(sqrt_price_x96, lower_ticks, upper_ticks):
+    """Liquidity obtained per raw unit of token1-denominated capital in each range"""
+    price = (float(sqrt_price_x96) / Q96) ** 2
+    amount0, amount1 = amounts_for_liquidity(sqrt_price_x96, lower_ticks, upper_ticks, 1.0)
+    return 1.0 / (amount0 * price + amount1)
+
+def score_ranges(sqrt_price_x96, current_tick, lower_ticks, upper_ticks, sigma_ticks, horizon,
+                 reference_range, reference_yield, rebalance_cost=0.0):
+    """Expected net return over `horizon`, as a fraction of capital, for each range.
+
+    Fee income scales with the liquidity a position provides while in
+    range. reference_yield is the fee yield the reference_range (lower,
+    upper) earns over the horizon when it stays in range the whole time;
+    other ranges earn it in proportion to their liquidity per unit of
+    capital. rebalance_cost (gas plus swap slippage, as a fraction of
+    capital) is charged with the probability the range is exited.
+    """
+    reference = liquidity_per_capital(sqrt_price_x96, *reference_range)
+    relative_liquidity = liquidity_per_capital(sqrt_price_x96, lower_ticks, upper_ticks) / reference
+
+    in_range = expected_time_in_range(current_tick, lower_ticks, upper_ticks, sigma_ticks, horizon)
+    exits = exit_probability(current_tick, lower_ticks, upper_ticks, sigma_ticks, horizon)
+    return reference_yield * relative_liquidity * in_range - rebalance_cost * exits
+
+def best_range(sqrt_price_x96, current_tick, tick_spacing, sigma_ticks, horizon,
+               reference_range, reference_yield, rebalance_cost=0.0, max_spacings=64):
+    """Highest scoring (lower, upper, score) among candidate_ranges()"""
+    lower_ticks, upper_ticks = candidate_ranges(current_tick, tick_spacing, max_spacings)
+    scores = score_ranges(
+        sqrt_price_x96, current_tick, lower_ticks, upper_ticks, sigma_ticks, horizon,
+        reference_range, reference_yield, rebalance_cost
+    )
+    best = int(np.argmax(scores))
+    return int(lower_ticks[best]), int(upper_ticks[best]), float(scores[best])
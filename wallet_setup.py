@@ -1,23 +1,168 @@
 from web3 import Web3
-import boto3
+import os
 import base64
+import logging
+import threading
+from rpc_provider import PooledRPCProvider
 
 rpc_url = "https://base-mainnet.g.alchemy.com/v2/mLjg_Iy304gmi36XVvQoqEAjqYgCFSXE"
-web3 = Web3(Web3.HTTPProvider(rpc_url))
 
-# Fetch private key securely
+# AERODROME_RPC_URLS (comma separated) replaces the default endpoint list.
+# Reads go to the fastest healthy endpoint; writes stay on
+# AERODROME_WRITE_RPC_URL, or the first endpoint if unset
+rpc_urls = [url.strip() for url in os.getenv('AERODROME_RPC_URLS', rpc_url).split(',') if url.strip()]
+write_rpc_url = os.getenv('AERODROME_WRITE_RPC_URL', rpc_urls[0])
+web3 = Web3(PooledRPCProvider(rpc_urls, write_rpc_url))
+
+logger = logging.getLogger()
+
+# Location of the KMS-encrypted private key
 region = "eu-north-1"
-secrets_client = boto3.client('secretsmanager', region_name=region)
-kms_client = boto3.client('kms', region_name=region)
-secret_response = secrets_client.get_secret_value(SecretId='aerodrome-bot-eth-key')
-encrypted_key_base64 = secret_response['SecretString'].split(":")[1].strip()
-encrypted_key_bytes = base64.b64decode(encrypted_key_base64)
-decrypted = kms_client.decrypt(CiphertextBlob=encrypted_key_bytes)
-private_key = decrypted['Plaintext'].decode()
-
-# Setup wallet
-account = web3.eth.account.from_key(private_key)
-wallet_address = account.address
+SECRET_ID = 'aerodrome-bot-eth-key'
+
+# The wallet address is public; setting it lets imports skip the key
+# decryption entirely. Without it the address is derived from the key.
+CONFIGURED_WALLET_ADDRESS = os.getenv('AERODROME_WALLET_ADDRESS')
+
+class KmsKeyProvider:
+    """Fetches the encrypted key from Secrets Manager and decrypts it with KMS"""
+
+    def __init__(self, secret_id=SECRET_ID, region_name=region):
+        self.secret_id = secret_id
+        self.region_name = region_name
+
+    def load_key(self):
+        # boto3 is only imported when a key is actually needed
+        import boto3
+        secrets_client = boto3.client('secretsmanager', region_name=self.region_name)
+        kms_client = boto3.client('kms', region_name=self.region_name)
+        secret_response = secrets_client.get_secret_value(SecretId=self.secret_id)
+        encrypted_key_base64 = secret_response['SecretString'].split(":")[1].strip()
+        encrypted_key_bytes = base64.b64decode(encrypted_key_base64)
+        decrypted = kms_client.decrypt(CiphertextBlob=encrypted_key_bytes)
+        return decrypted['Plaintext'].decode()
+
+class StaticKeyProvider:
+    """Stand-in for KmsKeyProvider holding a key in memory (tests, local forks)"""
+
+    def __init__(self, private_key):
+        self.private_key = private_key
+
+    def load_key(self):
+        return self.private_key
+
+class Signer:
+    """Signs transactions with a key that is loaded on first use.
+
+    The key provider is called once; the resulting account is kept in memory
+    for the rest of the process. A failed load is not cached, so the next
+    signing attempt retries.
+    """
+
+    def __init__(self, key_provider, address=None):
+        self.key_provider = key_provider
+        self.configured_address = Web3.to_checksum_address(address) if address else None
+        self._account = None
+        self._lock = threading.Lock()
+
+    @property
+    def account(self):
+        with self._lock:
+            if self._account is None:
+                account = web3.eth.account.from_key(self.key_provider.load_key())
+                if self.configured_address and account.address != self.configured_address:
+                    raise ValueError(f"Signing key belongs to {account.address}, "
+                                     f"not the configured wallet {self.configured_address}")
+                self._account = account
+            return self._account
+
+    @property
+    def address(self):
+        return self.configured_address or self.account.address
+
+    def sign_transaction(self, tx):
+        return self.account.sign_transaction(tx)
+
+    def warm_up(self):
+        """Load the key now so the first transaction does not wait for it"""
+        try:
+            self.account
+            return True
+        except Exception as e:
+            logger.warning(f"Could not load signing key yet: {e}")
+            return False
+
+# AERODROME_WALLETS adds more wallets as comma separated address=secret_id
+# pairs; each key lives in its own Secrets Manager secret, decrypted with KMS
+WALLETS_CONFIG = os.getenv('AERODROME_WALLETS', '')
+
+_signer = None
+_signers = {}  # checksum address -> Signer of each additional wallet
+_signer_lock = threading.Lock()
+
+def _default_signer():
+    global _signer
+    if _signer is None:
+        _signer = Signer(KmsKeyProvider(), CONFIGURED_WALLET_ADDRESS)
+    return _signer
+
+def get_signer(address=None):
+    """Get the signer for `address`, or the process-wide default signer (KMS backed unless replaced)"""
+    with _signer_lock:
+        if address is None:
+            return _default_signer()
+        address = Web3.to_checksum_address(address)
+        if address in _signers:
+            return _signers[address]
+        default = _default_signer()
+    if default.address == address:
+        return default
+    raise KeyError(f"No signer registered for wallet {address}")
+
+def set_key_provider(key_provider, address=None):
+    """Replace the process-wide signer, e.g. with a StaticKeyProvider in tests.
+
+    Modules resolve the wallet through get_wallet_address() when they use
+    it, so this can be called at any time before the first transaction.
+    """
+    global _signer
+    with _signer_lock:
+        _signer = Signer(key_provider, address)
+        return _signer
+
+def register_signer(key_provider, address):
+    """Add the signer of another wallet (a StaticKeyProvider in tests)"""
+    signer = Signer(key_provider, address)
+    with _signer_lock:
+        _signers[signer.configured_address] = signer
+    return signer
+
+def load_wallets(config=WALLETS_CONFIG):
+    """Register a KMS backed signer for every address=secret_id entry of AERODROME_WALLETS"""
+    for entry in config.split(','):
+        if not entry.strip():
+            continue
+        address, secret_id = (part.strip() for part in entry.split('=', 1))
+        register_signer(KmsKeyProvider(secret_id), address)
+    return wallet_addresses()
+
+def wallet_addresses():
+    """The default wallet followed by every additional registered wallet"""
+    default = get_signer().address
+    with _signer_lock:
+        return [default] + [address for address in _signers if address != default]
+
+def get_wallet_address():
+    """Address of the default wallet, resolved from the current signer on every call"""
+    return get_signer().address
+
+def __getattr__(name):
+    # Lazily resolved for scripts that still read `wallet_setup.wallet_address`
+    if name == 'wallet_address':
+        return get_wallet_address()
+    if name == 'account':
+        return get_signer().account
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Token Addresses
 WETH_ADDRESS = web3.to_checksum_address("0x4200000000000000000000000000000000000006")